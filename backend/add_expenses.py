@@ -1,7 +1,24 @@
-import requests
-import random
+"""Concurrent load generator for the Expenses Tracker API.
+
+Examples (run from the backend directory):
+
+    python add_expenses.py 150                                   # add 150 expenses
+    python add_expenses.py --start-server --duration 30 --concurrency 32
+    python add_expenses.py --rate 200 --duration 60 --mix create=1,summary=4 --record trace.jsonl
+    python add_expenses.py --replay trace.jsonl --speed 2
+"""
+import argparse
+import asyncio
+import base64
 import json
+import math
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
 from datetime import datetime, timedelta
+from pathlib import Path
 
 # Categories
 CATEGORIES = ["Groceries", "Dining", "Transportation", "Entertainment", "Utilities", 
@@ -103,59 +120,332 @@ AMOUNT_RANGES = {
     "Uncategorized": (10, 500),
 }
 
-def generate_expense():
+DEFAULT_URL = "http://localhost:8000"
+
+DEFAULT_MIX = "create=20,list=30,get=20,summary=25,scan=5"
+
+# Smallest valid PNG (1x1 pixel), uploaded by the receipt scan operation
+RECEIPT_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8/5+hHgAHggJ/PchI7wAAAABJRU5ErkJggg=="
+)
+
+PERCENTILES = (50, 75, 90, 95, 99, 99.9, 100)
+
+def generate_expense(rng: random.Random, category_ids: dict) -> dict:
     # Random date within the last year
-    days_ago = random.randint(0, 365)
-    expense_date = (datetime.now() - timedelta(days=days_ago)).strftime("%Y-%m-%d")
-    
+    days_ago = rng.randint(0, 365)
+    expense_date = (datetime.now() - timedelta(days=days_ago)).replace(microsecond=0).isoformat()
+
     # Random category
-    category = random.choice(CATEGORIES)
-    
+    category = rng.choice(CATEGORIES)
+
     # Random amount based on category
     min_amount, max_amount = AMOUNT_RANGES[category]
-    amount = round(random.uniform(min_amount, max_amount), 2)
-    
+    amount = round(rng.uniform(min_amount, max_amount), 2)
+
     # Random description based on category
-    description = random.choice(EXPENSE_DESCRIPTIONS[category])
-    
+    description = rng.choice(EXPENSE_DESCRIPTIONS[category])
+
     return {
         "amount": amount,
-        "category": category,
+        "category_id": category_ids.get(category),
         "description": description,
         "date": expense_date
     }
 
-def add_expenses(num_expenses):
-    url = "http://localhost:8000/expenses/"
-    headers = {"Content-Type": "application/json"}
-    
-    print(f"Adding {num_expenses} expenses...")
-    
-    success_count = 0
-    
-    for i in range(num_expenses):
-        expense = generate_expense()
+class LatencyHistogram:
+    """Latency histogram with logarithmic buckets, in the spirit of HdrHistogram.
+
+    Values are bucketed with a fixed relative precision (1% by default), so
+    memory stays constant no matter how many samples are recorded while
+    percentiles remain accurate to within that precision.
+    """
+
+    def __init__(self, precision: float = 0.01):
+        self.log_base = math.log1p(precision)
+        self.counts = defaultdict(int)
+        self.total = 0
+        self.max_us = 0.0
+
+    def record(self, seconds: float):
+        micros = max(seconds * 1e6, 1.0)
+        self.counts[int(math.log(micros) / self.log_base)] += 1
+        self.total += 1
+        self.max_us = max(self.max_us, micros)
+
+    def merge(self, other: "LatencyHistogram"):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] += count
+        self.total += other.total
+        self.max_us = max(self.max_us, other.max_us)
+
+    def value_at(self, pct: float) -> float:
+        """Latency in milliseconds at the given percentile."""
+        if not self.total:
+            return 0.0
+        if pct >= 100:
+            return self.max_us / 1000
+        threshold = math.ceil(self.total * pct / 100)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= threshold:
+                return min(math.exp((bucket + 1) * self.log_base), self.max_us) / 1000
+        return self.max_us / 1000
+
+class EndpointStats:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.errors = defaultdict(int)
+
+    @property
+    def error_count(self) -> int:
+        return sum(self.errors.values())
+
+class LoadRun:
+    """Issues operations against the API and collects per-endpoint statistics."""
+
+    def __init__(self, client, rng: random.Random, recorder=None):
+        self.client = client
+        self.rng = rng
+        self.recorder = recorder
+        self.stats = defaultdict(EndpointStats)
+        self.category_ids = {}
+        self.expense_ids = []
+        self.started = None
+
+    async def prepare(self):
+        """Learn existing category and expense ids so operations hit real rows."""
+        response = await self.client.get("/api/categories/", params={"limit": 1000})
+        response.raise_for_status()
+        self.category_ids = {category["name"]: category["id"] for category in response.json()}
+        response = await self.client.get("/api/expenses/", params={"limit": 1000})
+        response.raise_for_status()
+        self.expense_ids = [expense["id"] for expense in response.json()]
+
+    def build_request(self, op: str) -> dict:
+        if op == "create":
+            return {"op": op, "method": "POST", "path": "/api/expenses/",
+                    "json": generate_expense(self.rng, self.category_ids)}
+        if op == "list":
+            return {"op": op, "method": "GET", "path": "/api/expenses/",
+                    "params": {"skip": self.rng.randint(0, max(len(self.expense_ids) - 100, 0)), "limit": 100}}
+        if op == "get":
+            expense_id = self.rng.choice(self.expense_ids) if self.expense_ids else 1
+            return {"op": op, "method": "GET", "path": f"/api/expenses/{expense_id}",
+                    "template": "/api/expenses/{expense_id}"}
+        if op == "summary":
+            time_range = self.rng.choice([None, "week", "month", "year"])
+            return {"op": op, "method": "GET", "path": "/api/analytics/summary",
+                    "params": {"time_range": time_range} if time_range else {}}
+        if op == "scan":
+            return {"op": op, "method": "POST", "path": "/api/receipts/scan"}
+        raise ValueError(f"Unknown operation: {op}")
+
+    async def execute(self, request: dict, intended_start: float):
+        """Send one request; latency is measured from when it *should* have started.
+
+        Measuring from the intended start time keeps queueing delay in the
+        numbers when the server falls behind an open-loop schedule.
+        """
+        if self.recorder:
+            self.recorder.write(json.dumps({**request, "t": round(intended_start - self.started, 6)}) + "\n")
+
+        label = f"{request['method']} {request.get('template', request['path'])}"
+        kwargs = {"params": request.get("params")}
+        if "json" in request:
+            kwargs["json"] = request["json"]
+        if request["op"] == "scan":
+            kwargs["files"] = {"file": ("receipt.png", RECEIPT_PNG, "image/png")}
+
+        stats = self.stats[label]
         try:
-            response = requests.post(url, headers=headers, json=expense)
-            if response.status_code == 200:
-                success_count += 1
-                if i % 10 == 0:  # Print progress every 10 expenses
-                    print(f"Added {i+1}/{num_expenses} expenses...")
-            else:
-                print(f"Failed to add expense: {response.text}")
+            response = await self.client.request(request["method"], request["path"], **kwargs)
+            if response.status_code >= 400:
+                stats.errors[f"HTTP {response.status_code}"] += 1
+            elif request["op"] == "create":
+                self.expense_ids.append(response.json()["id"])
         except Exception as e:
-            print(f"Error adding expense: {e}")
-    
-    print(f"Successfully added {success_count} out of {num_expenses} expenses.")
+            stats.errors[type(e).__name__] += 1
+        stats.histogram.record(time.perf_counter() - intended_start)
 
-if __name__ == "__main__":
-    import sys
-    
-    num_expenses = 150  # Default
-    if len(sys.argv) > 1:
+async def run_closed_loop(run: LoadRun, ops, weights, concurrency: int, total: int, duration: float):
+    """``concurrency`` workers each send their next request as soon as the last one finishes."""
+    deadline = run.started + duration if duration else None
+    remaining = [total]
+
+    async def worker():
+        while True:
+            if deadline and time.perf_counter() >= deadline:
+                return
+            if not deadline:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            op = run.rng.choices(ops, weights)[0]
+            await run.execute(run.build_request(op), time.perf_counter())
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+async def run_open_loop(run: LoadRun, schedule, concurrency: int):
+    """Start requests on a fixed schedule regardless of how fast responses come back.
+
+    ``schedule`` yields (offset_seconds, request) pairs. At most
+    ``concurrency`` requests are in flight; time spent waiting for a free slot
+    counts towards latency.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    tasks = []
+
+    async def send(request, intended_start):
+        async with slots:
+            await run.execute(request, intended_start)
+
+    for offset, request in schedule:
+        intended_start = run.started + offset
+        delay = intended_start - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(request, intended_start)))
+    await asyncio.gather(*tasks)
+
+def rate_schedule(run: LoadRun, ops, weights, rate: float, total: int, duration: float, poisson: bool):
+    offset = 0.0
+    issued = 0
+    while True:
+        if duration and offset >= duration:
+            return
+        if not duration and issued >= total:
+            return
+        yield offset, run.build_request(run.rng.choices(ops, weights)[0])
+        issued += 1
+        offset += run.rng.expovariate(rate) if poisson else 1 / rate
+
+def replay_schedule(path: Path, speed: float):
+    with open(path) as trace:
+        for line in trace:
+            if line.strip():
+                request = json.loads(line)
+                yield request.pop("t") / speed, request
+
+def parse_mix(mix: str):
+    ops, weights = [], []
+    for part in mix.split(","):
+        op, _, weight = part.partition("=")
+        ops.append(op.strip())
+        weights.append(float(weight or 1))
+    return ops, weights
+
+def print_report(run: LoadRun, elapsed: float, show_histograms: bool):
+    header = f"{'endpoint':<34} {'count':>7} {'errors':>7} {'err%':>6} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"
+    print(f"\nCompleted in {elapsed:.2f}s (latencies in ms)")
+    print(header)
+    print("-" * len(header))
+    for label in sorted(run.stats):
+        stats = run.stats[label]
+        histogram = stats.histogram
+        error_rate = 100 * stats.error_count / histogram.total if histogram.total else 0
+        print(
+            f"{label:<34} {histogram.total:>7} {stats.error_count:>7} {error_rate:>5.1f}% "
+            f"{histogram.total / elapsed:>8.1f} {histogram.value_at(50):>9.2f} {histogram.value_at(95):>9.2f} "
+            f"{histogram.value_at(99):>9.2f} {histogram.value_at(100):>9.2f}"
+        )
+        for error, count in sorted(stats.errors.items()):
+            print(f"    {error}: {count}")
+
+    if show_histograms:
+        for label in sorted(run.stats):
+            histogram = run.stats[label].histogram
+            print(f"\n{label}")
+            print(f"  {'percentile':>10} {'latency ms':>12} {'count':>8}")
+            for pct in PERCENTILES:
+                print(f"  {pct:>9.3f}% {histogram.value_at(pct):>12.3f} {math.ceil(histogram.total * pct / 100):>8}")
+
+def start_server(port: int, workers: int):
+    """Start uvicorn for src.main:app in the background and wait until it answers."""
+    import httpx
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=Path(__file__).parent,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
         try:
-            num_expenses = int(sys.argv[1])
-        except ValueError:
-            print(f"Invalid argument: {sys.argv[1]}. Using default value of {num_expenses}.")
-    
-    add_expenses(num_expenses) 
\ No newline at end of file
+            if httpx.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn did not become ready within 30 seconds")
+
+async def main_async(args):
+    import httpx
+
+    ops, weights = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    recorder = open(args.record, "w") if args.record else None
+    try:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+            run = LoadRun(client, random.Random(args.seed), recorder)
+            await run.prepare()
+            run.started = time.perf_counter()
+
+            if args.replay:
+                await run_open_loop(run, replay_schedule(args.replay, args.speed), args.concurrency)
+            elif args.rate:
+                schedule = rate_schedule(run, ops, weights, args.rate, args.requests, args.duration, args.poisson)
+                await run_open_loop(run, schedule, args.concurrency)
+            else:
+                await run_closed_loop(run, ops, weights, args.concurrency, args.requests, args.duration)
+
+            print_report(run, time.perf_counter() - run.started, args.histogram)
+            return 1 if any(stats.error_count for stats in run.stats.values()) else 0
+    finally:
+        if recorder:
+            recorder.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate concurrent load against the Expenses Tracker API.")
+    parser.add_argument("count", nargs="?", type=int,
+                        help="Shortcut: create this many expenses (same as --mix create=1 --requests COUNT)")
+    parser.add_argument("--url", default=DEFAULT_URL, help="Base URL of the API (default: %(default)s)")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help="Weighted operations: create, list, get, summary, scan (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight")
+    parser.add_argument("--requests", type=int, default=1000, help="Total requests when no --duration is given")
+    parser.add_argument("--duration", type=float, help="Run for this many seconds instead of a request count")
+    parser.add_argument("--rate", type=float, help="Open-loop mode: start this many requests per second")
+    parser.add_argument("--poisson", action="store_true", help="Use exponential inter-arrival times with --rate")
+    parser.add_argument("--record", help="Write every issued request to this JSONL trace")
+    parser.add_argument("--replay", type=Path, help="Replay a JSONL trace with its original timing")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier")
+    parser.add_argument("--histogram", action="store_true", help="Print the full percentile distribution per endpoint")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the request mix and payloads")
+    parser.add_argument("--start-server", action="store_true", help="Start a local uvicorn for src.main:app first")
+    parser.add_argument("--port", type=int, default=8000, help="Port for --start-server")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for --start-server")
+    args = parser.parse_args(argv)
+    if args.count is not None:
+        args.mix = "create=1"
+        args.requests = args.count
+    if args.start_server:
+        args.url = f"http://127.0.0.1:{args.port}"
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = start_server(args.port, args.workers) if args.start_server else None
+    try:
+        return asyncio.run(main_async(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+"""In-process benchmarks for the Expenses Tracker backend.
+
+Run from the ``backend`` directory::
+
+    python -m benchmarks --sizes 10k,100k
+
+Fixture databases are built once per size under ``benchmarks/.fixtures`` and
+results are written as JSON under ``benchmarks/results``.
+"""
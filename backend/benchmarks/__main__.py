@@ -0,0 +1,153 @@
+import argparse
+import json
+import platform
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from . import fixtures
+from .suite import RouteClient, route_cases, service_cases
+from .timing import measure
+
+RESULTS_DIR = Path(__file__).parent / "results"
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+def peak_rss_kb():
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    return usage // 1024 if sys.platform == "darwin" else usage
+
+def run_size(size: int, args) -> dict:
+    print(f"\n== {fixtures.format_size(size)} expenses ==")
+    source = fixtures.build_fixture(size, seed=args.seed, rebuild=args.rebuild_fixtures)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = fixtures.working_copy(source, Path(tmp_dir) / source.name)
+        engine, session_factory = fixtures.session_factory(db_path)
+
+        cases = service_cases(session_factory, size, seed=args.seed)
+        client = None
+        if not args.skip_routes:
+            from src.main import app
+            from src.db.database import get_db
+
+            def override_get_db():
+                db = session_factory()
+                try:
+                    yield db
+                finally:
+                    db.close()
+
+            app.dependency_overrides[get_db] = override_get_db
+            client = RouteClient(app)
+            cases += route_cases(client, session_factory, size, seed=args.seed)
+
+        try:
+            for case in cases:
+                if args.only and args.only not in case["name"]:
+                    continue
+                result = measure(
+                    case["fn"],
+                    iterations=args.iterations,
+                    max_seconds=args.max_seconds,
+                    setup=case.get("setup"),
+                    teardown=case.get("teardown"),
+                )
+                results[case["name"]] = result
+                latency = result["latency_ms"]
+                print(
+                    f"  {case['name']:<55} p50={latency['p50']:>10.3f}ms "
+                    f"p99={latency['p99']:>10.3f}ms peak={result['peak_memory_kb']:>10.1f}KiB "
+                    f"(n={result['iterations']})"
+                )
+        finally:
+            if client:
+                client.close()
+                app.dependency_overrides.clear()
+            engine.dispose()
+    return results
+
+def compare(current: dict, baseline: dict, threshold: float, min_delta_ms: float) -> list:
+    """Return every case whose p50 got slower than the baseline allows."""
+    regressions = []
+    for size_key, cases in current["results"].items():
+        for name, result in cases.items():
+            previous = baseline.get("results", {}).get(size_key, {}).get(name)
+            if not previous:
+                continue
+            old_p50 = previous["latency_ms"]["p50"]
+            new_p50 = result["latency_ms"]["p50"]
+            if new_p50 > old_p50 * (1 + threshold) and new_p50 - old_p50 > min_delta_ms:
+                regressions.append({
+                    "size": size_key,
+                    "name": name,
+                    "baseline_p50_ms": old_p50,
+                    "current_p50_ms": new_p50,
+                    "ratio": round(new_p50 / old_p50, 2) if old_p50 else None,
+                })
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Run the in-process backend benchmarks.")
+    parser.add_argument("--sizes", default="10k,100k,1m", help="Comma separated fixture sizes, e.g. 10k,100k,1m")
+    parser.add_argument("--iterations", type=int, default=20, help="Timed iterations per case")
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="Time budget per case")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for fixture generation and request mix")
+    parser.add_argument("--only", help="Only run cases whose name contains this text")
+    parser.add_argument("--skip-routes", action="store_true", help="Only benchmark the service layer")
+    parser.add_argument("--rebuild-fixtures", action="store_true", help="Regenerate cached fixture databases")
+    parser.add_argument("--output", type=Path, help="Where to write the JSON results")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed p50 slowdown before flagging (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1, help="Ignore regressions smaller than this")
+    args = parser.parse_args(argv)
+
+    sizes = [fixtures.parse_size(size) for size in args.sizes.split(",") if size.strip()]
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": {},
+    }
+    for size in sizes:
+        report["results"][fixtures.format_size(size)] = run_size(size, args)
+    report["peak_rss_kb"] = peak_rss_kb()
+
+    output = args.output or RESULTS_DIR / f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print("No baseline found; run with --save-baseline to create one.")
+        return 0
+
+    regressions = compare(report, json.loads(args.baseline.read_text()), args.threshold, args.min_delta_ms)
+    if not regressions:
+        print("No regressions against baseline.")
+        return 0
+
+    print(f"\n{len(regressions)} regression(s) against baseline:")
+    for regression in regressions:
+        print(
+            f"  [{regression['size']}] {regression['name']}: "
+            f"{regression['baseline_p50_ms']:.3f}ms -> {regression['current_p50_ms']:.3f}ms "
+            f"(x{regression['ratio']})"
+        )
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import shutil
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from src.db import models, schema
+from src.models.category import UNCATEGORIZED
+from generate_quality_mock_data import (
+    CATEGORIES,
+    expected_expenses_per_household,
+    generate_expense_batches,
+    month_range,
+    write_expense_batches,
+)
+
+FIXTURES_DIR = Path(__file__).parent / ".fixtures"
+
+# Months of history covered by every fixture, ending with the current month
+FIXTURE_MONTHS = 24
+
+def parse_size(value: str) -> int:
+    """Parse sizes such as '10k', '100k' or '1m' into a row count."""
+    value = value.strip().lower()
+    multiplier = 1
+    if value.endswith("k"):
+        multiplier, value = 1_000, value[:-1]
+    elif value.endswith("m"):
+        multiplier, value = 1_000_000, value[:-1]
+    return int(float(value) * multiplier)
+
+def format_size(size: int) -> str:
+    if size % 1_000_000 == 0:
+        return f"{size // 1_000_000}m"
+    if size % 1_000 == 0:
+        return f"{size // 1_000}k"
+    return str(size)
+
+def generate_batches(size: int, category_ids: dict, seed: int = 42):
+    """Generate exactly ``size`` expenses with the generate_quality_mock_data distributions.
+
+    A single household only produces ~35 expenses a month, so enough
+    households are simulated to overshoot ``size`` and a seeded random subset
+    is kept, which preserves the category and seasonal mix.
+    """
+    months = month_range(FIXTURE_MONTHS)
+    households = int(np.ceil(size * 1.1 / expected_expenses_per_household(months)))
+    batches = list(generate_expense_batches(category_ids, FIXTURE_MONTHS, households, seed))
+    columns = {key: np.concatenate([batch[key] for batch in batches]) for key in batches[0]}
+    keep = np.sort(np.random.default_rng(seed).choice(len(columns["amount"]), size, replace=False))
+    return [{key: values[keep] for key, values in columns.items()}]
+
+def fixture_path(size: int, seed: int = 42) -> Path:
+    # The build month is part of the name because dates are relative to today,
+    # and the schema version so that model changes never reuse a stale fixture
+    stamp = datetime.now().strftime("%Y%m")
+    return FIXTURES_DIR / f"expenses_{format_size(size)}_s{seed}_{stamp}_v{schema.SCHEMA_VERSION}.db"
+
+def build_fixture(size: int, seed: int = 42, rebuild: bool = False) -> Path:
+    """Create (or reuse) a SQLite database holding ``size`` expenses."""
+    path = fixture_path(size, seed)
+    if path.exists() and not rebuild:
+        return path
+
+    FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    engine = create_engine(f"sqlite:///{tmp_path}")
+    try:
+        schema.ensure_schema(engine)
+        with engine.begin() as conn:
+            conn.execute(insert(models.Category.__table__), [
+                {"name": UNCATEGORIZED, "description": "Default category", "is_protected": True},
+                *({**category, "is_protected": False} for category in CATEGORIES),
+            ])
+            category_ids = {
+                name: category_id
+                for category_id, name in conn.execute(
+                    models.Category.__table__.select().with_only_columns(
+                        models.Category.id, models.Category.name
+                    )
+                )
+            }
+        write_expense_batches(engine, generate_batches(size, category_ids, seed))
+    finally:
+        engine.dispose()
+
+    tmp_path.replace(path)
+    return path
+
+def working_copy(path: Path, destination: Path) -> Path:
+    """Copy a fixture so write benchmarks never modify the cached original."""
+    shutil.copyfile(path, destination)
+    return destination
+
+def session_factory(path: Path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -0,0 +1,80 @@
+"""Insert throughput with and without group commit (``GROUP_COMMIT``).
+
+For every concurrency level, a copy of a benchmark fixture is served by one
+uvicorn worker, once committing each expense on its own and once through the
+group-commit writer, and driven with creates only for a fixed duration.
+
+Usage::
+
+    python -m benchmarks.group_commit --concurrency 1,16,128 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from . import fixtures
+from .startup import RESULTS_DIR, free_port, prepare_workdir
+from .workers import drive, start_workers
+
+MODES = {"per-request": "0", "group": "1"}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.group_commit", description="Measure inserts/sec with and without group commit.")
+    parser.add_argument("--concurrency", default="1,16,128", help="Comma separated numbers of concurrent clients")
+    parser.add_argument("--size", default="10k", help="Fixture size")
+    parser.add_argument("--seed", type=int, default=42, help="Fixture and request mix seed")
+    parser.add_argument("--duration", type=float, default=10.0, help="Timed seconds per run")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Untimed seconds before each measurement")
+    parser.add_argument("--window-ms", type=float, default=1.0, help="GROUP_COMMIT_WINDOW_MS for the group runs")
+    parser.add_argument("--output", type=Path, help="Where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    size = fixtures.parse_size(args.size)
+    fixture = fixtures.build_fixture(size, seed=args.seed)
+    print(f"{fixtures.format_size(size)} expenses, {os.cpu_count()} CPUs, window {args.window_ms}ms")
+
+    results = {}
+    for concurrency in [int(value) for value in args.concurrency.split(",") if value.strip()]:
+        run_args = argparse.Namespace(**vars(args), mix="create=1")
+        run_args.concurrency = concurrency
+        for mode, enabled in MODES.items():
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                workdir = Path(tmp_dir)
+                prepare_workdir(workdir, fixture)
+                port = free_port()
+                env = {"GROUP_COMMIT": enabled, "GROUP_COMMIT_WINDOW_MS": str(args.window_ms)}
+                server = start_workers(workdir, port, 1, env=env)
+                try:
+                    result = asyncio.run(drive(port, run_args))
+                finally:
+                    server.terminate()
+                    server.wait()
+            results.setdefault(str(concurrency), {})[mode] = result
+        baseline, grouped = results[str(concurrency)]["per-request"], results[str(concurrency)]["group"]
+        for mode, result in results[str(concurrency)].items():
+            print(
+                f"  clients={concurrency:<4} {mode:<12} {result['rps']:>8.1f} inserts/s  p50={result['p50_ms']:>8.2f}ms "
+                f"p99={result['p99_ms']:>8.2f}ms  errors={result['errors']}"
+            )
+        print(f"  clients={concurrency:<4} group commit x{grouped['rps'] / baseline['rps']:.2f}")
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "size": fixtures.format_size(size),
+        "window_ms": args.window_ms,
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"group_commit_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
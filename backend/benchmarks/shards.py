@@ -0,0 +1,70 @@
+"""Write throughput with one database versus one database per tenant.
+
+``T`` threads each commit expenses as fast as they can through
+``ExpenseService``. In the ``shared`` layout every thread writes to the same
+file and they queue for its write lock; in the ``sharded`` layout each thread
+is a different tenant with its own file, so commits proceed in parallel.
+
+Usage::
+
+    python -m benchmarks.shards --tenants 1,2,4,8 --seconds 5
+"""
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from src.core import query_log
+from src.db.shards import ShardManager
+from src.models.expense import ExpenseCreate
+from src.services.expense_service import ExpenseService
+
+def writer(manager: ShardManager, tenant: str, deadline: float, counts: list, index: int):
+    db = manager.session(tenant)
+    service = ExpenseService(db)
+    try:
+        while time.perf_counter() < deadline:
+            service.create_expense(ExpenseCreate(amount=12.5, description="Benchmark"))
+            counts[index] += 1
+    finally:
+        db.close()
+
+def run(threads: int, sharded: bool, seconds: float) -> float:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manager = ShardManager(Path(tmp_dir), max_open=threads + 1, idle_seconds=3600)
+        tenants = [f"tenant-{i}" if sharded else "shared" for i in range(threads)]
+        for tenant in set(tenants):
+            manager.get(tenant)
+
+        counts = [0] * threads
+        deadline = time.perf_counter() + seconds
+        workers = [
+            threading.Thread(target=writer, args=(manager, tenant, deadline, counts, i))
+            for i, tenant in enumerate(tenants)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        manager.close_all()
+    return sum(counts) / seconds
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.shards", description="Compare write throughput per layout.")
+    parser.add_argument("--tenants", default="1,2,4,8", help="Comma separated numbers of concurrent writers")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each run")
+    args = parser.parse_args(argv)
+    # Lock waits in the shared layout are expected; don't log them as slow queries
+    query_log.configure(slow_query_ms=float("inf"))
+
+    print(f"{'writers':>7} {'shared commits/s':>17} {'sharded commits/s':>18} {'ratio':>6}")
+    for threads in [int(value) for value in args.tenants.split(",") if value.strip()]:
+        shared = run(threads, sharded=False, seconds=args.seconds)
+        sharded = run(threads, sharded=True, seconds=args.seconds)
+        print(f"{threads:>7} {shared:>17.1f} {sharded:>18.1f} {sharded / shared:>6.2f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""Cold start benchmark: import time and time to first request.
+
+Every run starts a fresh interpreter in a scratch directory, so nothing is
+shared with earlier runs except the OS file cache. Two scenarios are measured:
+
+* ``fresh``: no database yet, so startup has to create the schema.
+* ``existing``: a copy of a benchmark fixture whose schema is already current.
+
+Usage::
+
+    python -m benchmarks.startup --runs 5 --size 10k
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+from . import fixtures
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).parent / "results"
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import src.main; "
+    "print(time.perf_counter() - start)"
+)
+
+def subprocess_env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")]))
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def prepare_workdir(workdir: Path, database):
+    (workdir / "data").mkdir()
+    if database:
+        shutil.copyfile(database, workdir / "data" / "expenses.db")
+
+def measure_import(workdir: Path) -> float:
+    """Seconds spent importing ``src.main`` in a new interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=workdir, env=subprocess_env(), check=True, capture_output=True, text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+def measure_first_request(workdir: Path, path: str, timeout: float) -> float:
+    """Seconds from spawning uvicorn until ``path`` first answers 200."""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=subprocess_env(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            while time.perf_counter() - start < timeout:
+                if server.poll() is not None:
+                    raise RuntimeError(f"Server exited during startup:\n{server.stderr.read().decode()}")
+                try:
+                    if client.get(path).status_code == 200:
+                        return time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+        raise TimeoutError(f"No 200 from {path} within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def run_scenario(name: str, database, args) -> dict:
+    imports, first_requests = [], []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            workdir = Path(tmp_dir)
+            prepare_workdir(workdir, database)
+            imports.append(measure_import(workdir))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            workdir = Path(tmp_dir)
+            prepare_workdir(workdir, database)
+            first_requests.append(measure_first_request(workdir, args.path, args.timeout))
+
+    result = {
+        "import_ms": {"median": statistics.median(imports) * 1000, "min": min(imports) * 1000},
+        "first_request_ms": {"median": statistics.median(first_requests) * 1000, "min": min(first_requests) * 1000},
+        "runs": args.runs,
+    }
+    print(
+        f"  {name:<10} import p50={result['import_ms']['median']:>8.1f}ms "
+        f"first request p50={result['first_request_ms']['median']:>8.1f}ms "
+        f"(min {result['first_request_ms']['min']:.1f}ms, n={args.runs})"
+    )
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description="Measure cold start time.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per scenario")
+    parser.add_argument("--size", default="10k", help="Fixture size for the 'existing' scenario")
+    parser.add_argument("--seed", type=int, default=42, help="Fixture seed")
+    parser.add_argument("--path", default="/api/categories/", help="Request used as the first request")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for the server")
+    parser.add_argument("--output", type=Path, help="Where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    size = fixtures.parse_size(args.size)
+    fixture = fixtures.build_fixture(size, seed=args.seed)
+    print(f"Cold start, {args.runs} runs per scenario, first request GET {args.path}")
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "results": {
+            "fresh": run_scenario("fresh", None, args),
+            f"existing_{fixtures.format_size(size)}": run_scenario("existing", fixture, args),
+        },
+    }
+
+    output = args.output or RESULTS_DIR / f"startup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
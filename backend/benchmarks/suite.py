@@ -0,0 +1,202 @@
+import asyncio
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, text
+
+from src.core.cache import cache_for
+from src.db.models import Category as CategoryModel
+from src.models.expense import ExpenseCreate
+from src.services.analytics_service import AnalyticsService
+from src.services.category_service import CategoryService
+from src.services.expense_service import ExpenseService
+
+TIME_RANGES = [None, "week", "month", "year"]
+
+# Share of all expenses moved into the category that delete_category removes
+DELETE_CATEGORY_FRACTION = 0.01
+
+def _new_expense(rng: random.Random) -> ExpenseCreate:
+    return ExpenseCreate(
+        amount=round(rng.uniform(5, 200), 2),
+        description="Benchmark expense",
+        date=datetime.now(),
+        category_id=None,
+    )
+
+def _populated_category(session_factory, size: int, rng: random.Random) -> int:
+    """Create a throwaway category holding a slice of the existing expenses."""
+    with session_factory() as db:
+        name = f"Benchmark {rng.getrandbits(48):x}"
+        category_id = db.execute(
+            insert(CategoryModel).values(name=name, is_protected=False)
+        ).inserted_primary_key[0]
+        moved = max(1, int(size * DELETE_CATEGORY_FRACTION))
+        start = rng.randint(1, max(1, size - moved))
+        db.execute(
+            text("UPDATE expenses SET category_id = :category_id WHERE id BETWEEN :start AND :end"),
+            {"category_id": category_id, "start": start, "end": start + moved - 1},
+        )
+        db.commit()
+        return category_id
+
+def _random_range(rng: random.Random):
+    """A random range of 1 to 365 days within the fixture's two years of history."""
+    end = date.today() - timedelta(days=rng.randint(0, 365))
+    return end - timedelta(days=rng.randint(0, 364)), end
+
+def _session_without_range_index(session_factory):
+    db = session_factory()
+    cache = cache_for(db.get_bind(), "range_index")
+    if cache:
+        cache.clear()
+    return db
+
+def service_cases(session_factory, size: int, seed: int = 42):
+    """Benchmarks that call the service layer directly with a fresh session."""
+    rng = random.Random(seed)
+
+    def with_session():
+        return session_factory()
+
+    def close(db):
+        db.close()
+
+    cases = []
+    for time_range in TIME_RANGES:
+        cases.append({
+            "name": f"service.analytics.get_summary[{time_range or 'all'}]",
+            "setup": with_session,
+            "fn": lambda db, time_range=time_range: AnalyticsService(db).get_summary(time_range),
+            "teardown": close,
+        })
+
+    cases.extend([
+        {
+            "name": "service.analytics.get_range_totals",
+            "setup": with_session,
+            "fn": lambda db: AnalyticsService(db).get_range_totals(*_random_range(rng)),
+            "teardown": close,
+        },
+        {
+            "name": "service.analytics.get_range_totals[index_rebuild]",
+            "setup": lambda: _session_without_range_index(session_factory),
+            "fn": lambda db: AnalyticsService(db).get_range_totals(*_random_range(rng)),
+            "teardown": close,
+        },
+        {
+            "name": "service.analytics.compare_periods[month]",
+            "setup": with_session,
+            "fn": lambda db: AnalyticsService(db).compare_periods("month"),
+            "teardown": close,
+        },
+        {
+            "name": "service.expenses.get_expenses[first_page]",
+            "setup": with_session,
+            "fn": lambda db: ExpenseService(db).get_expenses(skip=0, limit=100),
+            "teardown": close,
+        },
+        {
+            "name": "service.expenses.get_expenses[deep_page]",
+            "setup": with_session,
+            "fn": lambda db: ExpenseService(db).get_expenses(skip=size // 2, limit=100),
+            "teardown": close,
+        },
+        {
+            "name": "service.expenses.get_expense",
+            "setup": with_session,
+            "fn": lambda db: ExpenseService(db).get_expense(rng.randint(1, size)),
+            "teardown": close,
+        },
+        {
+            "name": "service.expenses.create_expense",
+            "setup": with_session,
+            "fn": lambda db: ExpenseService(db).create_expense(_new_expense(rng)),
+            "teardown": close,
+        },
+        {
+            "name": "service.categories.get_categories",
+            "setup": with_session,
+            "fn": lambda db: CategoryService(db).get_categories(),
+            "teardown": close,
+        },
+        {
+            "name": "service.categories.delete_category",
+            "setup": lambda: (session_factory(), _populated_category(session_factory, size, rng)),
+            "fn": lambda ctx: CategoryService(ctx[0]).delete_category(ctx[1]),
+            "teardown": lambda ctx: ctx[0].close(),
+        },
+    ])
+    return cases
+
+class RouteClient:
+    """Drive the ASGI app in-process through httpx, without opening sockets."""
+
+    def __init__(self, app):
+        import httpx
+
+        self.loop = asyncio.new_event_loop()
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://benchmark"
+        )
+
+    def request(self, method: str, url: str, **kwargs):
+        response = self.loop.run_until_complete(self.client.request(method, url, **kwargs))
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url} returned {response.status_code}: {response.text}")
+        return response
+
+    def close(self):
+        self.loop.run_until_complete(self.client.aclose())
+        self.loop.close()
+
+def route_cases(client: RouteClient, session_factory, size: int, seed: int = 42):
+    """Benchmarks that go through routing, validation and serialization."""
+    rng = random.Random(seed)
+
+    cases = []
+    for time_range in TIME_RANGES:
+        params = {"time_range": time_range} if time_range else {}
+        cases.append({
+            "name": f"route.GET /api/analytics/summary[{time_range or 'all'}]",
+            "fn": lambda params=params: client.request("GET", "/api/analytics/summary", params=params),
+        })
+
+    def range_params():
+        start, end = _random_range(rng)
+        return {"start": start.isoformat(), "end": end.isoformat()}
+
+    cases.extend([
+        {
+            "name": "route.GET /api/analytics/range",
+            "fn": lambda: client.request("GET", "/api/analytics/range", params=range_params()),
+        },
+        {
+            "name": "route.GET /api/analytics/compare",
+            "fn": lambda: client.request("GET", "/api/analytics/compare", params={"period": "month"}),
+        },
+        {
+            "name": "route.GET /api/expenses/",
+            "fn": lambda: client.request("GET", "/api/expenses/", params={"limit": 100}),
+        },
+        {
+            "name": "route.GET /api/expenses/{expense_id}",
+            "fn": lambda: client.request("GET", f"/api/expenses/{rng.randint(1, size)}"),
+        },
+        {
+            "name": "route.POST /api/expenses/",
+            "fn": lambda: client.request(
+                "POST", "/api/expenses/", content=_new_expense(rng).model_dump_json(),
+                headers={"Content-Type": "application/json"},
+            ),
+        },
+        {
+            "name": "route.GET /api/categories/",
+            "fn": lambda: client.request("GET", "/api/categories/"),
+        },
+        {
+            "name": "route.DELETE /api/categories/{category_id}",
+            "setup": lambda: _populated_category(session_factory, size, rng),
+            "fn": lambda category_id: client.request("DELETE", f"/api/categories/{category_id}"),
+        },
+    ])
+    return cases
@@ -0,0 +1,79 @@
+import gc
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+PERCENTILES = (50, 90, 95, 99)
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+def summarize(samples_ms: List[float]) -> Dict:
+    ordered = sorted(samples_ms)
+    summary = {f"p{p}": round(percentile(ordered, p), 4) for p in PERCENTILES}
+    summary.update({
+        "min": round(ordered[0], 4) if ordered else 0.0,
+        "max": round(ordered[-1], 4) if ordered else 0.0,
+        "mean": round(sum(ordered) / len(ordered), 4) if ordered else 0.0,
+    })
+    return summary
+
+def measure(
+    fn: Callable,
+    iterations: int = 20,
+    warmup: int = 2,
+    max_seconds: float = 10.0,
+    min_iterations: int = 3,
+    setup: Optional[Callable] = None,
+    teardown: Optional[Callable] = None,
+) -> Dict:
+    """Time ``fn`` repeatedly and report latency percentiles and peak memory.
+
+    ``setup`` runs untimed before every call and its return value is passed to
+    ``fn``; ``teardown`` receives the same value afterwards. Sampling stops
+    early once ``max_seconds`` is spent (but never before ``min_iterations``),
+    so slow cases on large fixtures stay bounded.
+    """
+    def run_once() -> float:
+        context = setup() if setup else None
+        try:
+            start = time.perf_counter_ns()
+            fn(context) if setup else fn()
+            elapsed = time.perf_counter_ns() - start
+        finally:
+            if teardown:
+                teardown(context)
+        return elapsed / 1e6
+
+    for _ in range(warmup):
+        run_once()
+
+    samples = []
+    gc.collect()
+    deadline = time.perf_counter() + max_seconds
+    for i in range(iterations):
+        samples.append(run_once())
+        if i + 1 >= min_iterations and time.perf_counter() > deadline:
+            break
+
+    # Memory is measured in a separate pass because tracemalloc slows every
+    # allocation down and would distort the timings above.
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        run_once()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "iterations": len(samples),
+        "latency_ms": summarize(samples),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
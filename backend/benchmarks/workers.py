@@ -0,0 +1,132 @@
+"""Throughput scaling across uvicorn worker processes.
+
+For every worker count, a copy of a benchmark fixture is served by
+``uvicorn --workers N`` and driven by the closed-loop load generator from
+``add_expenses.py`` for a fixed duration. Reported throughput covers all
+requests; latency percentiles are merged across endpoints.
+
+Usage::
+
+    python -m benchmarks.workers --workers 1,2,4 --duration 20 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from add_expenses import LatencyHistogram, LoadRun, parse_mix, run_closed_loop
+from . import fixtures
+from .startup import RESULTS_DIR, free_port, prepare_workdir, subprocess_env
+
+DEFAULT_MIX = "list=30,get=30,summary=20,create=20"
+
+def start_workers(workdir: Path, port: int, workers: int, timeout: float = 60.0, env: Optional[dict] = None):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir, env={**subprocess_env(), **(env or {})}, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited during startup:\n{server.stderr.read().decode()}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ready").status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    server.terminate()
+    raise TimeoutError(f"uvicorn did not become ready within {timeout}s")
+
+async def drive(port: int, args) -> dict:
+    ops, weights = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        run = LoadRun(client, random.Random(args.seed))
+        await run.prepare()
+
+        # Warm every worker's caches before the timed part
+        run.started = time.perf_counter()
+        await run_closed_loop(run, ops, weights, args.concurrency, 0, args.warmup)
+        run.stats.clear()
+
+        run.started = time.perf_counter()
+        await run_closed_loop(run, ops, weights, args.concurrency, 0, args.duration)
+        elapsed = time.perf_counter() - run.started
+
+    merged = LatencyHistogram()
+    for stats in run.stats.values():
+        merged.merge(stats.histogram)
+    errors = sum(stats.error_count for stats in run.stats.values())
+    return {
+        "requests": merged.total,
+        "errors": errors,
+        "rps": merged.total / elapsed,
+        "p50_ms": merged.value_at(50),
+        "p99_ms": merged.value_at(99),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.workers", description="Measure throughput per worker count.")
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated worker counts")
+    parser.add_argument("--size", default="100k", help="Fixture size")
+    parser.add_argument("--seed", type=int, default=42, help="Fixture and request mix seed")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted operations, as for add_expenses.py")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight")
+    parser.add_argument("--duration", type=float, default=20.0, help="Timed seconds per worker count")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Untimed seconds before each measurement")
+    parser.add_argument("--output", type=Path, help="Where to write the JSON results")
+    args = parser.parse_args(argv)
+
+    size = fixtures.parse_size(args.size)
+    fixture = fixtures.build_fixture(size, seed=args.seed)
+    print(f"{fixtures.format_size(size)} expenses, mix {args.mix}, concurrency {args.concurrency}, "
+          f"{os.cpu_count()} CPUs")
+
+    results = {}
+    for workers in [int(value) for value in args.workers.split(",") if value.strip()]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            workdir = Path(tmp_dir)
+            prepare_workdir(workdir, fixture)
+            port = free_port()
+            server = start_workers(workdir, port, workers)
+            try:
+                result = asyncio.run(drive(port, args))
+            finally:
+                server.terminate()
+                server.wait()
+        results[str(workers)] = result
+        scaling = result["rps"] / results["1"]["rps"] if "1" in results else None
+        print(
+            f"  workers={workers:<3} {result['rps']:>8.1f} req/s  p50={result['p50_ms']:>8.2f}ms "
+            f"p99={result['p99_ms']:>8.2f}ms  errors={result['errors']}"
+            + (f"  x{scaling:.2f}" if scaling else "")
+        )
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "size": fixtures.format_size(size),
+        "mix": args.mix,
+        "concurrency": args.concurrency,
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"workers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Check that a database from the first release upgrades to the current schema.
+
+Creates a database with the original ``categories`` and ``expenses`` tables
+(or copies the one given with ``--database``), runs the same migration as
+startup on it and compares the derived tables with the expenses. Exits with
+status 1 when anything does not add up.
+
+Examples:
+    python check_schema_upgrade.py
+    python check_schema_upgrade.py --database data/old-copy.db   # never modified; a copy is upgraded
+"""
+import argparse
+import random
+import shutil
+import sqlite3
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add the parent directory to the path to import from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from src.db import schema
+from src.services.fingerprints import expense_fingerprint
+
+# The layout written by the first release, before schema versions existed
+BASELINE_SCHEMA = """
+CREATE TABLE categories (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    description VARCHAR,
+    is_protected BOOLEAN,
+    PRIMARY KEY (id)
+);
+CREATE INDEX ix_categories_id ON categories (id);
+CREATE UNIQUE INDEX ix_categories_name ON categories (name);
+CREATE TABLE expenses (
+    id INTEGER NOT NULL,
+    amount FLOAT NOT NULL,
+    description VARCHAR,
+    date DATETIME,
+    category_id INTEGER,
+    receipt_path VARCHAR,
+    PRIMARY KEY (id),
+    FOREIGN KEY(category_id) REFERENCES categories (id)
+);
+CREATE INDEX ix_expenses_id ON expenses (id);
+"""
+
+def create_baseline(path: Path, rows: int, seed: int = 42):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany("INSERT INTO categories (name, is_protected) VALUES (?, ?)",
+                     [("Groceries", 0), ("Dining", 0), ("Uncategorized", 1)])
+    start = datetime(2024, 1, 1)
+    conn.executemany(
+        "INSERT INTO expenses (amount, description, date, category_id) VALUES (?, ?, ?, ?)",
+        [
+            (round(rng.uniform(1, 200), 2), f"Shop {i % 40}", str(start + timedelta(days=i % 400)),
+             rng.choice((1, 2, 3, None)))
+            for i in range(rows)
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+def check(path: Path) -> list:
+    conn = sqlite3.connect(path)
+    problems = []
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version != schema.SCHEMA_VERSION:
+        problems.append(f"user_version is {version}, expected {schema.SCHEMA_VERSION}")
+    expected = conn.execute("SELECT COUNT(*), TOTAL(amount) FROM expenses WHERE date IS NOT NULL").fetchone()
+    totals = conn.execute("SELECT COALESCE(SUM(count), 0), TOTAL(amount) FROM daily_totals").fetchone()
+    if totals[0] != expected[0] or abs(totals[1] - expected[1]) > 1e-6 * max(1.0, abs(expected[1])):
+        problems.append(f"daily_totals hold {totals}, expenses {expected}")
+    stats = conn.execute("SELECT COALESCE(SUM(count), 0) FROM category_stats").fetchone()[0]
+    rows = conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+    if stats != rows:
+        problems.append(f"category_stats count {stats} expenses, the table has {rows}")
+    # Identical expenses share a fingerprint, held by the first of them
+    distinct = {
+        expense_fingerprint(*row)
+        for row in conn.execute("SELECT date, amount, description, currency FROM expenses")
+    }
+    held = conn.execute("SELECT COUNT(fingerprint) FROM expenses").fetchone()[0]
+    if held != len(distinct):
+        problems.append(f"{held} expenses hold a fingerprint, {len(distinct)} are distinct")
+    conn.close()
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Upgrade a first-release database and verify the result.")
+    parser.add_argument("--database", type=Path, help="Database to upgrade a copy of (default: a generated one)")
+    parser.add_argument("--rows", type=int, default=5000, help="Expenses in the generated database")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "expenses.db"
+        if args.database:
+            shutil.copy(args.database, path)
+        else:
+            create_baseline(path, args.rows)
+        engine = create_engine(f"sqlite:///{path}")
+        schema.initialize(engine, Path(directory) / "expenses.db.lock")
+        engine.dispose()
+        problems = check(path)
+
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print(f"OK: upgraded to schema version {schema.SCHEMA_VERSION}")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
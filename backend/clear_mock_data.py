@@ -6,6 +6,8 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from src.db.database import SessionLocal
 from src.db.models import Expense
+from src.services.anomaly_service import AnomalyService
+from src.services.budget_service import BudgetService
 
 def clear_mock_expenses():
     """Remove all expenses from the database."""
@@ -17,6 +19,8 @@ def clear_mock_expenses():
         
         # Delete all expenses
         db.query(Expense).delete()
+        AnomalyService(db).rebuild()
+        BudgetService(db).recalculate()
         db.commit()
         
         print(f"Successfully deleted all {expense_count} expenses.")
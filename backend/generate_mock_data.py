@@ -1,14 +1,19 @@
-import random
+import argparse
 import sys
 import os
+import time
 from datetime import datetime, timedelta
+import numpy as np
 from sqlalchemy.orm import Session
 
 # Add the parent directory to the path to import from src
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.db.database import SessionLocal
-from src.db.models import Category, Expense
+from src.db.database import SessionLocal, engine
+from src.db.models import Category
+from src.db.schema import ensure_schema
+from src.services.fingerprints import expense_fingerprints
+from generate_quality_mock_data import DEFAULT_SEED, write_expense_batches
 
 # Sample categories with descriptions
 CATEGORIES = [
@@ -136,89 +141,83 @@ def ensure_categories_exist(db: Session):
     # Return all categories
     return {cat.name: cat for cat in db.query(Category).all()}
 
-def generate_expenses(db: Session, num_expenses: int, categories: dict):
-    """Generate random expenses."""
-    # Get current date and calculate date range (1 year back)
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=365)
-    date_range = (end_date - start_date).days
-    
-    expenses = []
-    for _ in range(num_expenses):
-        # Random date within the last year
-        days_ago = random.randint(0, date_range)
-        expense_date = end_date - timedelta(days=days_ago)
-        
-        # Random category (sometimes null/Uncategorized)
-        if random.random() < 0.1:  # 10% chance of no category
-            category_name = "Uncategorized"
-        else:
-            category_name = random.choice(list(categories.keys()))
-        
-        # Random amount based on category
-        if category_name in AMOUNT_RANGES:
-            min_amount, max_amount = AMOUNT_RANGES[category_name]
-            amount = round(random.uniform(min_amount, max_amount), 2)
-        else:
-            amount = round(random.uniform(10, 1000), 2)
-        
-        # Random description based on category
-        if category_name in EXPENSE_DESCRIPTIONS:
-            description = random.choice(EXPENSE_DESCRIPTIONS[category_name])
-        else:
-            description = f"Expense for {category_name}"
-        
-        # Create expense
-        expense = Expense(
-            amount=amount,
-            description=description,
-            date=expense_date,
-            category=category_name  # Use category name string instead of category_id
-        )
-        expenses.append(expense)
-    
-    # Add all expenses to db
-    db.add_all(expenses)
-    db.commit()
-    
-    return expenses
+# Expenses generated per batch, which bounds memory for very large runs
+BATCH_SIZE = 1_000_000
+
+def generate_expense_batch(rng: np.random.Generator, num_expenses: int, categories: dict, end_date: datetime) -> dict:
+    """Generate random expenses from the last year as column arrays."""
+    category_names = list(categories.keys())
+    category_ids = np.array([categories[name].id for name in category_names], dtype=np.int64)
+
+    # Random category (sometimes null/Uncategorized)
+    picks = rng.integers(0, len(category_names), num_expenses)
+    if "Uncategorized" in categories:
+        uncategorized_index = category_names.index("Uncategorized")
+        picks[rng.random(num_expenses) < 0.1] = uncategorized_index  # 10% chance of no category
+
+    # Random amount and description based on category
+    ranges = np.array([AMOUNT_RANGES.get(name, (10, 1000)) for name in category_names], dtype=float)
+    amounts = np.round(rng.uniform(ranges[picks, 0], ranges[picks, 1]), 2)
+
+    descriptions = np.empty(num_expenses, dtype=object)
+    for index, name in enumerate(category_names):
+        mask = picks == index
+        choices = np.array(EXPENSE_DESCRIPTIONS.get(name, [f"Expense for {name}"]), dtype=object)
+        descriptions[mask] = choices[rng.integers(0, len(choices), int(mask.sum()))]
 
-def main():
+    # Random date within the last year, formatted the way SQLAlchemy stores DateTime
+    date_strings = np.array(
+        [(end_date - timedelta(days=days_ago)).strftime("%Y-%m-%d %H:%M:%S.%f") for days_ago in range(366)],
+        dtype=object,
+    )
+    dates = date_strings[rng.integers(0, 366, num_expenses)]
+
+    return {
+        "amount": amounts,
+        "description": descriptions,
+        "date": dates,
+        "category_id": category_ids[picks],
+        "fingerprint": np.asarray(
+            expense_fingerprints(dates.tolist(), amounts.tolist(), descriptions.tolist()), dtype=np.int64
+        ),
+    }
+
+def generate_expenses(num_expenses: int, categories: dict, seed: int = DEFAULT_SEED):
+    """Yield batches of random expenses totalling ``num_expenses``."""
+    rng = np.random.default_rng(seed)
+    end_date = datetime.now().replace(microsecond=0)
+    for start in range(0, num_expenses, BATCH_SIZE):
+        yield generate_expense_batch(rng, min(BATCH_SIZE, num_expenses - start), categories, end_date)
+
+def main(argv=None):
     """Main function to generate mock data."""
+    parser = argparse.ArgumentParser(description="Generate random mock expenses.")
+    parser.add_argument("count", nargs="?", type=int, default=200, help="Number of expenses (default: 200)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Random seed (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    ensure_schema(engine)
     db = SessionLocal()
     try:
         print("Ensuring categories exist...")
         categories = ensure_categories_exist(db)
-        
-        num_expenses = 200  # Default number of expenses to generate
-        if len(sys.argv) > 1:
-            try:
-                num_expenses = int(sys.argv[1])
-            except ValueError:
-                print(f"Invalid argument: {sys.argv[1]}. Using default value of {num_expenses}.")
-        
-        print(f"Generating {num_expenses} random expenses...")
-        expenses = generate_expenses(db, num_expenses, categories)
-        
-        print(f"Successfully generated {len(expenses)} expenses.")
-        
-        # Basic summary
-        total_amount = sum(expense.amount for expense in expenses)
-        print(f"Total amount of all generated expenses: ${total_amount:.2f}")
-        
-        category_counts = {}
-        for expense in expenses:
-            cat_name = expense.category if expense.category else "Uncategorized"
-            if cat_name not in category_counts:
-                category_counts[cat_name] = 0
-            category_counts[cat_name] += 1
-        
-        print("\nExpenses by category:")
-        for cat_name, count in category_counts.items():
-            print(f"  {cat_name}: {count} expenses")
-            
     finally:
         db.close()
 
+    print(f"Generating {args.count} random expenses...")
+    started = time.perf_counter()
+    written, totals_by_id = write_expense_batches(engine, generate_expenses(args.count, categories, args.seed))
+    elapsed = time.perf_counter() - started
+
+    print(f"Successfully generated {written} expenses in {elapsed:.2f}s.")
+
+    # Basic summary
+    print(f"Total amount of all generated expenses: ${sum(totals_by_id.values()):.2f}")
+
+    names_by_id = {category.id: name for name, category in categories.items()}
+    print("\nTotals by category:")
+    for category_id, total in sorted(totals_by_id.items(), key=lambda x: -x[1]):
+        print(f"  {names_by_id[category_id]}: ${total:.2f}")
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
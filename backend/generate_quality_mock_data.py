@@ -1,15 +1,25 @@
-import random
+import argparse
 import sys
 import os
-from datetime import datetime, timedelta
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 import calendar
-from sqlalchemy.orm import Session
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
 
 # Add the parent directory to the path to import from src
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.db.database import SessionLocal
-from src.db.models import Category, Expense
+from src.db.database import SessionLocal, engine as default_engine
+from src.db.models import Category, Expense, CHANGE_JOURNAL_TRIGGERS, DAILY_TOTAL_TRIGGERS, UPSERT_DAILY_TOTAL_SQL
+from src.db.schema import ensure_schema
+from src.services.anomaly_service import BulkScorer
+from src.services.budget_service import BudgetService
+from src.services.fingerprints import expense_fingerprints, held_fingerprints
+from src.services.forecast_service import refresh_forecasts
+from src.services.sync_service import require_full_resync
 
 # Sample categories with descriptions
 CATEGORIES = [
@@ -161,141 +171,326 @@ def ensure_categories_exist(db: Session):
     # Return all categories
     return {cat.name: cat for cat in db.query(Category).all()}
 
-def generate_realistic_monthly_expenses(db: Session, categories: dict, num_months: int = 12):
-    """Generate realistic monthly expenses with patterns."""
+
+DEFAULT_SEED = 42
+
+# Rows handed to each executemany call when writing to SQLite
+INSERT_CHUNK_SIZE = 50_000
+
+INSERT_EXPENSE_SQL = (
+    "INSERT INTO expenses (amount, description, date, category_id, fingerprint, anomaly_score, is_anomaly) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+# Maintained per row by a trigger for normal writes; bulk loads aggregate instead
+DAILY_TOTALS_INSERT_TRIGGER = "expenses_daily_totals_insert"
+
+# Bulk loads aren't journaled row by row; clients are sent into a full resync instead
+EXPENSE_JOURNAL_TRIGGERS = {
+    name: trigger for name, trigger in CHANGE_JOURNAL_TRIGGERS.items() if name.startswith("expenses_")
+}
+
+def month_range(num_months: int):
+    """Return (year, month) pairs for the last ``num_months`` months, oldest first."""
     today = datetime.now()
-    end_date = datetime(today.year, today.month, 1)  # First day of current month
-    
-    expenses = []
-    total_by_category = {}
-    
-    # Generate data for the specified number of months
+    months = []
     for i in range(num_months - 1, -1, -1):
-        # Calculate year and month
-        target_month = end_date.month - i
-        target_year = end_date.year
+        target_month = today.month - i
+        target_year = today.year
         while target_month <= 0:
             target_month += 12
             target_year -= 1
-        
-        # Get days in month
-        days_in_month = calendar.monthrange(target_year, target_month)[1]
-        
-        # For each category, create expenses
-        for category_name, base_budget in MONTHLY_BUDGET.items():
-            category = categories.get(category_name)
-            if not category:
-                continue
-                
-            # Apply seasonal factor if applicable
+        months.append((target_year, target_month))
+    return months
+
+def _expense_counts(rng: np.random.Generator, category_name: str, seasonal_factor: float, households: int):
+    """Number of expenses each household has in a category for one month."""
+    if category_name == "Housing":
+        # Usually just one monthly payment
+        return np.ones(households, dtype=np.int64)
+    if category_name in ["Utilities", "Education", "Health"]:
+        # Fewer, larger expenses
+        return rng.integers(1, 4, households)
+    if category_name == "Travel":
+        # Occasional expenses, more of them in peak season
+        if seasonal_factor > 1.2:
+            return rng.integers(1, 4, households)
+        return rng.integers(0, 2, households)
+    # More frequent expenses
+    return rng.integers(3, 9, households)
+
+def expected_expenses_per_household(months) -> float:
+    """Average number of expenses one household produces over ``months``."""
+    total = 0.0
+    for _, target_month in months:
+        for category_name in MONTHLY_BUDGET:
             seasonal_factor = SEASONAL_FACTORS.get(category_name, {}).get(target_month, 1.0)
-            monthly_budget = base_budget * seasonal_factor
-            
-            # Track total by category
-            if category_name not in total_by_category:
-                total_by_category[category_name] = 0
-                
-            # Determine how many expenses to create for this category this month
             if category_name == "Housing":
-                # Usually just one monthly payment
-                num_expenses = 1
+                total += 1
             elif category_name in ["Utilities", "Education", "Health"]:
-                # Fewer, larger expenses
-                num_expenses = random.randint(1, 3)
+                total += 2
             elif category_name == "Travel":
-                # Occasional expenses
-                if seasonal_factor > 1.2:
-                    num_expenses = random.randint(1, 3)
-                else:
-                    num_expenses = random.randint(0, 1)
+                total += 2 if seasonal_factor > 1.2 else 0.5
             else:
-                # More frequent expenses
-                num_expenses = random.randint(3, 8)
-            
-            # Skip if no expenses this month
-            if num_expenses == 0:
-                continue
-                
-            # Create the expenses
-            remaining_budget = monthly_budget
-            
-            for j in range(num_expenses):
-                # Last expense gets the remainder
-                if j == num_expenses - 1:
-                    amount = remaining_budget
-                else:
-                    # Random portion of remaining budget
-                    max_amount = remaining_budget * 0.8
-                    min_amount = remaining_budget * 0.1
-                    amount = round(random.uniform(min_amount, max_amount), 2)
-                    remaining_budget -= amount
-                
-                # Random day in the month
-                expense_day = random.randint(1, days_in_month)
-                expense_date = datetime(target_year, target_month, expense_day)
-                
-                # Get random description
-                description = random.choice(EXPENSE_DESCRIPTIONS.get(
-                    category_name, [f"Expense for {category_name}"]))
-                
-                # Create expense
-                expense = Expense(
-                    amount=amount,
-                    description=description,
-                    date=expense_date,
-                    category_id=category.id
-                )
-                expenses.append(expense)
-                total_by_category[category_name] += amount
-    
-    # Add all expenses to db
-    db.add_all(expenses)
-    db.commit()
-    
-    return expenses, total_by_category
+                total += 5.5
+    return total
+
+def _split_budgets(rng: np.random.Generator, counts, budget: float):
+    """Split ``budget`` across each household's expenses in one pass.
+
+    Every expense but the last takes 10-80% of what is left of the budget and
+    the last one takes the remainder. The remaining budget before expense j is
+    ``budget * prod(1 - share_k for k < j)``, which is computed for all
+    households at once as a cumulative sum of logs, reset at group starts.
+    """
+    share = rng.uniform(0.1, 0.8, int(counts.sum()))
+    ends = np.cumsum(counts)[counts > 0]
+    starts = ends - counts[counts > 0]
+
+    log_left = np.log1p(-share)
+    log_left[ends - 1] = 0.0
+    share[ends - 1] = 1.0
+    exclusive = np.cumsum(log_left) - log_left
+    exclusive -= np.repeat(exclusive[starts], counts[counts > 0])
+    return np.round(budget * np.exp(exclusive) * share, 2)
+
+def generate_month(seed_sequence, target_year: int, target_month: int, households: int, category_ids: dict) -> dict:
+    """Generate one month of expenses for ``households`` households as column arrays."""
+    rng = np.random.default_rng(seed_sequence)
+    days_in_month = calendar.monthrange(target_year, target_month)[1]
+    # SQLAlchemy stores DateTime columns on SQLite in this text format
+    day_strings = np.array(
+        [f"{target_year:04d}-{target_month:02d}-{day:02d} 00:00:00.000000" for day in range(1, days_in_month + 1)],
+        dtype=object,
+    )
+
+    amounts, descriptions, dates, categories = [], [], [], []
+    for category_name, base_budget in MONTHLY_BUDGET.items():
+        category_id = category_ids.get(category_name)
+        if category_id is None:
+            continue
+
+        # Apply seasonal factor if applicable
+        seasonal_factor = SEASONAL_FACTORS.get(category_name, {}).get(target_month, 1.0)
+        counts = _expense_counts(rng, category_name, seasonal_factor, households)
+        num_expenses = int(counts.sum())
+        if num_expenses == 0:
+            continue
+
+        choices = np.array(
+            EXPENSE_DESCRIPTIONS.get(category_name, [f"Expense for {category_name}"]), dtype=object
+        )
+        amounts.append(_split_budgets(rng, counts, base_budget * seasonal_factor))
+        descriptions.append(choices[rng.integers(0, len(choices), num_expenses)])
+        dates.append(day_strings[rng.integers(0, days_in_month, num_expenses)])
+        categories.append(np.full(num_expenses, category_id, dtype=np.int64))
+
+    if not amounts:
+        return {"amount": np.empty(0), "description": np.empty(0, dtype=object),
+                "date": np.empty(0, dtype=object), "category_id": np.empty(0, dtype=np.int64),
+                "fingerprint": np.empty(0, dtype=np.int64)}
+    batch = {
+        "amount": np.concatenate(amounts),
+        "description": np.concatenate(descriptions),
+        "date": np.concatenate(dates),
+        "category_id": np.concatenate(categories),
+    }
+    # Hashed here so that --workers spreads the cost too
+    batch["fingerprint"] = np.asarray(expense_fingerprints(
+        batch["date"].tolist(), batch["amount"].tolist(), batch["description"].tolist()
+    ), dtype=np.int64)
+    return batch
+
+def _generate_month_task(task):
+    return generate_month(*task)
+
+def generate_expense_batches(category_ids: dict, num_months: int = 12, households: int = 1,
+                             seed: int = DEFAULT_SEED, workers: int = 1):
+    """Yield one batch of column arrays per month, oldest month first.
+
+    Each month draws from its own child of ``seed``, so the output is the same
+    whether the months are generated in this process or sharded across
+    ``workers`` processes.
+    """
+    months = month_range(num_months)
+    seeds = np.random.SeedSequence(seed).spawn(len(months))
+    tasks = [
+        (month_seed, target_year, target_month, households, category_ids)
+        for month_seed, (target_year, target_month) in zip(seeds, months)
+    ]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(_generate_month_task, tasks)
+    else:
+        for task in tasks:
+            yield generate_month(*task)
+
+def daily_totals(batch) -> list:
+    """(category_id, epoch day, amount, count) rows aggregating a generated batch."""
+    days = batch["date"].astype("U10").astype("datetime64[D]").astype(np.int64)
+    first_day = days.min()
+    # Pack (category, day) into one integer key; a 1-D unique is far cheaper than unique rows
+    keys, inverse = np.unique(batch["category_id"].astype(np.int64) << 32 | (days - first_day), return_inverse=True)
+    amounts = np.bincount(inverse, weights=batch["amount"])
+    counts = np.bincount(inverse)
+    return list(zip((keys >> 32).tolist(), ((keys & 0xFFFFFFFF) + first_day).tolist(), amounts.tolist(), counts.tolist()))
+
+def claimed_fingerprints(cursor, batch) -> list:
+    """The fingerprint each row of ``batch`` is inserted with: the first row of each fingerprint gets it,
+    unless an expense already in the table holds it; the others get None."""
+    fingerprints = batch["fingerprint"]
+    claimed = np.zeros(len(fingerprints), dtype=bool)
+    unique, first = np.unique(fingerprints, return_index=True)
+    claimed[first] = True
+    # Fingerprints include the day, so only days that already have expenses can collide
+    days = batch["date"].astype("U10").astype("datetime64[D]").astype(np.int64)
+    if len(days) and cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM daily_totals WHERE day BETWEEN ? AND ? AND count > 0)",
+        (int(days.min()), int(days.max())),
+    ).fetchone()[0]:
+        held = held_fingerprints(cursor, unique.tolist())
+        if held:
+            claimed &= ~np.isin(fingerprints, list(held))
+    return [fingerprint if keep else None for fingerprint, keep in zip(fingerprints.tolist(), claimed.tolist())]
+
+def write_expense_batches(engine, batches, chunk_size: int = INSERT_CHUNK_SIZE):
+    """Insert generated batches with chunked executemany calls.
+
+    Bypasses the ORM entirely and relaxes ``synchronous`` for the duration of
+    the load. The per-row daily_totals and change journal triggers are
+    dropped inside each batch's transaction (other connections never see
+    them missing); the batch's totals are added in one aggregated upsert
+    instead, and sync clients are told to resync fully at the end. Rows are
+    inserted with their precomputed fingerprints already claimed and with
+    anomaly scores computed per batch (see ``BulkScorer``). Anomaly
+    statistics, budget counters and forecasts are rebuilt once at the end.
+    Returns the number of rows written and the total per category id.
+    """
+    suspended = {DAILY_TOTALS_INSERT_TRIGGER: DAILY_TOTAL_TRIGGERS[DAILY_TOTALS_INSERT_TRIGGER], **EXPENSE_JOURNAL_TRIGGERS}
+    written = 0
+    totals_by_category = {}
+    with Session(engine) as db:
+        scorer = BulkScorer(db)
+    raw_connection = engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+        cursor.execute("PRAGMA synchronous = OFF")
+        try:
+            for batch in batches:
+                cursor.execute("BEGIN IMMEDIATE")
+                try:
+                    rows = list(zip(
+                        batch["amount"].tolist(),
+                        batch["description"].tolist(),
+                        batch["date"].tolist(),
+                        batch["category_id"].tolist(),
+                        claimed_fingerprints(cursor, batch),
+                        *scorer.score(batch["category_id"], batch["amount"]),
+                    ))
+                    for name in suspended:
+                        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                    for start in range(0, len(rows), chunk_size):
+                        cursor.executemany(INSERT_EXPENSE_SQL, rows[start:start + chunk_size])
+                    if len(rows):
+                        cursor.executemany(UPSERT_DAILY_TOTAL_SQL, daily_totals(batch))
+                    for trigger in suspended.values():
+                        cursor.execute(trigger)
+                    raw_connection.commit()
+                except BaseException:
+                    raw_connection.rollback()
+                    raise
+                written += len(rows)
+
+                if len(rows):
+                    category_ids, inverse = np.unique(batch["category_id"], return_inverse=True)
+                    sums = np.bincount(inverse, weights=batch["amount"])
+                    for category_id, total in zip(category_ids.tolist(), sums.tolist()):
+                        totals_by_category[category_id] = totals_by_category.get(category_id, 0) + total
+        finally:
+            cursor.execute("PRAGMA synchronous = FULL")
+            cursor.close()
+    finally:
+        raw_connection.close()
 
-def main():
+    with Session(engine) as db:
+        conn = db.connection()
+        for name in EXPENSE_JOURNAL_TRIGGERS:
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        scorer.save(db)
+        BudgetService(db).recalculate()
+        for trigger in EXPENSE_JOURNAL_TRIGGERS.values():
+            conn.exec_driver_sql(trigger)
+        require_full_resync(conn)
+        db.commit()
+    refresh_forecasts(engine.url.database)
+    return written, totals_by_category
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate realistic mock expenses.")
+    parser.add_argument("months", nargs="?", type=int, default=12, help="Number of months of history (default: 12)")
+    parser.add_argument("--households", type=int, default=1, help="Independent households to simulate per month")
+    parser.add_argument("--rows", type=int, help="Approximate number of expenses; sets --households accordingly")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Random seed (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes used to generate months in parallel")
+    parser.add_argument("--database", help="SQLite file to write to instead of data/expenses.db")
+    parser.add_argument("--yes", action="store_true", help="Delete existing expenses without asking")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main function to generate quality mock data."""
-    db = SessionLocal()
+    args = parse_args(argv)
+    engine = default_engine
+    session_factory = SessionLocal
+    if args.database:
+        engine = create_engine(f"sqlite:///{args.database}")
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    ensure_schema(engine)
+
+    db = session_factory()
     try:
         # First, clear out existing expenses
         expense_count = db.query(Expense).count()
         if expense_count > 0:
-            confirmation = input(f"There are {expense_count} existing expenses. Delete them first? (yes/no): ")
+            if args.yes:
+                confirmation = "yes"
+            else:
+                confirmation = input(f"There are {expense_count} existing expenses. Delete them first? (yes/no): ")
             if confirmation.lower() in ["yes", "y"]:
                 db.query(Expense).delete()
                 db.commit()
                 print(f"Deleted {expense_count} existing expenses.")
             else:
                 print("Keeping existing expenses.")
-        
+
         print("Ensuring categories exist...")
         categories = ensure_categories_exist(db)
-        
-        num_months = 12  # Default to 12 months
-        if len(sys.argv) > 1:
-            try:
-                num_months = int(sys.argv[1])
-            except ValueError:
-                print(f"Invalid argument: {sys.argv[1]}. Using default value of {num_months}.")
-        
-        print(f"Generating realistic expenses for the past {num_months} months...")
-        expenses, totals = generate_realistic_monthly_expenses(db, categories, num_months)
-        
-        print(f"Successfully generated {len(expenses)} expenses.")
-        
-        # Print summary
-        print("\nSummary by category:")
-        grand_total = 0
-        for category, total in sorted(totals.items(), key=lambda x: -x[1]):
-            print(f"  {category}: ${total:.2f}")
-            grand_total += total
-            
-        print(f"\nTotal expenses: ${grand_total:.2f}")
-        print(f"Average monthly spending: ${grand_total / num_months:.2f}")
-            
+        category_ids = {name: category.id for name, category in categories.items()}
     finally:
         db.close()
 
+    households = args.households
+    if args.rows:
+        per_household = expected_expenses_per_household(month_range(args.months))
+        households = max(1, int(np.ceil(args.rows / per_household)))
+
+    print(f"Generating realistic expenses for the past {args.months} months ({households} household(s))...")
+    started = time.perf_counter()
+    batches = generate_expense_batches(category_ids, args.months, households, args.seed, args.workers)
+    written, totals_by_id = write_expense_batches(engine, batches)
+    elapsed = time.perf_counter() - started
+
+    print(f"Successfully generated {written} expenses in {elapsed:.2f}s ({written / max(elapsed, 1e-9):,.0f} rows/s).")
+
+    # Print summary
+    names_by_id = {category_id: name for name, category_id in category_ids.items()}
+    print("\nSummary by category:")
+    grand_total = 0
+    for category_id, total in sorted(totals_by_id.items(), key=lambda x: -x[1]):
+        print(f"  {names_by_id[category_id]}: ${total:.2f}")
+        grand_total += total
+
+    print(f"\nTotal expenses: ${grand_total:.2f}")
+    print(f"Average monthly spending: ${grand_total / args.months:.2f}")
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,32 @@
+import argparse
+import sys
+import os
+
+# Add the parent directory to the path to import from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.db.database import SessionLocal
+from src.services.currency_service import CurrencyService, settings
+
+def main():
+    parser = argparse.ArgumentParser(description="Load exchange rates (CSV: date,currency,rate) into the database.")
+    parser.add_argument("path", nargs="?", default=str(settings["rates_file"]), help="Rate file (default: EXCHANGE_RATES_FILE)")
+    parser.add_argument("--force", action="store_true", help="Reload even if the file has not changed")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.path):
+        parser.error(f"{args.path} does not exist")
+    db = SessionLocal()
+    try:
+        loaded = CurrencyService(db).load_rates(args.path, force=args.force)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        db.close()
+    if loaded is None:
+        print(f"{args.path} is unchanged since it was last loaded (use --force to reload).")
+    else:
+        print(f"Loaded {loaded} rates against {settings['base']} from {args.path}.")
+
+if __name__ == "__main__":
+    main()
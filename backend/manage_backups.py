@@ -0,0 +1,63 @@
+"""Online backups of the expenses database (see src/db/backup.py).
+
+Examples:
+    python manage_backups.py create                              # snapshot while the app keeps running
+    python manage_backups.py list
+    python manage_backups.py prune                               # apply the BACKUP_KEEP_* retention policy
+    python manage_backups.py restore --at 2026-10-18T12:00:00Z   # newest snapshot taken at or before then
+"""
+import argparse
+import sys
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add the parent directory to the path to import from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.db import backup
+from src.db.database import DATABASE_PATH
+
+def _time(value: str) -> datetime:
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return moment if moment.tzinfo else moment.astimezone(timezone.utc)
+
+def list_snapshots(args):
+    print(f"{'snapshot':<50} {'taken (UTC)':<20} {'size KiB':>10}")
+    for snapshot in backup.list_backups(args.database):
+        print(f"{snapshot['name']:<50} {snapshot['takenAt']:%Y-%m-%d %H:%M:%S} {snapshot['size'] / 1024:>10.1f}")
+
+def create(args):
+    snapshot = backup.create_backup(args.database)
+    print(f"{snapshot['name']}: {snapshot['databaseSize'] / 1024:.0f} KiB compressed to "
+          f"{snapshot['size'] / 1024:.0f} KiB in {snapshot['seconds']:.2f}s "
+          f"({snapshot['steps']} steps, {snapshot['restarts']} restarts)")
+
+def prune(args):
+    removed = backup.prune_backups(args.database)
+    for name in removed:
+        print(f"removed {name}")
+    print(f"{len(removed)} snapshot(s) removed.")
+
+def restore(args):
+    snapshot = backup.restore_backup(args.database, args.at)
+    print(f"Restored {args.database} from {snapshot['name']} (the previous contents were snapshotted first).")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create, list, prune and restore database snapshots.")
+    parser.add_argument("--database", type=Path, default=DATABASE_PATH, help="Database file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="List snapshots, newest first").set_defaults(fn=list_snapshots)
+    commands.add_parser("create", help="Snapshot the database now").set_defaults(fn=create)
+    commands.add_parser("prune", help="Delete snapshots outside the retention policy").set_defaults(fn=prune)
+    restore_parser = commands.add_parser("restore", help="Restore a snapshot; stop the app first")
+    restore_parser.add_argument("--at", type=_time, help="Point in time (ISO 8601, default: the newest snapshot)")
+    restore_parser.set_defaults(fn=restore)
+    args = parser.parse_args(argv)
+    try:
+        return args.fn(args) or 0
+    except backup.BackupError as e:
+        parser.error(str(e))
+
+if __name__ == "__main__":
+    sys.exit(main())
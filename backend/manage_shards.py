@@ -0,0 +1,75 @@
+"""Maintenance for per-user databases (STORAGE_MODE=sharded).
+
+Examples:
+    python manage_shards.py list
+    python manage_shards.py migrate              # open every shard, applying schema changes
+    python manage_shards.py check                # PRAGMA integrity_check on every shard
+    python manage_shards.py optimize --vacuum    # PRAGMA optimize, then VACUUM
+    python manage_shards.py token alice          # sign a JWT for local testing
+"""
+import argparse
+import sys
+import os
+
+# Add the parent directory to the path to import from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.auth import create_token
+from src.db.schema import current_version
+from src.db.shards import shard_manager
+
+def list_shards(args):
+    print(f"{'tenant':<40} {'size KiB':>10} {'schema':>7} {'expenses':>9}")
+    for tenant, shard in shard_manager.each_shard():
+        size = shard_manager.path_for(tenant).stat().st_size / 1024
+        with shard.engine.connect() as conn:
+            expenses = conn.exec_driver_sql("SELECT COUNT(*) FROM expenses").scalar()
+        print(f"{tenant:<40} {size:>10.1f} {current_version(shard.engine):>7} {expenses:>9}")
+
+def migrate(args):
+    count = sum(1 for _ in shard_manager.each_shard())
+    print(f"{count} shard(s) at the current schema version.")
+
+def check(args):
+    failures = 0
+    for tenant, shard in shard_manager.each_shard():
+        with shard.engine.connect() as conn:
+            result = conn.exec_driver_sql("PRAGMA integrity_check").scalar()
+        if result != "ok":
+            failures += 1
+            print(f"{tenant}: {result}")
+    print(f"Integrity check finished, {failures} shard(s) with problems.")
+    return 1 if failures else 0
+
+def optimize(args):
+    for tenant, shard in shard_manager.each_shard():
+        with shard.engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA optimize")
+            if args.vacuum:
+                conn.exec_driver_sql("VACUUM")
+        print(f"{tenant}: optimized")
+
+def token(args):
+    print(create_token(args.tenant, args.expires_in))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain per-user shard databases.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="List shards with their size and row counts").set_defaults(fn=list_shards)
+    commands.add_parser("migrate", help="Bring every shard to the current schema").set_defaults(fn=migrate)
+    commands.add_parser("check", help="Run an integrity check on every shard").set_defaults(fn=check)
+    optimize_parser = commands.add_parser("optimize", help="Refresh query planner statistics")
+    optimize_parser.add_argument("--vacuum", action="store_true", help="Also rebuild each file to reclaim space")
+    optimize_parser.set_defaults(fn=optimize)
+    token_parser = commands.add_parser("token", help="Sign a bearer token for a tenant (needs JWT_SECRET)")
+    token_parser.add_argument("tenant")
+    token_parser.add_argument("--expires-in", type=int, help="Lifetime in seconds")
+    token_parser.set_defaults(fn=token)
+    args = parser.parse_args(argv)
+    try:
+        return args.fn(args) or 0
+    finally:
+        shard_manager.close_all()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+import argparse
+import sys
+import os
+
+# Add the parent directory to the path to import from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.db.database import DATABASE_PATH
+from src.db.legacy import LegacyMigration, MigrationError
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a database written by the legacy backend (main.py) to the current layout "
+                    "while the legacy app keeps running. Safe to interrupt and run again."
+    )
+    parser.add_argument("path", nargs="?", default=str(DATABASE_PATH), help="Database file (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Expenses copied per transaction")
+    parser.add_argument("--pause", type=float, default=0.05, help="Seconds between batches, for the legacy app's writes")
+    parser.add_argument("--status", action="store_true", help="Only show the progress of an earlier run")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.path):
+        parser.error(f"{args.path} does not exist")
+    migration = LegacyMigration(args.path, batch_size=args.batch_size, pause=args.pause, log=print)
+    try:
+        if args.status:
+            state = migration.state()
+            print(state or "No migration has been started.")
+            return
+        totals = migration.run()
+    except MigrationError as e:
+        parser.error(str(e))
+    finally:
+        migration.close()
+    print(f"Verified {totals['expenses']} expenses totalling {totals['amount']:.2f} "
+          f"in {totals['categories']} categories.")
+    print("Stop the legacy app and start the current one; it completes the schema on startup.")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import Optional
+from datetime import date
 from src.db.database import get_db
 from src.services.analytics_service import AnalyticsService
+from src.services.anomaly_service import AnomalyService
+from src.services.forecast_service import ForecastService
+from src.services.recurring_service import RecurringService
+from src.core.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 @router.get("/analytics/summary")
 def get_analytics_summary(
@@ -12,4 +17,67 @@ def get_analytics_summary(
     db: Session = Depends(get_db)
 ):
     service = AnalyticsService(db)
-    return service.get_summary(time_range) 
\ No newline at end of file
+    return service.get_summary(time_range) 
+
+@router.get("/analytics/range")
+def get_range_totals(
+    start: date = Query(..., description="First day of the range (inclusive)"),
+    end: date = Query(..., description="Last day of the range (inclusive)"),
+    category_id: Optional[int] = Query(None, description="Only report this category"),
+    db: Session = Depends(get_db)
+):
+    service = AnalyticsService(db)
+    try:
+        return service.get_range_totals(start, end, category_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/analytics/buckets")
+def get_time_buckets(
+    granularity: str = Query("day", pattern="^(day|week|month|quarter|year)$", description="Bucket size; weeks start on Monday"),
+    start: Optional[date] = Query(None, description="First day (inclusive); defaults to a few buckets before end"),
+    end: Optional[date] = Query(None, description="Last day (inclusive, defaults to today)"),
+    group_by: Optional[str] = Query(None, pattern="^category$", description="Also return a series per category"),
+    db: Session = Depends(get_db)
+):
+    service = AnalyticsService(db)
+    try:
+        return service.get_buckets(granularity, start, end, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/analytics/compare")
+def compare_periods(
+    period: str = Query("month", pattern="^(week|month|quarter|year)$", description="Period to date: 'week', 'month', 'quarter' or 'year'"),
+    basis: str = Query("previous", pattern="^(previous|year_ago)$", description="Compare with the previous period or the same dates a year earlier"),
+    as_of: Optional[date] = Query(None, description="Last day of the current period (defaults to today)"),
+    windows: str = Query("30,90", pattern=r"^\d+(,\d+)*$", description="Rolling average windows in days"),
+    db: Session = Depends(get_db)
+):
+    service = AnalyticsService(db)
+    rolling_windows = [int(window) for window in windows.split(",") if int(window) > 0]
+    return service.compare_periods(period, basis, as_of, rolling_windows)
+
+@router.get("/analytics/recurring")
+def get_recurring_charges(
+    include_inactive: bool = Query(False, description="Also list recurring charges that have stopped"),
+    as_of: Optional[date] = Query(None, description="Day to predict next charges from (defaults to today)"),
+    db: Session = Depends(get_db)
+):
+    service = RecurringService(db)
+    return service.get_recurring(include_inactive, as_of)
+
+@router.get("/analytics/anomalies")
+def get_anomalies(
+    skip: int = 0,
+    limit: int = 100,
+    category_id: Optional[int] = Query(None, description="Only anomalies in this category"),
+    db: Session = Depends(get_db)
+):
+    service = AnomalyService(db)
+    return service.get_anomalies(skip=skip, limit=limit, category_id=category_id)
+
+@router.get("/analytics/forecast")
+def get_forecast(db: Session = Depends(get_db)):
+    service = ForecastService(db)
+    return service.get_forecast()
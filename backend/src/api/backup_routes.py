@@ -0,0 +1,49 @@
+from pathlib import Path
+from typing import Dict
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+from src.core.admin import require_admin
+from src.core.maintenance import databases
+from src.db import backup
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+def _public(snapshot: Dict) -> Dict:
+    details = {key: value for key, value in snapshot.items() if key != "path"}
+    details["takenAt"] = snapshot["takenAt"].isoformat()
+    return details
+
+def _download(snapshot: Dict) -> FileResponse:
+    return FileResponse(snapshot["path"], media_type="application/gzip", filename=snapshot["name"])
+
+@router.get("/debug/backups")
+def list_backups():
+    """Snapshots of every database, newest first."""
+    return [_public(snapshot) for snapshot in backup.list_backups()]
+
+@router.post("/debug/backups")
+def create_backups(download: bool = Query(False, description="Send the new snapshot instead of its details")):
+    """Snapshot every database now and apply the retention policy.
+
+    With ``download=true`` (main database only) the response is the snapshot
+    itself, a consistent gzipped copy of the database as of the request.
+    """
+    engines = [db_engine for _, db_engine in databases()]
+    if download and len(engines) != 1:
+        raise HTTPException(status_code=400, detail="download=true needs a single database; download snapshots by name")
+    snapshots = []
+    for db_engine in engines:
+        path = Path(db_engine.url.database)
+        snapshots.append(backup.create_backup(path))
+        backup.prune_backups(path)
+    if download:
+        return _download(snapshots[0])
+    return [_public(snapshot) for snapshot in snapshots]
+
+@router.get("/debug/backups/{name}")
+def download_backup(name: str):
+    """Download a snapshot (gzipped SQLite database)."""
+    snapshot = backup.find_backup(name)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Backup not found")
+    return _download(snapshot)
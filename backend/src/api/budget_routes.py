@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+from ..db.database import get_db
+from ..models.budget import Budget, BudgetAlert, BudgetCreate
+from ..services.budget_service import BudgetService
+from ..services.category_service import CategoryService
+from ..core.profiling import ProfiledRoute
+
+router = APIRouter(route_class=ProfiledRoute)
+
+@router.post("/budgets/", response_model=Budget)
+def create_budget(budget: BudgetCreate, db: Session = Depends(get_db)):
+    if budget.category_id is not None and CategoryService(db).get_category(budget.category_id) is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    service = BudgetService(db)
+    return service.create_budget(budget)
+
+@router.get("/budgets/", response_model=List[Budget])
+def read_budgets(db: Session = Depends(get_db)):
+    service = BudgetService(db)
+    return service.get_budgets()
+
+@router.get("/budgets/status")
+def read_budget_status(db: Session = Depends(get_db)):
+    service = BudgetService(db)
+    return service.get_status()
+
+@router.get("/budgets/alerts", response_model=List[BudgetAlert])
+def read_budget_alerts(limit: int = 50, db: Session = Depends(get_db)):
+    service = BudgetService(db)
+    return service.get_alerts(limit=limit)
+
+@router.delete("/budgets/{budget_id}")
+def delete_budget(budget_id: int, db: Session = Depends(get_db)):
+    service = BudgetService(db)
+    if not service.delete_budget(budget_id):
+        raise HTTPException(status_code=404, detail="Budget not found")
+    return {"message": "Budget deleted successfully"}
@@ -4,8 +4,9 @@ from typing import List
 from ..db.database import get_db
 from ..models.category import Category, CategoryCreate
 from ..services.category_service import CategoryService
+from ..core.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 @router.post("/categories/", response_model=Category)
 def create_category(category: CategoryCreate, db: Session = Depends(get_db)):
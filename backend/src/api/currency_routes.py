@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from ..db.database import get_db
+from ..services.currency_service import CurrencyService
+from ..core.profiling import ProfiledRoute
+
+router = APIRouter(route_class=ProfiledRoute)
+
+@router.get("/currencies")
+def read_currencies(db: Session = Depends(get_db)):
+    service = CurrencyService(db)
+    return service.get_currencies()
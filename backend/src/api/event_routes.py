@@ -0,0 +1,28 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from ..core.events import broker, topic_for
+from ..db.database import get_db
+
+# Not profiled: a stream stays open for as long as the client listens
+router = APIRouter()
+
+@router.get("/events")
+async def stream_events(db: Session = Depends(get_db), last_event_id: Optional[str] = Header(None)):
+    """Server-Sent Events with a delta after every expense or category change.
+
+    Event types are ``expense.created``, ``expense.updated``,
+    ``expense.deleted``, ``category.created``, ``category.updated`` and
+    ``category.deleted``; ``refresh`` asks the client to refetch, and
+    ``overflow`` ends the stream of a client that fell behind.
+    """
+    if not broker.running:
+        raise HTTPException(status_code=503, detail="Event stream is not available")
+    bind = db.get_bind()
+    subscriber = broker.subscribe(topic_for(bind), bind, last_event_id)
+    return StreamingResponse(
+        broker.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,21 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from ..db.database import get_db
 from ..models.expense import Expense, ExpenseCreate
-from ..services.expense_service import ExpenseService
+from ..services import write_queue
+from ..services.expense_service import EXPENSE_FIELDS, ExpenseService
+from ..services.suggest_service import SuggestService
+from ..utils.columnar import BINARY_MEDIA_TYPE, encode_binary, encode_json, encode_records
+from ..core.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 @router.post("/expenses/", response_model=Expense)
-def create_expense(expense: ExpenseCreate, db: Session = Depends(get_db)):
-    service = ExpenseService(db)
-    return service.create_expense(expense)
+async def create_expense(expense: ExpenseCreate, db: Session = Depends(get_db)):
+    try:
+        if write_queue.enabled():
+            # Committed together with other requests' expenses by the database's writer thread
+            return await write_queue.submit(db.get_bind(), expense)
+        return await run_in_threadpool(ExpenseService(db).create_expense, expense)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/expenses/", response_model=List[Expense])
-def read_expenses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_expenses(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,amount,date,category_id"),
+    response_format: str = Query("json", alias="format", pattern="^(json|columnar|binary)$",
+                                 description="json (list of objects), columnar (array per field) or binary (typed arrays)"),
+    db: Session = Depends(get_db)
+):
     service = ExpenseService(db)
-    return service.get_expenses(skip=skip, limit=limit)
+    if fields is None and response_format == "json":
+        return service.get_expenses(skip=skip, limit=limit)
+
+    selected = [field.strip() for field in fields.split(",") if field.strip()] if fields else list(EXPENSE_FIELDS)
+    unknown = [field for field in selected if field not in EXPENSE_FIELDS]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(EXPENSE_FIELDS)}")
+    columns = service.get_expense_columns(list(dict.fromkeys(selected)), skip=skip, limit=limit)
+    if response_format == "binary":
+        return Response(encode_binary(columns, EXPENSE_FIELDS), media_type=BINARY_MEDIA_TYPE)
+    if response_format == "columnar":
+        return Response(encode_json(columns, EXPENSE_FIELDS), media_type="application/json")
+    return Response(encode_records(columns), media_type="application/json")
+
+@router.get("/expenses/suggest")
+def suggest_descriptions(
+    prefix: str = Query(..., min_length=1, description="Start of the description typed so far"),
+    limit: int = Query(8, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """Descriptions used before that start with ``prefix``, ranked by frequency and recency."""
+    return SuggestService(db).suggest(prefix, limit=limit)
 
 @router.get("/expenses/{expense_id}", response_model=Expense)
 def read_expense(expense_id: int, db: Session = Depends(get_db)):
@@ -25,6 +63,17 @@ def read_expense(expense_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Expense not found")
     return expense
 
+@router.put("/expenses/{expense_id}", response_model=Expense)
+def update_expense(expense_id: int, expense: ExpenseCreate, db: Session = Depends(get_db)):
+    service = ExpenseService(db)
+    try:
+        updated = service.update_expense(expense_id, expense)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Expense not found")
+    return updated
+
 @router.delete("/expenses/{expense_id}")
 def delete_expense(expense_id: int, db: Session = Depends(get_db)):
     service = ExpenseService(db)
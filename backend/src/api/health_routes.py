@@ -0,0 +1,52 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from src.core import readiness
+from src.db import schema
+from src.db.database import SessionLocal, engine
+from src.services.analytics_service import AnalyticsService
+from src.services.category_service import CategoryService
+from src.services.expense_service import ExpenseService
+from src.services.suggest_service import index_for
+
+router = APIRouter()
+
+@readiness.warmer("database")
+def check_database():
+    version = schema.current_version(engine)
+    if version != schema.SCHEMA_VERSION:
+        raise RuntimeError(f"Schema version {version} does not match {schema.SCHEMA_VERSION}")
+
+@readiness.warmer("queries")
+def warm_queries():
+    # Configures the mappers, fills SQLAlchemy's statement cache and pulls
+    # the hot pages of the database into SQLite's page cache
+    db = SessionLocal()
+    try:
+        CategoryService(db).get_categories()
+        ExpenseService(db).get_expenses(limit=1)
+        AnalyticsService(db).get_summary()
+    finally:
+        db.close()
+
+@readiness.warmer("suggestions")
+def warm_suggestions():
+    # Builds the description index, the one slow step of the first autocomplete request
+    db = SessionLocal()
+    try:
+        index_for(db)
+    finally:
+        db.close()
+
+@router.get("/health")
+async def health():
+    """Liveness check: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@router.get("/ready")
+def ready():
+    """Readiness check that warms the instance on its first call."""
+    try:
+        timings = readiness.warm_up()
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "detail": str(e)})
+    return {"status": "ready", "warmup_ms": timings}
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Dict
+from ..db.database import get_db
+from ..services.import_service import ImportService
+from ..core.profiling import ProfiledRoute
+
+router = APIRouter(route_class=ProfiledRoute)
+
+@router.get("/export")
+def export_data(db: Session = Depends(get_db)):
+    """Every expense (with its category's name) and category, in the format /import accepts."""
+    service = ImportService(db)
+    return service.export_data()
+
+@router.post("/import")
+def import_data(
+    data: Dict = Body(..., description='{"categories": [{"name": ...}], "expenses": [{"amount", "date", "description", "category"}]}'),
+    on_duplicate: str = Query("skip", pattern="^(skip|update|keep)$",
+                              description="What to do with expenses that already exist: skip, update or keep (import again)"),
+    db: Session = Depends(get_db)
+):
+    service = ImportService(db)
+    try:
+        return service.import_data(data, on_duplicate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Error importing data: {e}")
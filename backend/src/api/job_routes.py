@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, HTTPException
+from src.core.admin import require_admin
+from src.core.scheduler import scheduler
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.get("/debug/jobs")
+def list_jobs():
+    """Maintenance jobs with their triggers and the outcome of their last run."""
+    return scheduler.status()
+
+@router.post("/debug/jobs/{name}/run")
+async def run_job(name: str):
+    """Run a job now, subject to the same single-worker locking as scheduled runs."""
+    if name not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return await scheduler.run(name)
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from src.core import metrics
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from src.core.admin import require_admin
+from src.core.profiling import store
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.get("/debug/profiles")
+def list_profiles():
+    """List the most recent request profiles, newest first."""
+    return store.list()
+
+@router.get("/debug/profiles/{profile_id}")
+def download_profile(profile_id: str):
+    """Download a profile as collapsed stacks (text) or a pstats dump."""
+    profile = store.get(profile_id)
+    if profile is None or not profile["path"].exists():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "text/plain" if profile["format"] == "collapsed" else "application/octet-stream"
+    return FileResponse(profile["path"], media_type=media_type, filename=profile["file"])
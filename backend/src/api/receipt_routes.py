@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from src.db.database import get_db
 from src.services.receipt_service import ReceiptService
 from src.services.expense_service import ExpenseService
 from src.models.expense import Expense
+from src.core.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 @router.post("/receipts/upload", response_model=dict)
 async def upload_receipt(
@@ -42,5 +44,6 @@ async def scan_receipt(
     # Process receipt (simplified now just to save the file)
     expense_data = await receipt_service.process_receipt(file_content, file.filename)
     
-    # Create expense with minimal data
-    return expense_service.create_expense(expense_data) 
\ No newline at end of file
+    # Create expense with minimal data; the service is synchronous, so keep it
+    # off the event loop or it stalls every other request while it waits on the pool
+    return await run_in_threadpool(expense_service.create_expense, expense_data) 
\ No newline at end of file
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from ..db.database import get_db
+from ..services.sync_service import SyncService
+from ..core.profiling import ProfiledRoute
+
+router = APIRouter(route_class=ProfiledRoute)
+
+@router.get("/sync")
+def sync_changes(
+    since: Optional[int] = Query(None, description="Journal version of the client's last sync; omit for a full resync"),
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="Most journal entries to return in one page"),
+    db: Session = Depends(get_db)
+):
+    service = SyncService(db)
+    return service.get_changes(since, limit)
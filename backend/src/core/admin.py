@@ -0,0 +1,24 @@
+import hmac
+import os
+from typing import Optional
+from fastapi import Header, HTTPException, Query
+
+def admin_token() -> Optional[str]:
+    """Token guarding admin and debug features; unset disables them entirely."""
+    return os.getenv("ADMIN_TOKEN") or None
+
+def is_admin_token(candidate: Optional[str]) -> bool:
+    expected = admin_token()
+    if not expected or not candidate:
+        return False
+    return hmac.compare_digest(candidate.encode(), expected.encode())
+
+def require_admin(
+    x_admin_token: Optional[str] = Header(None),
+    admin_token_param: Optional[str] = Query(None, alias="admin_token"),
+):
+    """FastAPI dependency accepting the token as a header or query parameter."""
+    if not admin_token():
+        raise HTTPException(status_code=404, detail="Not found")
+    if not is_admin_token(x_admin_token or admin_token_param):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
@@ -0,0 +1,56 @@
+"""Request identity for the sharded storage mode.
+
+The tenant is the ``sub`` claim of a bearer JWT signed with ``JWT_SECRET``.
+Deployments behind an authenticating proxy can instead set ``TENANT_HEADER``
+to a header the proxy fills in (never expose that setup directly, since the
+header is trusted as-is).
+"""
+import os
+import time
+from typing import Optional
+from fastapi import HTTPException, Request
+from ..utils.lazy import lazy_import
+
+# python-jose is only needed when the sharded mode is on
+jose = lazy_import("jose")
+jwt = lazy_import("jose.jwt")
+
+MAX_TENANT_LENGTH = 128
+
+settings = {
+    "jwt_secret": os.getenv("JWT_SECRET"),
+    "jwt_algorithm": os.getenv("JWT_ALGORITHM", "HS256"),
+    "tenant_header": os.getenv("TENANT_HEADER"),
+}
+
+def create_token(tenant: str, expires_in: Optional[int] = None) -> str:
+    """Sign a token for ``tenant``, e.g. for scripts and local testing."""
+    claims = {"sub": tenant}
+    if expires_in:
+        claims["exp"] = int(time.time()) + expires_in
+    return jwt.encode(claims, settings["jwt_secret"], algorithm=settings["jwt_algorithm"])
+
+def tenant_id(request: Request) -> str:
+    """Identify the user a request belongs to, or reject it with 401."""
+    tenant = _identify(request)
+    if len(tenant) > MAX_TENANT_LENGTH:
+        raise HTTPException(status_code=400, detail="Tenant id is too long")
+    return tenant
+
+def _identify(request: Request) -> str:
+    if settings["tenant_header"]:
+        tenant = request.headers.get(settings["tenant_header"])
+        if tenant:
+            return tenant
+
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token or not settings["jwt_secret"]:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        claims = jwt.decode(token, settings["jwt_secret"], algorithms=[settings["jwt_algorithm"]])
+    except jose.JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"})
+    tenant = claims.get("sub")
+    if not tenant:
+        raise HTTPException(status_code=401, detail="Token has no subject")
+    return str(tenant)
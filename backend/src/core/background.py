@@ -0,0 +1,107 @@
+"""Debounced background work triggered by writes.
+
+A burst of writes should lead to one recomputation shortly after the burst,
+not one per write. ``Debouncer.touch(key)`` records that ``key`` (typically
+a database file) changed; a daemon thread runs ``fn(key)`` once no touch has
+arrived for ``delay`` seconds. Runs for different keys can go to a process
+pool so CPU-heavy work for many databases proceeds in parallel without
+holding the GIL of the serving process. A key touched while its run is in
+progress runs again afterwards. ``done(key)``, if given, is called in the
+serving process after each successful run.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Dict, Hashable, Optional, Set
+
+logger = logging.getLogger("expenses.background")
+
+class Debouncer:
+    def __init__(self, name: str, fn: Callable[[Hashable], object], delay: float, processes: int = 0,
+                 done: Optional[Callable[[Hashable], object]] = None):
+        self.name = name
+        self.fn = fn
+        self.done = done
+        self.delay = delay
+        self.processes = processes
+        self._due: Dict[Hashable, float] = {}
+        self._running: Set[Hashable] = set()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[Executor] = None
+        self._stopped = False
+
+    def touch(self, key: Hashable, delay: Optional[float] = None):
+        """Schedule ``fn(key)`` for ``delay`` seconds from now, replacing an earlier deadline."""
+        with self._condition:
+            if self._stopped:
+                return
+            self._due[key] = time.monotonic() + (self.delay if delay is None else delay)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=f"debounce-{self.name}", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def pending(self, key: Hashable) -> bool:
+        with self._condition:
+            return key in self._due or key in self._running
+
+    def stop(self, timeout: float = 5.0):
+        with self._condition:
+            self._stopped = True
+            self._due.clear()
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    now = time.monotonic()
+                    ready = [key for key, due in self._due.items() if due <= now and key not in self._running]
+                    if ready:
+                        break
+                    waiting = [due for key, due in self._due.items() if key not in self._running]
+                    self._condition.wait(max(min(waiting) - now, 0.01) if waiting else None)
+                if self._stopped:
+                    return
+                for key in ready:
+                    del self._due[key]
+                    self._running.add(key)
+            for key in ready:
+                self._submit(key)
+
+    def _submit(self, key: Hashable):
+        if not self.processes:
+            self._run_inline(key)
+            return
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.processes)
+        started = time.perf_counter()
+        future = self._executor.submit(self.fn, key)
+        future.add_done_callback(lambda done: self._finished(key, started, done.exception()))
+
+    def _run_inline(self, key: Hashable):
+        started = time.perf_counter()
+        try:
+            self.fn(key)
+        except Exception as exc:
+            self._finished(key, started, exc)
+        else:
+            self._finished(key, started, None)
+
+    def _finished(self, key: Hashable, started: float, error: Optional[BaseException]):
+        elapsed = time.perf_counter() - started
+        if error is not None:
+            logger.error("%s for %s failed after %.2fs: %r", self.name, key, elapsed, error)
+        else:
+            logger.info("%s for %s finished in %.2fs", self.name, key, elapsed)
+            if self.done is not None:
+                self.done(key)
+        with self._condition:
+            self._running.discard(key)
+            self._condition.notify()
@@ -0,0 +1,120 @@
+"""Process-local caches that stay correct with several worker processes.
+
+Each worker keeps its own caches, so a write served by one worker has to
+reach the others. SQLite already tracks this: ``PRAGMA data_version`` on a
+connection changes whenever *any other* connection, in any process, commits
+to the database. Every database gets one dedicated watcher connection per
+process that only ever reads this pragma; caches poll it before each lookup
+(a few microseconds) and drop everything when it moves. Because the watcher
+never writes itself, commits made by this process invalidate its caches too.
+
+Caches are keyed by database file, so separate databases never share entries.
+In-memory databases can't be watched and get no cache.
+"""
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+class DataVersionWatcher:
+    """Detects commits to one SQLite database file from any connection."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self.version = self._read()
+
+    def _read(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def on_change(self, callback: Callable[[], None]):
+        self._callbacks.append(callback)
+
+    def poll(self) -> int:
+        """Run the change callbacks if the database changed; return the current version."""
+        with self._lock:
+            version = self._read()
+            if version != self.version:
+                self.version = version
+                for callback in self._callbacks:
+                    callback()
+            return version
+
+    def close(self):
+        self._conn.close()
+
+class LocalCache:
+    """Small LRU cache that is cleared whenever its database changes."""
+
+    def __init__(self, watcher: DataVersionWatcher, maxsize: int = 256):
+        self.watcher = watcher
+        self.maxsize = maxsize
+        self._data: "OrderedDict[object, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        watcher.on_change(self.clear)
+
+    def get(self, key, compute: Callable[[], object]):
+        """Return the cached value for ``key``, computing and storing it on a miss."""
+        version = self.watcher.poll()
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+
+        value = compute()
+        # Don't store a value computed while another connection was committing
+        if self.watcher.poll() == version:
+            with self._lock:
+                self._data[key] = value
+                if len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+_watchers: Dict[str, DataVersionWatcher] = {}
+_caches: Dict[Tuple[str, str], LocalCache] = {}
+_registry_lock = threading.Lock()
+
+def database_path(bind) -> Optional[str]:
+    """File behind ``bind`` (an engine or connection), or None for in-memory and non-SQLite databases."""
+    url = bind.url
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return url.database
+
+def watcher_for(bind) -> Optional[DataVersionWatcher]:
+    path = database_path(bind)
+    if path is None:
+        return None
+    with _registry_lock:
+        watcher = _watchers.get(path)
+        if watcher is None:
+            watcher = _watchers[path] = DataVersionWatcher(path)
+        return watcher
+
+def cache_for(bind, name: str, maxsize: int = 256) -> Optional[LocalCache]:
+    """Named cache for the database behind ``bind`` (an engine or connection)."""
+    watcher = watcher_for(bind)
+    if watcher is None:
+        return None
+    key = (watcher.path, name)
+    with _registry_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = LocalCache(watcher, maxsize)
+        return cache
+
+def forget(bind):
+    """Drop the watcher and caches of a database, e.g. before deleting its file."""
+    path = database_path(bind)
+    with _registry_lock:
+        watcher = _watchers.pop(path, None)
+        for key in [key for key in _caches if key[0] == path]:
+            del _caches[key]
+    if watcher:
+        watcher.close()
@@ -0,0 +1,229 @@
+"""Fan-out of change events to Server-Sent Events clients.
+
+Services publish a small event after each committed mutation; the broker
+formats it once and copies it into the bounded queue of every client
+subscribed to the same database (the topic), so in sharded mode clients
+only see their own tenant's changes. A client whose queue is full is
+dropped rather than allowed to hold memory or slow anyone down: its queue
+is replaced by a single ``overflow`` event and the stream ends, and the
+client reconnects and refetches.
+
+Publishing is safe from request threads; the fan-out itself runs on the
+event loop. Events carry increasing ids and the latest ones are kept per
+topic so a reconnecting client (``Last-Event-ID``) gets what it missed, or
+a ``refresh`` event when that is no longer available. Ids are
+``<epoch>-<sequence>`` with a random epoch per broker: a client that
+reconnects to another worker, or to a restarted one, presents an id from a
+sequence this broker never issued and gets a ``refresh`` rather than a
+replay that silently skips events.
+
+Each worker process has its own broker. Events carry the database's
+``data_version`` after the commit; commits made by other workers move it
+without an event here and are announced as ``refresh`` events, since their
+details are not known. This process's own commits that send no event
+(forecasts, budget changes, maintenance) report themselves with
+``committed`` so they are not mistaken for those. A change the watcher
+sees is only announced on its next poll, giving the commit that caused it
+time to be published or reported.
+"""
+import asyncio
+import itertools
+import json
+import os
+import secrets
+import threading
+from collections import defaultdict, deque
+from typing import AsyncIterator, Deque, Dict, Optional, Set, Tuple
+from . import metrics
+from .cache import database_path, watcher_for
+
+settings = {
+    "queue_size": int(os.getenv("EVENT_QUEUE_SIZE", "100")),
+    "replay_size": int(os.getenv("EVENT_REPLAY_SIZE", "200")),
+    "heartbeat_seconds": float(os.getenv("EVENT_HEARTBEAT_SECONDS", "15")),
+    "poll_seconds": float(os.getenv("EVENT_POLL_SECONDS", "1")),
+}
+
+DROPPED = metrics.REGISTRY.register(metrics.Counter(
+    "events_dropped_clients_total", "Event clients dropped because their queue was full."))
+
+def topic_for(bind) -> str:
+    """Events are scoped to one database file."""
+    return database_path(bind) or ":memory:"
+
+def data_version(bind) -> Optional[int]:
+    """Current ``PRAGMA data_version`` of the database, seen from outside the writer's connection."""
+    watcher = watcher_for(bind)
+    return watcher.poll() if watcher is not None else None
+
+def format_event(event_id: str, event_type: str, data: Dict) -> str:
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+class Subscriber:
+    def __init__(self, topic: str, maxsize: int):
+        self.topic = topic
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize)
+        self.dropped = False
+
+class EventBroker:
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscriber]] = defaultdict(set)
+        self._recent: Dict[str, Deque[Tuple[int, str]]] = {}
+        self.epoch = secrets.token_hex(4)
+        self._sequence = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        # Per topic: data_version seen by the watcher, and the latest one published with an event
+        self._versions: Dict[str, int] = {}
+        self._published: Dict[str, int] = {}
+        self._published_lock = threading.Lock()
+        # Per topic: data_version the watcher saw change to, announced next poll unless explained by then
+        self._unexplained: Dict[str, int] = {}
+        self._binds: Dict[str, object] = {}
+
+    async def start(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._watch_task = asyncio.create_task(self._watch(), name="event-watcher")
+
+    async def stop(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in list(subscribers):
+                self._close(subscriber, None)
+        self._subscribers.clear()
+        self._loop = None
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, topic: str, event_type: str, data: Dict):
+        """Send an event to the topic's subscribers; callable from any thread."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fan_out(topic, event_type, data)
+        else:
+            loop.call_soon_threadsafe(self._fan_out, topic, event_type, data)
+
+    def _next_id(self) -> Tuple[int, str]:
+        sequence = next(self._sequence)
+        return sequence, f"{self.epoch}-{sequence}"
+
+    def _fan_out(self, topic: str, event_type: str, data: Dict):
+        sequence, event_id = self._next_id()
+        message = format_event(event_id, event_type, data)
+        if data.get("dataVersion") is not None:
+            self._explain(topic, data["dataVersion"])
+        recent = self._recent.setdefault(topic, deque(maxlen=settings["replay_size"]))
+        recent.append((sequence, message))
+        for subscriber in list(self._subscribers.get(topic, ())):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+
+    def _explain(self, topic: str, version: int):
+        with self._published_lock:
+            self._published[topic] = max(self._published.get(topic, 0), version)
+
+    def committed(self, topic: str):
+        """Note a commit this process made to the topic's database without publishing an event.
+
+        Call it right after the commit, from any thread.
+        """
+        bind = self._binds.get(topic)
+        version = data_version(bind) if bind is not None else None
+        if version is not None:
+            self._explain(topic, version)
+
+    def _drop(self, subscriber: Subscriber):
+        DROPPED.inc()
+        overflow = format_event(self._next_id()[1], "overflow", {"reason": "client too slow, reconnect and refetch"})
+        self._close(subscriber, overflow)
+
+    def _close(self, subscriber: Subscriber, final: Optional[str]):
+        subscriber.dropped = True
+        self._subscribers.get(subscriber.topic, set()).discard(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        if final is not None:
+            subscriber.queue.put_nowait(final)
+        subscriber.queue.put_nowait(None)
+
+    def subscribe(self, topic: str, bind=None, last_event_id: Optional[str] = None) -> Subscriber:
+        """Register a client; must be called on the event loop."""
+        # Room for the overflow event and end marker when the client is dropped
+        subscriber = Subscriber(topic, max(settings["queue_size"], 2))
+        if last_event_id:
+            epoch, _, after = last_event_id.rpartition("-")
+            if epoch != self.epoch or not after.isdigit():
+                missed = [format_event(self._next_id()[1], "refresh", {"reason": "events came from another worker"})]
+            else:
+                after = int(after)
+                recent = self._recent.get(topic)
+                missed = [message for sequence, message in recent or () if sequence > after]
+                if not recent or recent[0][0] > after + 1 or len(missed) > settings["queue_size"]:
+                    missed = [format_event(self._next_id()[1], "refresh", {"reason": "missed events are no longer available"})]
+            for message in missed:
+                subscriber.queue.put_nowait(message)
+        self._subscribers[topic].add(subscriber)
+        if bind is not None and topic not in self._binds:
+            self._binds[topic] = bind
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.get(subscriber.topic, set()).discard(subscriber)
+
+    async def stream(self, subscriber: Subscriber) -> AsyncIterator[str]:
+        """SSE text for one client, with keep-alive comments while idle."""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), settings["heartbeat_seconds"])
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def _watch(self):
+        """Announce commits made by other processes to subscribed topics."""
+        while True:
+            await asyncio.sleep(settings["poll_seconds"])
+            for topic, bind in list(self._binds.items()):
+                if not self._subscribers.get(topic):
+                    continue
+                watcher = watcher_for(bind)
+                if watcher is None:
+                    continue
+                version = await asyncio.to_thread(watcher.poll)
+                previous = self._versions.get(topic)
+                self._versions[topic] = version
+                # Our own commits move data_version too; only changes still unexplained a poll later need a refresh
+                unexplained = self._unexplained.pop(topic, None)
+                if unexplained is not None and unexplained > self._published.get(topic, 0):
+                    self._fan_out(topic, "refresh", {"reason": "changed by another worker", "dataVersion": unexplained})
+                if previous is not None and version != previous:
+                    self._unexplained[topic] = version
+
+broker = EventBroker()
+
+metrics.REGISTRY.register(metrics.Gauge(
+    "events_subscribers", "Clients connected to /api/events.",
+    callback=lambda: {(): broker.subscriber_count()}))
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""Built-in maintenance jobs for the scheduler.
+
+Database jobs run against the main database, or every shard when
+``STORAGE_MODE=sharded``. Each returns a short summary that ``/debug/jobs``
+reports as the detail of its last run.
+"""
+import os
+import time
+from pathlib import Path
+from typing import Iterator, Tuple
+from . import readiness
+from .events import broker, topic_for
+from .scheduler import scheduler
+from ..db import backup
+from ..db.database import STORAGE_MODE, engine
+from ..services.receipt_service import RECEIPTS_DIR
+from ..services.sync_service import compact_journal
+
+settings = {
+    # Uploaded receipts younger than this may still be waiting for their expense
+    "receipt_grace_hours": float(os.getenv("RECEIPT_ORPHAN_GRACE_HOURS", "24")),
+    # Free pages returned to the filesystem per incremental vacuum run (0: all)
+    "vacuum_pages": int(os.getenv("VACUUM_PAGES", "0")),
+}
+
+def databases() -> Iterator[Tuple[str, object]]:
+    """(name, engine) of the main database, or of every shard."""
+    if STORAGE_MODE == "sharded":
+        # Imported here because shards builds on the database module
+        from ..db.shards import shard_manager
+        for tenant, shard in shard_manager.each_shard():
+            yield tenant, shard.engine
+    else:
+        yield "main", engine
+
+@scheduler.job("optimize", cron="17 3 * * *", jitter=300)
+def optimize_databases():
+    """Refresh query planner statistics with PRAGMA optimize (runs ANALYZE where it helps)."""
+    count = 0
+    for _, db_engine in databases():
+        with db_engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA optimize")
+        broker.committed(topic_for(db_engine))
+        count += 1
+    return f"{count} database(s) optimized"
+
+@scheduler.job("wal_checkpoint", cron="*/15 * * * *", after_write=60, jitter=10)
+def checkpoint_wal():
+    """Copy the write-ahead log back into the database file and truncate it."""
+    pages = 0
+    busy = 0
+    for _, db_engine in databases():
+        with db_engine.connect() as conn:
+            blocked, _, checkpointed = conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").one()
+        busy += blocked
+        pages += max(checkpointed, 0)
+    detail = f"{pages} page(s) checkpointed"
+    return detail + (f", {busy} database(s) busy" if busy else "")
+
+@scheduler.job("incremental_vacuum", cron="37 3 * * *", jitter=300)
+def vacuum_free_pages():
+    """Return free pages to the filesystem in databases created with auto_vacuum=INCREMENTAL."""
+    freed = 0
+    skipped = 0
+    for _, db_engine in databases():
+        with db_engine.connect() as conn:
+            if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+                # Switching an existing database needs a full VACUUM (manage_shards.py optimize --vacuum)
+                skipped += 1
+                continue
+            free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            if free:
+                conn.exec_driver_sql(f"PRAGMA incremental_vacuum({settings['vacuum_pages']})").all()
+                freed += free - conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            broker.committed(topic_for(db_engine))
+    detail = f"{freed} page(s) freed"
+    return detail + (f", {skipped} database(s) without incremental auto_vacuum" if skipped else "")
+
+@scheduler.job("journal_compaction", cron="27 4 * * *", jitter=300)
+def compact_change_journals():
+    """Remove superseded and expired rows from the expense_changes sync journal."""
+    superseded = expired = 0
+    for _, db_engine in databases():
+        with db_engine.begin() as conn:
+            removed = compact_journal(conn)
+        broker.committed(topic_for(db_engine))
+        superseded += removed["superseded"]
+        expired += removed["expired"]
+    return f"{superseded} superseded and {expired} expired journal row(s) removed"
+
+@scheduler.job("backup", cron="7 2 * * *", jitter=300)
+def back_up_databases():
+    """Snapshot every database with the online backup API and prune old snapshots."""
+    count = size = 0
+    removed = []
+    for _, db_engine in databases():
+        path = Path(db_engine.url.database)
+        size += backup.create_backup(path)["size"]
+        removed += backup.prune_backups(path)
+        count += 1
+    return f"{count} database(s) backed up ({size / 1024:.0f} KiB compressed), {len(removed)} old snapshot(s) removed"
+
+@scheduler.job("warm_caches", after_write=2, jitter=1, exclusive=False)
+def warm_caches():
+    """Refill this worker's query caches after writes invalidated them."""
+    if STORAGE_MODE == "sharded":
+        # The warmer reads the main database, which requests never do when sharded
+        return "not warmed: sharded"
+    timings = readiness.rerun(["queries"])
+    return f"warmed in {sum(timings.values()):.1f}ms"
+
+@scheduler.job("shard_eviction", cron="* * * * *", jitter=5, exclusive=False)
+def close_idle_shards():
+    """Dispose of this worker's shard engines unused for SHARD_IDLE_SECONDS."""
+    if STORAGE_MODE != "sharded":
+        return "not sharded"
+    from ..db.shards import shard_manager
+    before = shard_manager.open_count
+    shard_manager.evict_idle()
+    return f"{before - shard_manager.open_count} idle shard(s) closed, {shard_manager.open_count} open"
+
+@scheduler.job("receipt_cleanup", cron="43 4 * * *", jitter=300)
+def remove_orphaned_receipts():
+    """Delete receipt files that no expense refers to."""
+    if not RECEIPTS_DIR.is_dir():
+        return "no receipts directory"
+    referenced = set()
+    for _, db_engine in databases():
+        with db_engine.connect() as conn:
+            paths = conn.exec_driver_sql("SELECT receipt_path FROM expenses WHERE receipt_path IS NOT NULL").scalars()
+            referenced.update(Path(path).name for path in paths)
+
+    cutoff = time.time() - settings["receipt_grace_hours"] * 3600
+    removed = 0
+    for path in RECEIPTS_DIR.iterdir():
+        if path.is_file() and path.name not in referenced and path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return f"{removed} orphaned receipt(s) removed, {len(referenced)} referenced"
@@ -0,0 +1,242 @@
+"""In-process metrics exposed in the Prometheus text format.
+
+Metric updates are plain dictionary operations guarded by a single lock, so
+recording a request or a SQL statement costs on the order of a microsecond.
+Labels are limited to route templates, HTTP methods/status codes and SQL
+statement shapes, which keeps cardinality bounded.
+"""
+import re
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Callable, Dict, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# Distinct SQL strings whose computed labels are cached
+MAX_STATEMENT_LABELS = 512
+
+_lock = threading.Lock()
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple, float] = defaultdict(float)
+
+    def inc(self, labels: Tuple = (), amount: float = 1.0):
+        with _lock:
+            self.values[labels] += amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+class Gauge:
+    """Gauge that is either updated in place or read from ``callback`` at scrape time."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Dict[Tuple, float]]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self.values: Dict[Tuple, float] = defaultdict(float)
+
+    def inc(self, labels: Tuple = (), amount: float = 1.0):
+        with _lock:
+            self.values[labels] += amount
+
+    def dec(self, labels: Tuple = (), amount: float = 1.0):
+        with _lock:
+            self.values[labels] -= amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        values = self.callback() if self.callback else self.values
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = HTTP_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, labels: Tuple = ()):
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {series[-1]!r}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with _lock:
+            lines = [line for metric in self.metrics for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served."))
+
+SQL_STATEMENTS = REGISTRY.register(Counter(
+    "db_statements_total", "SQL statements executed by statement shape.", ("statement",)))
+SQL_LATENCY = REGISTRY.register(Histogram(
+    "db_statement_duration_seconds", "SQL statement latency by statement shape.", ("statement",), SQL_BUCKETS))
+
+POOL_CHECKOUTS = REGISTRY.register(Counter(
+    "db_pool_checkouts_total", "Connections checked out of the SQLAlchemy pool."))
+POOL_WAIT = REGISTRY.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", (), SQL_BUCKETS))
+
+# Engines are held weakly so that disposed shard engines drop out of the gauge
+_engines = weakref.WeakSet()
+
+def _pool_status():
+    status = {}
+    for engine in list(_engines):
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            status[("checked_out",)] = status.get(("checked_out",), 0) + pool.checkedout()
+            status[("idle",)] = status.get(("idle",), 0) + pool.checkedin()
+            status[("overflow",)] = status.get(("overflow",), 0) + max(pool.overflow(), 0)
+    return status
+
+POOL_CONNECTIONS = REGISTRY.register(Gauge(
+    "db_pool_connections", "Pooled connections by state.", ("state",), callback=_pool_status))
+
+_TABLE_PATTERN = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+\"?(\w+)", re.IGNORECASE)
+_statement_labels: Dict[str, str] = {}
+
+def statement_label(statement: str) -> str:
+    """Reduce a SQL statement to a low-cardinality label such as 'SELECT expenses'."""
+    label = _statement_labels.get(statement)
+    if label is None:
+        words = statement.split(None, 1)
+        verb = words[0].upper() if words else "UNKNOWN"
+        table = _TABLE_PATTERN.search(statement)
+        label = f"{verb} {table.group(1)}" if table else verb
+        if len(_statement_labels) < MAX_STATEMENT_LABELS:
+            _statement_labels[statement] = label
+    return label
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start)
+
+def instrument_engine(engine):
+    """Attach statement timing and pool checkout hooks to ``engine``."""
+    _engines.add(engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_start"].pop()
+        label = (statement_label(statement),)
+        SQL_STATEMENTS.inc(label)
+        SQL_LATENCY.observe(elapsed, label)
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_CHECKOUTS.inc()
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request counts, latency and in-flight requests.
+
+    The route label is the matched route template (``/api/expenses/{expense_id}``)
+    rather than the raw path, so ids never end up in label values.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc((method, template, str(status[0])))
+            HTTP_LATENCY.observe(elapsed, (method, template))
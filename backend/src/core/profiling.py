@@ -0,0 +1,247 @@
+"""Opt-in per-request profiling with a bounded on-disk ring buffer.
+
+A request is profiled when it carries ``X-Profile: collapsed|pstats`` (or
+``?profile=...``) together with a valid admin token, or when it is picked by
+``PROFILE_SAMPLE_RATE`` (a fraction of all requests, 0 by default).
+
+Only the endpoint function is profiled, inside whichever thread runs it, so
+sync endpoints executed in the threadpool are captured correctly:
+
+* ``collapsed`` samples the endpoint's thread stack every
+  ``PROFILE_INTERVAL_MS`` and writes ``frame;frame;frame count`` lines that
+  flamegraph.pl and speedscope read directly. Overhead is a few percent.
+* ``pstats`` runs cProfile and writes a file for ``pstats``/snakeviz. It is
+  exact but slows the request down noticeably.
+
+Profiles are stored in ``PROFILE_DIR`` and only the newest
+``PROFILE_MAX_FILES`` are kept.
+"""
+import asyncio
+import cProfile
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import parse_qs
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from .admin import is_admin_token
+
+PROFILE_FORMATS = ("collapsed", "pstats")
+
+settings = {
+    "directory": Path(os.getenv("PROFILE_DIR", "profiles")),
+    "max_files": int(os.getenv("PROFILE_MAX_FILES", "50")),
+    "sample_rate": float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    "sample_format": os.getenv("PROFILE_SAMPLE_FORMAT", "collapsed"),
+    "interval": float(os.getenv("PROFILE_INTERVAL_MS", "1")) / 1000,
+}
+
+_current: ContextVar[Optional["ProfileSession"]] = ContextVar("profile_session", default=None)
+
+class StackSampler:
+    """Periodically records the call stack of one thread as collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+class ProfileSession:
+    """Profiling state for a single request."""
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.result = None
+        self.duration = 0.0
+
+    @contextmanager
+    def capture(self):
+        start = time.perf_counter()
+        if self.kind == "pstats":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                self.result = profiler
+        else:
+            sampler = StackSampler(threading.get_ident(), settings["interval"])
+            sampler.start()
+            try:
+                yield
+            finally:
+                sampler.stop()
+                self.result = sampler.stacks
+        self.duration = time.perf_counter() - start
+
+def profiled(endpoint):
+    """Wrap an endpoint so it is profiled whenever its request asked for it."""
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            session = _current.get()
+            if session is None:
+                return await endpoint(*args, **kwargs)
+            with session.capture():
+                return await endpoint(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        session = _current.get()
+        if session is None:
+            return endpoint(*args, **kwargs)
+        with session.capture():
+            return endpoint(*args, **kwargs)
+    return wrapper
+
+class ProfiledRoute(APIRoute):
+    """Route class that makes every endpoint of a router profilable."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, profiled(endpoint), **kwargs)
+
+class ProfileStore:
+    """Ring buffer of profiles on disk: ``<id>.json`` metadata plus the profile data."""
+
+    def __init__(self, directory: Path, max_files: int):
+        self.directory = directory
+        self.max_files = max_files
+
+    def save(self, session: ProfileSession, method: str, route: str, status: int):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        data_path = self.directory / f"{session.id}.{session.kind}"
+        if session.kind == "pstats":
+            session.result.dump_stats(str(data_path))
+        else:
+            data_path.write_text("".join(f"{stack} {count}\n" for stack, count in session.result.items()))
+
+        metadata = {
+            "id": session.id,
+            "format": session.kind,
+            "method": method,
+            "route": route,
+            "status": status,
+            "duration_ms": round(session.duration * 1000, 3),
+            "created_at": time.time(),
+            "file": data_path.name,
+            "size": data_path.stat().st_size,
+        }
+        (self.directory / f"{session.id}.json").write_text(json.dumps(metadata))
+        self._evict()
+
+    def list(self) -> List[dict]:
+        if not self.directory.exists():
+            return []
+        profiles = []
+        for meta_path in self.directory.glob("*.json"):
+            try:
+                profiles.append(json.loads(meta_path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        if not profile_id.isalnum():
+            return None
+        meta_path = self.directory / f"{profile_id}.json"
+        if not meta_path.exists():
+            return None
+        metadata = json.loads(meta_path.read_text())
+        metadata["path"] = self.directory / metadata["file"]
+        return metadata
+
+    def _evict(self):
+        for profile in self.list()[self.max_files:]:
+            for name in (profile["file"], f"{profile['id']}.json"):
+                try:
+                    (self.directory / name).unlink()
+                except FileNotFoundError:
+                    pass
+
+store = ProfileStore(settings["directory"], settings["max_files"])
+
+def _requested_format(scope) -> Optional[str]:
+    """Format requested by this request, if it is allowed to request one."""
+    headers = dict(scope.get("headers") or [])
+    requested = headers.get(b"x-profile", b"").decode()
+    token = headers.get(b"x-admin-token", b"").decode()
+    if not requested and b"profile=" in scope.get("query_string", b""):
+        params = parse_qs(scope["query_string"].decode())
+        requested = params.get("profile", [""])[0]
+        token = token or params.get("admin_token", [""])[0]
+
+    if requested:
+        if not is_admin_token(token):
+            return None
+        return requested if requested in PROFILE_FORMATS else PROFILE_FORMATS[0]
+    if settings["sample_rate"] and random.random() < settings["sample_rate"]:
+        return settings["sample_format"]
+    return None
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware that starts a profile session for selected requests.
+
+    Profiled responses carry an ``X-Profile-Id`` header naming the stored profile.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        kind = _requested_format(scope) if scope["type"] == "http" else None
+        if kind is None:
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(kind)
+        status = [500]
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", session.id.encode())
+                ]
+            await send(message)
+
+        token = _current.set(session)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _current.reset(token)
+            if session.result is not None:
+                route = getattr(scope.get("route"), "path", scope.get("path", ""))
+                await run_in_threadpool(store.save, session, scope["method"], route, status[0])
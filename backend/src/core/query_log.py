@@ -0,0 +1,167 @@
+"""Slow-query log and per-request N+1 detection.
+
+Engine hooks count every statement executed while a request is being served
+and group them by statement shape. When the request finishes, the middleware
+logs requests that ran the same shape more than ``repeat_threshold`` times
+(the usual sign of an N+1 access pattern). Any statement slower than
+``slow_query_ms`` is logged together with its ``EXPLAIN QUERY PLAN``.
+
+Strict mode, meant for tests, raises ``QueryBudgetExceeded`` from inside the
+request as soon as a route runs more statements than its budget. Budgets
+default to ``default_budget`` and can be set per endpoint with
+``@query_budget(n)``.
+
+Settings come from the environment (``SLOW_QUERY_MS``,
+``QUERY_REPEAT_THRESHOLD``, ``QUERY_BUDGET``, ``QUERY_STRICT``) and can be
+changed at runtime with ``configure``.
+"""
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional
+from sqlalchemy import event
+
+logger = logging.getLogger("expenses.sql")
+
+settings = {
+    "slow_query_ms": float(os.getenv("SLOW_QUERY_MS", "100")),
+    "repeat_threshold": int(os.getenv("QUERY_REPEAT_THRESHOLD", "10")),
+    "default_budget": int(os.getenv("QUERY_BUDGET", "50")),
+    "strict": os.getenv("QUERY_STRICT", "").lower() in ("1", "true", "yes"),
+}
+
+# Distinct SQL strings whose normalized shapes are cached
+MAX_CACHED_SHAPES = 1024
+
+_EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "INSERT", "WITH")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_shapes: Dict[str, str] = {}
+
+class QueryBudgetExceeded(RuntimeError):
+    """Raised in strict mode when a request runs more statements than allowed."""
+
+class RequestQueries:
+    """Statements observed while serving a single request."""
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.count = 0
+        self.shapes = Counter()
+        self.slow = 0
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or self.scope.get("path", "")
+
+    @property
+    def budget(self) -> int:
+        endpoint = getattr(self.scope.get("route"), "endpoint", None)
+        return getattr(endpoint, "query_budget", settings["default_budget"])
+
+_current: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+def configure(**overrides):
+    """Change settings at runtime, e.g. ``configure(strict=True)`` in a test."""
+    unknown = set(overrides) - set(settings)
+    if unknown:
+        raise ValueError(f"Unknown query log settings: {', '.join(sorted(unknown))}")
+    settings.update(overrides)
+
+def query_budget(limit: int):
+    """Set the maximum number of SQL statements an endpoint may run per request."""
+    def decorator(endpoint):
+        endpoint.query_budget = limit
+        return endpoint
+    return decorator
+
+def statement_shape(statement: str) -> str:
+    """Collapse whitespace and IN-lists so equivalent statements compare equal."""
+    shape = _shapes.get(statement)
+    if shape is None:
+        shape = _PLACEHOLDER_LIST.sub("(?, ...)", _WHITESPACE.sub(" ", statement).strip())
+        if len(_shapes) < MAX_CACHED_SHAPES:
+            _shapes[statement] = shape
+    return shape
+
+def _explain(dbapi_connection, statement: str, parameters) -> str:
+    cursor = dbapi_connection.cursor()
+    try:
+        rows = cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+        return "\n".join(f"  {row[-1]}" for row in rows)
+    except Exception as e:  # The plan is best effort; never fail the request over it
+        return f"  (plan unavailable: {e})"
+    finally:
+        cursor.close()
+
+def instrument_engine(engine):
+    """Attach the per-request counting and slow-query hooks to ``engine``."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_log_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_log_start"].pop()) * 1000
+        queries = _current.get()
+
+        if elapsed_ms >= settings["slow_query_ms"]:
+            if queries:
+                queries.slow += 1
+            plan = ""
+            if not executemany and statement.lstrip().upper().startswith(_EXPLAINABLE):
+                plan = "\n" + _explain(conn.connection.dbapi_connection, statement, parameters)
+            logger.warning(
+                "Slow query (%.1f ms)%s: %s%s",
+                elapsed_ms, f" in {queries.route}" if queries else "", statement_shape(statement), plan,
+            )
+
+        if queries is None:
+            return
+        queries.count += 1
+        queries.shapes[statement_shape(statement)] += 1
+        if settings["strict"] and queries.count > queries.budget:
+            raise QueryBudgetExceeded(
+                f"{queries.scope.get('method')} {queries.route} exceeded its budget of "
+                f"{queries.budget} SQL statements"
+            )
+
+class QueryLogMiddleware:
+    """Pure ASGI middleware that scopes statement counting to each request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries(scope)
+        token = _current.set(queries)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+            self._report(queries)
+
+    def _report(self, queries: RequestQueries):
+        if not queries.count:
+            return
+        method = queries.scope.get("method")
+        shape, repeats = queries.shapes.most_common(1)[0]
+        if repeats > settings["repeat_threshold"]:
+            logger.warning(
+                "Possible N+1 in %s %s: same statement ran %d times (%d statements total): %s",
+                method, queries.route, repeats, queries.count, shape,
+            )
+        if queries.count > queries.budget:
+            logger.warning(
+                "%s %s ran %d SQL statements, over its budget of %d",
+                method, queries.route, queries.count, queries.budget,
+            )
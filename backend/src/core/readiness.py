@@ -0,0 +1,58 @@
+"""Warm-up hooks that run once before an instance reports ready.
+
+A cold instance pays for mapper configuration, statement compilation and an
+empty SQLite page cache on its first real requests. Warmers registered with
+``@warmer`` do that work up front, either when ``/ready`` is first called or
+at startup when ``WARM_ON_STARTUP`` is set.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+settings = {
+    "warm_on_startup": os.getenv("WARM_ON_STARTUP", "").lower() in ("1", "true", "yes"),
+}
+
+_warmers: List[Tuple[str, Callable[[], None]]] = []
+_timings: Dict[str, float] = {}
+_lock = threading.Lock()
+_ready = False
+
+def warmer(name: str):
+    """Register a function to run during warm-up."""
+    def decorator(fn):
+        _warmers.append((name, fn))
+        return fn
+    return decorator
+
+def is_ready() -> bool:
+    return _ready
+
+def warm_up() -> Dict[str, float]:
+    """Run every warmer once and return their durations in milliseconds.
+
+    Concurrent callers wait for the first one. If a warmer raises, the error
+    propagates and the next call retries from the start.
+    """
+    global _ready
+    with _lock:
+        if not _ready:
+            timings = {}
+            for name, fn in _warmers:
+                start = time.perf_counter()
+                fn()
+                timings[name] = round((time.perf_counter() - start) * 1000, 3)
+            _timings.update(timings)
+            _ready = True
+    return dict(_timings)
+
+def rerun(names: List[str]) -> Dict[str, float]:
+    """Run the named warmers again, e.g. after writes emptied the caches they fill."""
+    timings = {}
+    for name, fn in _warmers:
+        if name in names:
+            start = time.perf_counter()
+            fn()
+            timings[name] = round((time.perf_counter() - start) * 1000, 3)
+    return timings
@@ -0,0 +1,277 @@
+"""In-process asyncio scheduler for maintenance jobs.
+
+Jobs are registered with ``@scheduler.job(...)`` and run on a thread (they
+do blocking SQLite and file work) from the app's event loop, started and
+stopped with the app. A job can have two kinds of trigger:
+
+* ``cron``: a five-field cron expression (minute hour day-of-month month
+  day-of-week, local time) supporting ``*``, lists, ranges and steps.
+* ``after_write``: seconds of quiet after the last write. Every write moves
+  the deadline, so a burst of writes leads to a single run.
+
+Each run is delayed by a random ``jitter`` so workers (and hosts) don't
+start the same job at the same instant. With several workers every one of
+them schedules every job, so ``exclusive`` jobs take a non-blocking file
+lock and record their last start in a status file next to it: a worker
+that finds the lock held, or finds that another worker already started the
+job after the scheduled time, skips the run. The status files also let
+``/debug/jobs`` report the last outcome whichever worker ran the job.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+from ..utils.locks import try_file_lock
+
+logger = logging.getLogger("expenses.scheduler")
+
+settings = {
+    "enabled": os.getenv("SCHEDULER_ENABLED", "1").lower() in ("1", "true", "yes"),
+    "directory": Path(os.getenv("JOBS_DIR", "data/jobs")),
+}
+
+class CronSchedule:
+    """Next-run calculation for a five-field cron expression."""
+
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.RANGES)
+        )
+        # Day-of-week 7 is Sunday as well
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_text = part.split("/")
+                step = int(step_text)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(value) for value in part.split("-"))
+            else:
+                start = end = int(part)
+            if not (low <= start <= end <= high) or step < 1:
+                raise ValueError(f"Cron field {field!r} is out of range {low}-{high}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.isoweekday() % 7) in self.weekdays
+        # As in cron, a restricted day-of-month and day-of-week match either
+        if not self._any_day and not self._any_weekday:
+            return day or weekday
+        return day and weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                year, month = divmod(candidate.month, 12)
+                candidate = candidate.replace(year=candidate.year + year, month=month + 1, day=1, hour=0, minute=0)
+            elif not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+            elif candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression {self.expression!r} never matches")
+
+class Job:
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[], Optional[str]],
+        cron: Optional[str] = None,
+        after_write: Optional[float] = None,
+        jitter: float = 0.0,
+        exclusive: bool = True,
+    ):
+        self.name = name
+        self.fn = fn
+        self.description = (fn.__doc__ or "").strip().split("\n")[0]
+        self.schedule = CronSchedule(cron) if cron else None
+        self.after_write = after_write
+        self.jitter = jitter
+        self.exclusive = exclusive
+        self.next_run: Optional[datetime] = None
+        self.running = False
+        # Outcome of the last run in this process; exclusive jobs also have a status file
+        self.last: Dict = {}
+
+    @property
+    def lock_path(self) -> Path:
+        return settings["directory"] / f"{self.name}.lock"
+
+    @property
+    def status_path(self) -> Path:
+        return settings["directory"] / f"{self.name}.json"
+
+class Scheduler:
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._write_timers: Dict[str, asyncio.TimerHandle] = {}
+
+    def job(self, name: str, cron: Optional[str] = None, after_write: Optional[float] = None,
+            jitter: float = 0.0, exclusive: bool = True):
+        """Register the decorated function as a job; its return value is reported as the run's detail."""
+        def decorator(fn):
+            self.jobs[name] = Job(name, fn, cron, after_write, jitter, exclusive)
+            return fn
+        return decorator
+
+    async def start(self):
+        if not settings["enabled"] or self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        for job in self.jobs.values():
+            if job.schedule:
+                self._tasks.append(asyncio.create_task(self._cron_loop(job), name=f"job-{job.name}"))
+
+    async def stop(self):
+        for handle in self._write_timers.values():
+            handle.cancel()
+        self._write_timers.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._loop = None
+
+    def notify_write(self):
+        """Record a write; safe to call from request threads."""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._reset_write_timers)
+
+    def _reset_write_timers(self):
+        if self._loop is None:
+            return
+        for job in self.jobs.values():
+            if job.after_write is None:
+                continue
+            handle = self._write_timers.pop(job.name, None)
+            if handle:
+                handle.cancel()
+            delay = job.after_write + random.uniform(0, job.jitter)
+            self._write_timers[job.name] = self._loop.call_later(delay, self._start_after_write, job)
+
+    def _start_after_write(self, job: Job):
+        self._write_timers.pop(job.name, None)
+        task = asyncio.create_task(self.run(job.name, "write"))
+        self._tasks.append(task)
+        task.add_done_callback(lambda done: done in self._tasks and self._tasks.remove(done))
+
+    async def _cron_loop(self, job: Job):
+        while True:
+            scheduled = job.schedule.next_after(datetime.now())
+            job.next_run = scheduled
+            delay = (scheduled - datetime.now()).total_seconds() + random.uniform(0, job.jitter)
+            await asyncio.sleep(max(delay, 0))
+            try:
+                await self.run(job.name, "cron", scheduled)
+            except Exception:
+                logger.exception("Job %s could not be run", job.name)
+
+    async def run(self, name: str, trigger: str = "manual", scheduled: Optional[datetime] = None) -> Dict:
+        """Run a job now (in a thread) and return the outcome of this attempt."""
+        job = self.jobs[name]
+        if job.running:
+            return {"job": name, "outcome": "skipped", "detail": "already running in this worker"}
+        job.running = True
+        try:
+            return await asyncio.to_thread(self._run, job, trigger, scheduled)
+        finally:
+            job.running = False
+
+    def _run(self, job: Job, trigger: str, scheduled: Optional[datetime]) -> Dict:
+        if not job.exclusive:
+            return self._execute(job, trigger, {})
+        with try_file_lock(job.lock_path) as acquired:
+            if not acquired:
+                return {"job": job.name, "outcome": "skipped", "detail": "running in another worker"}
+            status = self._read_status(job)
+            if scheduled and status.get("lastStarted", "") >= scheduled.isoformat():
+                return {"job": job.name, "outcome": "skipped", "detail": "already ran in another worker"}
+            return self._execute(job, trigger, status)
+
+    def _execute(self, job: Job, trigger: str, status: Dict) -> Dict:
+        started_at = datetime.now()
+        started = time.perf_counter()
+        try:
+            detail = job.fn()
+            outcome = "ok"
+        except Exception as e:
+            logger.exception("Job %s failed", job.name)
+            detail = f"{type(e).__name__}: {e}"
+            outcome = "error"
+        duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        logger.info("Job %s (%s) finished in %.1fms: %s", job.name, trigger, duration_ms, outcome)
+
+        status.update({
+            "lastStarted": started_at.isoformat(),
+            "lastTrigger": trigger,
+            "lastDurationMs": duration_ms,
+            "lastOutcome": outcome,
+            "lastDetail": detail,
+            "lastPid": os.getpid(),
+            "runs": status.get("runs", 0) + 1,
+            "failures": status.get("failures", 0) + (outcome == "error"),
+        })
+        job.last = dict(status)
+        if job.exclusive:
+            self._write_status(job, status)
+        return {"job": job.name, "outcome": outcome, "detail": detail, "durationMs": duration_ms}
+
+    def _read_status(self, job: Job) -> Dict:
+        try:
+            return json.loads(job.status_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _write_status(self, job: Job, status: Dict):
+        job.status_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = job.status_path.with_suffix(f".{os.getpid()}.tmp")
+        temporary.write_text(json.dumps(status, indent=2))
+        os.replace(temporary, job.status_path)
+
+    def status(self) -> List[Dict]:
+        jobs = []
+        for job in self.jobs.values():
+            last = self._read_status(job) if job.exclusive else job.last
+            jobs.append({
+                "name": job.name,
+                "description": job.description,
+                "cron": job.schedule.expression if job.schedule else None,
+                "afterWriteSeconds": job.after_write,
+                "jitterSeconds": job.jitter,
+                "exclusive": job.exclusive,
+                "nextRun": job.next_run.isoformat() if job.next_run and self._loop else None,
+                "running": job.running,
+                **last,
+            })
+        return jobs
+
+scheduler = Scheduler()
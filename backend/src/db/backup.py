@@ -0,0 +1,198 @@
+"""Online backups with the SQLite backup API.
+
+``create_backup`` copies a live database ``BACKUP_PAGES_PER_STEP`` pages at a
+time and sleeps ``BACKUP_STEP_PAUSE`` seconds between steps, so each step
+holds the source's read lock only briefly. SQLite restarts a stepped backup
+when another connection writes to the source; after ``BACKUP_MAX_RESTARTS``
+restarts the copy is finished in one step, which in WAL mode still does not
+block writers. The copy is checked with ``PRAGMA quick_check`` and gzipped
+to ``BACKUP_DIR/<database>/<database>-<UTC time>.db.gz``.
+
+``prune_backups`` applies the retention policy: the newest
+``BACKUP_KEEP_LAST`` snapshots, plus the newest of each of the last
+``BACKUP_KEEP_DAILY`` days and ``BACKUP_KEEP_WEEKLY`` ISO weeks.
+``restore_backup`` writes the newest snapshot taken at or before a given time
+back into a database (through the backup API, so open connections see a
+consistent switch), after saving the current contents as a snapshot first.
+"""
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+from .database import BUSY_TIMEOUT, DB_DIR
+
+settings = {
+    "directory": Path(os.getenv("BACKUP_DIR", str(DB_DIR / "backups"))),
+    "pages_per_step": int(os.getenv("BACKUP_PAGES_PER_STEP", "256")),
+    "step_pause": float(os.getenv("BACKUP_STEP_PAUSE", "0.01")),
+    "max_restarts": int(os.getenv("BACKUP_MAX_RESTARTS", "3")),
+    "keep_last": int(os.getenv("BACKUP_KEEP_LAST", "3")),
+    "keep_daily": int(os.getenv("BACKUP_KEEP_DAILY", "7")),
+    "keep_weekly": int(os.getenv("BACKUP_KEEP_WEEKLY", "4")),
+}
+
+TIMESTAMP_FORMAT = "%Y%m%dT%H%M%S%fZ"
+SNAPSHOT_NAME = re.compile(r"^(?P<database>[\w.-]+)-(?P<taken>\d{8}T\d{12}Z)\.db\.gz$")
+
+# One backup at a time per process; the files of concurrent ones would only differ by name
+_lock = threading.Lock()
+
+class BackupError(RuntimeError):
+    pass
+
+class _Restarted(Exception):
+    pass
+
+def _directory(database: Path) -> Path:
+    return settings["directory"] / database.stem
+
+def _snapshot(path: Path) -> Dict:
+    match = SNAPSHOT_NAME.match(path.name)
+    taken = datetime.strptime(match["taken"], TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+    return {"name": path.name, "database": match["database"], "path": path,
+            "takenAt": taken, "size": path.stat().st_size}
+
+def list_backups(database: Optional[Path] = None) -> List[Dict]:
+    """Snapshots of one database (or all), newest first."""
+    if database is not None:
+        directories = [_directory(database)]
+    else:
+        directories = list(settings["directory"].iterdir()) if settings["directory"].is_dir() else []
+    snapshots = [
+        _snapshot(path)
+        for directory in directories if directory.is_dir()
+        for path in directory.iterdir() if SNAPSHOT_NAME.match(path.name)
+    ]
+    return sorted(snapshots, key=lambda snapshot: snapshot["takenAt"], reverse=True)
+
+def find_backup(name: str) -> Optional[Dict]:
+    match = SNAPSHOT_NAME.match(name)
+    if not match:
+        return None
+    path = settings["directory"] / match["database"] / name
+    return _snapshot(path) if path.is_file() else None
+
+def _copy(source: sqlite3.Connection, target: sqlite3.Connection) -> Dict:
+    """Stepped copy of ``source`` into ``target``; falls back to one step after repeated restarts."""
+    stats = {"steps": 0, "restarts": 0}
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal last_remaining
+        stats["steps"] += 1
+        # remaining grows again when a write to the source restarted the copy
+        if last_remaining is not None and remaining > last_remaining:
+            stats["restarts"] += 1
+            if stats["restarts"] > settings["max_restarts"]:
+                raise _Restarted()
+        last_remaining = remaining
+        if remaining:
+            time.sleep(settings["step_pause"])
+
+    try:
+        source.backup(target, pages=settings["pages_per_step"], progress=progress)
+    except _Restarted:
+        source.backup(target, pages=-1)
+        stats["steps"] += 1
+    return stats
+
+def create_backup(database: Path) -> Dict:
+    """Snapshot ``database`` without stopping its writers; returns the snapshot's details."""
+    database = Path(database)
+    if not database.is_file():
+        raise BackupError(f"{database} does not exist")
+    directory = _directory(database)
+    directory.mkdir(parents=True, exist_ok=True)
+    with _lock:
+        started = time.perf_counter()
+        taken = datetime.now(timezone.utc)
+        name = f"{database.stem}-{taken.strftime(TIMESTAMP_FORMAT)}.db.gz"
+        copy_path = directory / f".{name}.db"
+        compressed_path = directory / f".{name}"
+        try:
+            source = sqlite3.connect(str(database), timeout=BUSY_TIMEOUT)
+            target = sqlite3.connect(str(copy_path))
+            try:
+                stats = _copy(source, target)
+                check = target.execute("PRAGMA quick_check").fetchone()[0]
+            finally:
+                target.close()
+                source.close()
+            if check != "ok":
+                raise BackupError(f"Snapshot of {database} failed its integrity check: {check}")
+            with open(copy_path, "rb") as raw, gzip.open(compressed_path, "wb", compresslevel=6) as out:
+                shutil.copyfileobj(raw, out, 1024 * 1024)
+            # Only complete snapshots get a name that list_backups recognises
+            os.replace(compressed_path, directory / name)
+        finally:
+            copy_path.unlink(missing_ok=True)
+            compressed_path.unlink(missing_ok=True)
+    snapshot = _snapshot(directory / name)
+    snapshot.update(stats, seconds=round(time.perf_counter() - started, 3),
+                    databaseSize=database.stat().st_size)
+    return snapshot
+
+def prune_backups(database: Path, now: Optional[datetime] = None) -> List[str]:
+    """Delete the snapshots of ``database`` that the retention policy no longer keeps."""
+    now = now or datetime.now(timezone.utc)
+    snapshots = list_backups(Path(database))
+    keep = {snapshot["name"] for snapshot in snapshots[:settings["keep_last"]]}
+    days, weeks = set(), set()
+    for snapshot in snapshots:  # newest first, so the first of each day or week is kept
+        taken = snapshot["takenAt"]
+        day, week = taken.date(), taken.isocalendar()[:2]
+        if (now - taken).days < settings["keep_daily"] and day not in days:
+            days.add(day)
+            keep.add(snapshot["name"])
+        if (now - taken).days < settings["keep_weekly"] * 7 and week not in weeks:
+            weeks.add(week)
+            keep.add(snapshot["name"])
+    removed = []
+    for snapshot in snapshots:
+        if snapshot["name"] not in keep:
+            snapshot["path"].unlink(missing_ok=True)
+            removed.append(snapshot["name"])
+    return removed
+
+def backup_at(database: Path, at: Optional[datetime] = None) -> Optional[Dict]:
+    """The newest snapshot of ``database`` taken at or before ``at`` (default: the newest)."""
+    for snapshot in list_backups(Path(database)):
+        if at is None or snapshot["takenAt"] <= at:
+            return snapshot
+    return None
+
+def restore_backup(database: Path, at: Optional[datetime] = None) -> Dict:
+    """Replace the contents of ``database`` with its snapshot as of ``at``; returns that snapshot.
+
+    The current contents are snapshotted first, so a restore can be undone.
+    Stop the app (or at least its writers) before restoring.
+    """
+    database = Path(database)
+    snapshot = backup_at(database, at)
+    if snapshot is None:
+        raise BackupError(f"No snapshot of {database} taken at or before {at or 'now'}")
+    if database.is_file():
+        create_backup(database)
+    restored_path = database.with_name(f".{database.name}.restore")
+    try:
+        with gzip.open(snapshot["path"], "rb") as compressed, open(restored_path, "wb") as out:
+            shutil.copyfileobj(compressed, out, 1024 * 1024)
+        restored = sqlite3.connect(str(restored_path))
+        target = sqlite3.connect(str(database), timeout=BUSY_TIMEOUT)
+        try:
+            check = restored.execute("PRAGMA quick_check").fetchone()[0]
+            if check != "ok":
+                raise BackupError(f"{snapshot['name']} failed its integrity check: {check}")
+            restored.backup(target)
+        finally:
+            target.close()
+            restored.close()
+    finally:
+        restored_path.unlink(missing_ok=True)
+    return snapshot
@@ -1,8 +1,10 @@
+from fastapi import Request
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from pathlib import Path
+from ..core import metrics, query_log
 
 # Ensure data directory exists
 DB_DIR = Path("./data")
@@ -12,15 +14,47 @@ DB_DIR.mkdir(exist_ok=True)
 DATABASE_PATH = DB_DIR / "expenses.db"
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# "single" keeps everyone in DATABASE_PATH; "sharded" gives every user their own file
+STORAGE_MODE = os.getenv("STORAGE_MODE", "single")
+
+# Held by whichever worker runs startup migrations and seeding
+STARTUP_LOCK_PATH = DB_DIR / ".startup.lock"
+
+# Seconds a connection waits for another process's write lock before failing
+BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+
+def create_sqlite_engine(path: Path):
+    """Engine for a SQLite file with the app's pool, timeouts and instrumentation."""
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False, "timeout": BUSY_TIMEOUT},
+        poolclass=metrics.TimedQueuePool,
+    )
+    metrics.instrument_engine(engine)
+    query_log.instrument_engine(engine)
+    return engine
+
+engine = create_sqlite_engine(DATABASE_PATH)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+def enable_wal(engine):
+    """Switch to write-ahead logging so readers in other workers never block writers.
+
+    The journal mode is stored in the database file, so this only has to run once.
+    """
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+
+def get_db(request: Request):
+    if STORAGE_MODE == "sharded":
+        # Imported here because shards builds on this module
+        from .shards import shard_manager
+        from ..core.auth import tenant_id
+        db = shard_manager.session(tenant_id(request))
+    else:
+        db = SessionLocal()
     try:
         yield db
     finally:
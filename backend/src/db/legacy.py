@@ -0,0 +1,256 @@
+"""Online migration of a database written by the legacy backend (``backend/main.py``).
+
+The legacy app stores each expense's category as a name string and its date
+as a ``Date``, and its categories have no description or protection flag.
+``LegacyMigration`` converts such a database to the current models while
+the legacy app keeps serving it:
+
+1. ``prepare``: add the missing category columns, create an empty
+   ``expenses_migrating`` table with the current layout, and install
+   triggers that record the id of every expense the legacy app inserts,
+   updates or deletes from now on.
+2. ``copy``: copy expenses in id order, one bounded batch per short
+   transaction, resolving category names to ids through an in-memory map
+   (creating categories that only exist as strings). The last copied id is
+   checkpointed after every batch, so an interrupted run resumes there.
+3. ``switch``: in one transaction, re-copy the recorded ids, check that
+   row counts, amount sums and per-category counts match, and swap the
+   tables. The legacy table is kept as ``expenses_legacy``.
+
+Each step holds the write lock only for one batch, and WAL mode lets
+readers continue throughout. After the switch the legacy app can no longer
+read the database; start the current app, which finishes the schema
+(daily totals, statistics, ...) on startup.
+"""
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import MetaData
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.schema import CreateIndex, CreateTable
+from . import models
+from .database import BUSY_TIMEOUT
+from ..models.category import UNCATEGORIZED
+
+MIGRATING_TABLE = "expenses_migrating"
+LEGACY_TABLE = "expenses_legacy"
+CHANGES_TABLE = "legacy_migration_changes"
+STATE_TABLE = "legacy_migration"
+CAPTURE_TRIGGERS = {
+    f"legacy_capture_{op.lower()}": f"""CREATE TRIGGER IF NOT EXISTS legacy_capture_{op.lower()} AFTER {op} ON expenses
+    BEGIN INSERT OR IGNORE INTO {CHANGES_TABLE} (expense_id) VALUES ({row}.id); END"""
+    for op, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+}
+# Copy columns of the current layout; the rest keep their defaults
+COPY_SQL = f"INSERT INTO {MIGRATING_TABLE} (id, amount, description, date, category_id, is_anomaly) VALUES (?, ?, ?, ?, ?, 0)"
+
+class MigrationError(RuntimeError):
+    pass
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def is_legacy_layout(expense_columns) -> bool:
+    """Whether the expenses table has the legacy layout (a category name, no category_id)."""
+    return "category" in expense_columns and "category_id" not in expense_columns
+
+def is_legacy(conn: sqlite3.Connection) -> bool:
+    return is_legacy_layout(_columns(conn, "expenses"))
+
+def _timestamp(value) -> Optional[str]:
+    """Legacy ``Date`` text as the ``DateTime`` text SQLAlchemy stores."""
+    if value is None:
+        return None
+    text = str(value)
+    if len(text) == 10:
+        return f"{text} 00:00:00.000000"
+    return datetime.fromisoformat(text).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+class LegacyMigration:
+    def __init__(self, path: Path, batch_size: int = 1000, pause: float = 0.05,
+                 log: Callable[[str], None] = lambda message: None):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.pause = pause
+        self.log = log
+        self.conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT, isolation_level=None)
+        self._categories: Dict[str, int] = {}
+
+    def close(self):
+        self.conn.close()
+
+    def state(self) -> Optional[Dict]:
+        if STATE_TABLE not in self._tables():
+            return None
+        row = self.conn.execute(f"SELECT phase, last_id, copied, started_at, updated_at FROM {STATE_TABLE} WHERE id = 1").fetchone()
+        return dict(zip(("phase", "lastId", "copied", "startedAt", "updatedAt"), row)) if row else None
+
+    def _tables(self) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+
+    def _save(self, phase: str, last_id: int, copied: int):
+        self.conn.execute(
+            f"UPDATE {STATE_TABLE} SET phase = ?, last_id = ?, copied = ?, updated_at = ? WHERE id = 1",
+            (phase, last_id, copied, datetime.now().isoformat(timespec="seconds")),
+        )
+
+    def run(self) -> Dict:
+        """Prepare (or resume), copy and switch; returns the verification totals."""
+        state = self.state()
+        if state is not None and state["phase"] == "done":
+            raise MigrationError("the migration has already finished")
+        if not is_legacy(self.conn):
+            raise MigrationError("expenses does not have the legacy layout; nothing to migrate")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        if state is None:
+            self.prepare()
+        self.copy()
+        return self.switch()
+
+    def prepare(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            category_columns = _columns(self.conn, "categories")
+            if "description" not in category_columns:
+                self.conn.execute("ALTER TABLE categories ADD COLUMN description VARCHAR")
+            if "is_protected" not in category_columns:
+                self.conn.execute("ALTER TABLE categories ADD COLUMN is_protected BOOLEAN DEFAULT 0")
+            metadata = MetaData()
+            # The foreign key needs its target in the same metadata
+            models.Category.__table__.to_metadata(metadata)
+            table = models.Expense.__table__.to_metadata(metadata, name=MIGRATING_TABLE)
+            self.conn.execute(str(CreateTable(table).compile(dialect=sqlite_dialect.dialect())))
+            self.conn.execute(f"CREATE TABLE {CHANGES_TABLE} (expense_id INTEGER PRIMARY KEY)")
+            for trigger in CAPTURE_TRIGGERS.values():
+                self.conn.execute(trigger)
+            now = datetime.now().isoformat(timespec="seconds")
+            self.conn.execute(
+                f"CREATE TABLE {STATE_TABLE} (id INTEGER PRIMARY KEY, phase TEXT, last_id INTEGER, "
+                "copied INTEGER, started_at TEXT, updated_at TEXT)"
+            )
+            self.conn.execute(f"INSERT INTO {STATE_TABLE} VALUES (1, 'copying', 0, 0, ?, ?)", (now, now))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.log(f"Prepared {MIGRATING_TABLE} and change capture")
+
+    def _category_id(self, name: Optional[str]) -> int:
+        name = (name or "").strip() or UNCATEGORIZED
+        if name not in self._categories:
+            row = self.conn.execute("SELECT id FROM categories WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                cursor = self.conn.execute(
+                    "INSERT INTO categories (name, is_protected) VALUES (?, ?)", (name, name == UNCATEGORIZED)
+                )
+                row = (cursor.lastrowid,)
+                self.log(f"Created category {name!r} for expenses that referred to it")
+            self._categories[name] = row[0]
+        return self._categories[name]
+
+    def _convert(self, rows: List[Tuple]) -> List[Tuple]:
+        return [
+            (expense_id, amount, description, _timestamp(day), self._category_id(category))
+            for expense_id, amount, category, description, day in rows
+        ]
+
+    def copy(self):
+        """Copy expenses after the checkpoint in batches until none are left."""
+        self._categories = dict(self.conn.execute("SELECT name, id FROM categories"))
+        state = self.state()
+        last_id, copied = state["lastId"], state["copied"]
+        started = time.perf_counter()
+        while True:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute(
+                    "SELECT id, amount, category, description, date FROM expenses WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, self.batch_size),
+                ).fetchall()
+                if rows:
+                    self.conn.executemany(COPY_SQL, self._convert(rows))
+                    last_id = rows[-1][0]
+                    copied += len(rows)
+                    # Rows copied now are current; only later changes need re-copying
+                    self.conn.execute(
+                        f"DELETE FROM {CHANGES_TABLE} WHERE expense_id IN ({', '.join('?' * len(rows))})",
+                        [row[0] for row in rows],
+                    )
+                self._save("copying", last_id, copied)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            if len(rows) < self.batch_size:
+                break
+            self.log(f"Copied {copied} expenses (up to id {last_id}, {time.perf_counter() - started:.1f}s)")
+            time.sleep(self.pause)
+        self.log(f"Copied {copied} expenses")
+
+    def _catch_up(self) -> int:
+        """Re-copy the expenses the legacy app changed after they were copied."""
+        changed = [row[0] for row in self.conn.execute(f"SELECT expense_id FROM {CHANGES_TABLE}")]
+        for start in range(0, len(changed), self.batch_size):
+            ids = changed[start:start + self.batch_size]
+            marks = ", ".join("?" * len(ids))
+            self.conn.execute(f"DELETE FROM {MIGRATING_TABLE} WHERE id IN ({marks})", ids)
+            rows = self.conn.execute(
+                f"SELECT id, amount, category, description, date FROM expenses WHERE id IN ({marks})", ids
+            ).fetchall()
+            self.conn.executemany(COPY_SQL, self._convert(rows))
+        self.conn.execute(f"DELETE FROM {CHANGES_TABLE}")
+        return len(changed)
+
+    def verify(self) -> Dict:
+        """Compare row counts, amount sums and per-category counts of the two tables."""
+        legacy = self.conn.execute("SELECT COUNT(*), TOTAL(amount) FROM expenses").fetchone()
+        migrated = self.conn.execute(f"SELECT COUNT(*), TOTAL(amount) FROM {MIGRATING_TABLE}").fetchone()
+        legacy_categories = dict(self.conn.execute(
+            f"SELECT COALESCE(NULLIF(TRIM(category), ''), ?), COUNT(*) FROM expenses GROUP BY 1", (UNCATEGORIZED,)
+        ))
+        migrated_categories = dict(self.conn.execute(
+            f"SELECT c.name, COUNT(*) FROM {MIGRATING_TABLE} e JOIN categories c ON c.id = e.category_id GROUP BY 1"
+        ))
+        totals = {
+            "expenses": migrated[0],
+            "amount": round(migrated[1], 2),
+            "legacyExpenses": legacy[0],
+            "legacyAmount": round(legacy[1], 2),
+            "categories": len(migrated_categories),
+        }
+        if legacy[0] != migrated[0] or abs(legacy[1] - migrated[1]) > 0.005:
+            raise MigrationError(f"Totals do not match: {totals}")
+        if legacy_categories != migrated_categories:
+            different = sorted(set(legacy_categories.items()) ^ set(migrated_categories.items()))
+            raise MigrationError(f"Per-category counts do not match: {different[:10]}")
+        return totals
+
+    def switch(self) -> Dict:
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Includes expenses added since the last batch, which the insert trigger recorded
+            recopied = self._catch_up()
+            totals = self.verify()
+
+            for name in CAPTURE_TRIGGERS:
+                self.conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            # Index names move with the legacy table; drop them so the current ones can be created
+            legacy_indexes = self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'expenses' AND sql IS NOT NULL"
+            ).fetchall()
+            for (name,) in legacy_indexes:
+                self.conn.execute(f"DROP INDEX {name}")
+            self.conn.execute(f"ALTER TABLE expenses RENAME TO {LEGACY_TABLE}")
+            self.conn.execute(f"ALTER TABLE {MIGRATING_TABLE} RENAME TO expenses")
+            for index in models.Expense.__table__.indexes:
+                self.conn.execute(str(CreateIndex(index, if_not_exists=True).compile(dialect=sqlite_dialect.dialect())))
+            self.conn.execute(f"DROP TABLE {CHANGES_TABLE}")
+            self._save("done", self.state()["lastId"], totals["expenses"])
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.log(f"Switched to the current layout ({recopied} expenses changed during the copy were re-copied)")
+        return {**totals, "recopied": recopied}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, Float, String, Date, DateTime, ForeignKey, Boolean, Index, DDL, case, cast, event, func, select
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -21,4 +21,221 @@ class Expense(Base):
     date = Column(DateTime, default=datetime.utcnow)
     category_id = Column(Integer, ForeignKey("categories.id"))
     category = relationship("Category", back_populates="expenses")
-    receipt_path = Column(String, nullable=True) 
\ No newline at end of file
+    receipt_path = Column(String, nullable=True)
+    # ISO 4217 code; NULL for the base currency (BASE_CURRENCY), which needs no conversion
+    currency = Column(String(3), nullable=True)
+    # Set when the expense is written, from its category's statistics at that time
+    anomaly_score = Column(Float, nullable=True)
+    is_anomaly = Column(Boolean, nullable=False, default=False, server_default="0")
+    # Duplicate detection hash, held by the first of identical expenses (see services/fingerprints.py)
+    fingerprint = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("ix_expenses_anomalies", "is_anomaly", "date"),
+        Index("ix_expenses_fingerprint", "fingerprint", unique=True),
+        # Only foreign-currency rows, so checking whether any exist is a single probe
+        Index("ix_expenses_foreign_currency", "currency", sqlite_where=currency.isnot(None)),
+    )
+
+class DailyTotal(Base):
+    """Spend per category per day, kept in step with expenses by the triggers below.
+
+    Range queries build prefix sums over this table instead of scanning
+    expenses. Expenses without a category are counted under category_id 0.
+    """
+    __tablename__ = "daily_totals"
+
+    category_id = Column(Integer, primary_key=True)
+    day = Column(Integer, primary_key=True)  # Days since 1970-01-01
+    amount = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+class CategoryStats(Base):
+    """Running statistics of expense amounts per category, updated on every write.
+
+    ``mean`` and ``m2`` (sum of squared deviations) follow Welford's method;
+    ``median`` and ``mad`` (median absolute deviation) are streaming
+    estimates, recomputed exactly whenever the statistics are rebuilt.
+    Expenses without a category are counted under category_id 0.
+    """
+    __tablename__ = "category_stats"
+
+    category_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    mean = Column(Float, nullable=False, default=0.0)
+    m2 = Column(Float, nullable=False, default=0.0)
+    median = Column(Float, nullable=False, default=0.0)
+    mad = Column(Float, nullable=False, default=0.0)
+
+class Budget(Base):
+    """Spending limit per category (or overall) with a running spend-to-date counter.
+
+    ``spent`` covers the period starting at ``period_start`` and is updated in
+    the same transaction as every expense write; ``alert_level`` is the highest
+    threshold crossed in that period.
+    """
+    __tablename__ = "budgets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True, index=True)  # None: all spending
+    period = Column(String, nullable=False, default="month")
+    amount_limit = Column(Float, nullable=False)
+    thresholds = Column(String, nullable=False, default="0.5,0.8,1.0")  # Fractions of the limit
+    period_start = Column(Date, nullable=False)
+    spent = Column(Float, nullable=False, default=0.0)
+    alert_level = Column(Float, nullable=False, default=0.0)
+    category = relationship("Category")
+
+class BudgetAlert(Base):
+    __tablename__ = "budget_alerts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    budget_id = Column(Integer, ForeignKey("budgets.id", ondelete="CASCADE"), nullable=False, index=True)
+    threshold = Column(Float, nullable=False)
+    spent = Column(Float, nullable=False)
+    period_start = Column(Date, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ForecastResult(Base):
+    """Latest per-category forecasts as JSON, written by the background forecaster."""
+    __tablename__ = "forecast_results"
+
+    id = Column(Integer, primary_key=True)
+    month = Column(String, nullable=False)  # YYYY-MM the forecast was made in
+    computed_at = Column(DateTime, nullable=False)
+    payload = Column(String, nullable=False)
+
+class ExpenseChange(Base):
+    """Append-only journal of expense and category writes, filled by the triggers below.
+
+    ``version`` only ever increases (AUTOINCREMENT, so it is not reused when
+    the newest rows are compacted away). ``op`` is ``upsert`` or ``delete``
+    for an expense, or ``category`` with no expense_id when any category
+    changed.
+    """
+    __tablename__ = "expense_changes"
+
+    version = Column(Integer, primary_key=True)
+    op = Column(String, nullable=False)
+    expense_id = Column(Integer, nullable=True, index=True)
+    ts = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = {"sqlite_autoincrement": True}
+
+class ChangeJournalState(Base):
+    """Single row: journal versions up to ``compacted_through`` may be missing."""
+    __tablename__ = "expense_changes_state"
+
+    id = Column(Integer, primary_key=True)
+    compacted_through = Column(Integer, nullable=False, default=0)
+    compacted_at = Column(DateTime, nullable=True)
+
+class ExchangeRate(Base):
+    """Units of the base currency per unit of ``currency``, from ``day`` until the next rate."""
+    __tablename__ = "exchange_rates"
+
+    currency = Column(String(3), primary_key=True)
+    day = Column(Integer, primary_key=True)  # Days since 1970-01-01
+    rate = Column(Float, nullable=False)
+
+class ExchangeRateSource(Base):
+    """Single row: the rate file loaded last, so startup reloads only when it changes."""
+    __tablename__ = "exchange_rate_source"
+
+    id = Column(Integer, primary_key=True)
+    path = Column(String, nullable=False)
+    mtime = Column(Float, nullable=False)
+    loaded_at = Column(DateTime, nullable=False)
+    rates = Column(Integer, nullable=False, default=0)
+
+EPOCH_DAY_SQL = "CAST(julianday(date({row}.date)) - 2440587.5 AS INTEGER)"
+
+# Amount of ``row`` in the base currency: the rate in force on the expense's day (the first
+# known rate before that), or 1 for an unknown currency. Base-currency rows skip the lookup
+BASE_AMOUNT_SQL = """(CASE WHEN {row}.currency IS NULL THEN {row}.amount ELSE {row}.amount * COALESCE(
+    (SELECT r.rate FROM exchange_rates r WHERE r.currency = {row}.currency AND r.day <= {day} ORDER BY r.day DESC LIMIT 1),
+    (SELECT r.rate FROM exchange_rates r WHERE r.currency = {row}.currency ORDER BY r.day LIMIT 1),
+    1.0) END)"""
+
+def base_amount_sql(row: str) -> str:
+    return BASE_AMOUNT_SQL.format(row=row, day=EPOCH_DAY_SQL.format(row=row))
+
+def _expense_base_amount():
+    """``BASE_AMOUNT_SQL`` as an expression for ORM queries over expenses."""
+    day = cast(func.julianday(func.date(Expense.date)) - 2440587.5, Integer)
+    rates = select(ExchangeRate.rate).where(ExchangeRate.currency == Expense.currency)
+    in_force = rates.where(ExchangeRate.day <= day).order_by(ExchangeRate.day.desc()).limit(1).scalar_subquery()
+    first = rates.order_by(ExchangeRate.day).limit(1).scalar_subquery()
+    return case(
+        (Expense.currency.is_(None), Expense.amount),
+        else_=Expense.amount * func.coalesce(in_force, first, 1.0),
+    )
+
+EXPENSE_BASE_AMOUNT = _expense_base_amount()
+
+def _apply_daily_total(row: str, sign: str) -> str:
+    return f"""
+        INSERT INTO daily_totals (category_id, day, amount, count)
+        SELECT COALESCE({row}.category_id, 0), {EPOCH_DAY_SQL.format(row=row)}, {sign}{base_amount_sql(row)}, {sign}1
+        WHERE {row}.date IS NOT NULL
+        ON CONFLICT (category_id, day) DO UPDATE SET
+            amount = amount + excluded.amount,
+            count = count + excluded.count;"""
+
+# Triggers keep daily_totals correct in the writer's own transaction, whoever
+# the writer is (the API, bulk generators or manual SQL)
+DAILY_TOTAL_TRIGGERS = {
+    "expenses_daily_totals_insert": f"""CREATE TRIGGER IF NOT EXISTS expenses_daily_totals_insert AFTER INSERT ON expenses
+    BEGIN{_apply_daily_total("NEW", "")}
+    END""",
+    "expenses_daily_totals_delete": f"""CREATE TRIGGER IF NOT EXISTS expenses_daily_totals_delete AFTER DELETE ON expenses
+    BEGIN{_apply_daily_total("OLD", "-")}
+    END""",
+    "expenses_daily_totals_update": f"""CREATE TRIGGER IF NOT EXISTS expenses_daily_totals_update AFTER UPDATE OF amount, date, category_id, currency ON expenses
+    BEGIN{_apply_daily_total("OLD", "-")}{_apply_daily_total("NEW", "")}
+    END""",
+}
+
+UPSERT_DAILY_TOTAL_SQL = """
+    INSERT INTO daily_totals (category_id, day, amount, count) VALUES (?, ?, ?, ?)
+    ON CONFLICT (category_id, day) DO UPDATE SET
+        amount = amount + excluded.amount,
+        count = count + excluded.count"""
+
+REBUILD_DAILY_TOTALS_SQL = [
+    "DELETE FROM daily_totals",
+    f"""INSERT INTO daily_totals (category_id, day, amount, count)
+    SELECT COALESCE(category_id, 0), {EPOCH_DAY_SQL.format(row="expenses")}, SUM({base_amount_sql("expenses")}), COUNT(*)
+    FROM expenses WHERE date IS NOT NULL
+    GROUP BY 1, 2""",
+]
+
+def _journal(op: str, expense_id: str) -> str:
+    return f"""
+        INSERT INTO expense_changes (op, expense_id, ts) VALUES ('{op}', {expense_id}, datetime('now'));"""
+
+EXPENSE_COLUMNS = ("amount", "description", "date", "category_id", "receipt_path", "currency", "anomaly_score", "is_anomaly")
+
+# Like daily_totals, the journal is written in the writer's own transaction.
+# Updates that change nothing (e.g. anomaly rebuilds rewriting equal values) are not journaled
+CHANGE_JOURNAL_TRIGGERS = {
+    "expenses_journal_insert": f"""CREATE TRIGGER IF NOT EXISTS expenses_journal_insert AFTER INSERT ON expenses
+    BEGIN{_journal("upsert", "NEW.id")}
+    END""",
+    "expenses_journal_update": f"""CREATE TRIGGER IF NOT EXISTS expenses_journal_update AFTER UPDATE ON expenses
+    WHEN {" OR ".join(f"NEW.{column} IS NOT OLD.{column}" for column in EXPENSE_COLUMNS)}
+    BEGIN{_journal("upsert", "NEW.id")}
+    END""",
+    "expenses_journal_delete": f"""CREATE TRIGGER IF NOT EXISTS expenses_journal_delete AFTER DELETE ON expenses
+    BEGIN{_journal("delete", "OLD.id")}
+    END""",
+    **{
+        f"categories_journal_{action.lower()}": f"""CREATE TRIGGER IF NOT EXISTS categories_journal_{action.lower()} AFTER {action} ON categories
+    BEGIN{_journal("category", "NULL")}
+    END"""
+        for action in ("INSERT", "UPDATE", "DELETE")
+    },
+}
+
+for trigger in (*DAILY_TOTAL_TRIGGERS.values(), *CHANGE_JOURNAL_TRIGGERS.values()):
+    event.listen(Base.metadata, "after_create", DDL(trigger))
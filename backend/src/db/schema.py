@@ -0,0 +1,120 @@
+"""Schema version tracking.
+
+``create_all`` reflects every table on each start, which is wasted work on
+warm restarts. The schema version is stored in SQLite's ``user_version``
+pragma instead; when it matches ``SCHEMA_VERSION`` startup skips
+``create_all`` entirely. Bump ``SCHEMA_VERSION`` whenever a model changes,
+and register a migration for the new version if existing rows need work
+beyond ``create_all`` adding the new tables.
+"""
+from pathlib import Path
+from sqlalchemy.orm import Session
+from . import models
+from .database import enable_wal
+from .legacy import is_legacy_layout
+from ..services.anomaly_service import AnomalyService
+from ..services.category_service import CategoryService
+from ..services.currency_service import CurrencyService
+from ..services.fingerprints import backfill_fingerprints
+from ..utils.locks import file_lock
+
+SCHEMA_VERSION = 8
+
+def _backfill_daily_totals(conn):
+    for statement in models.REBUILD_DAILY_TOTALS_SQL:
+        conn.exec_driver_sql(statement)
+
+def _add_anomaly_columns(conn):
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_expenses_anomalies ON expenses (is_anomaly, date)")
+    db = Session(bind=conn)
+    try:
+        AnomalyService(db).rebuild()
+    finally:
+        db.close()
+
+def _add_currency_column(conn):
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_expenses_foreign_currency ON expenses (currency) WHERE currency IS NOT NULL"
+    )
+    # Triggers that read amounts now convert them, and currency changes are journaled
+    for name, trigger in {**models.DAILY_TOTAL_TRIGGERS, "expenses_journal_update": models.CHANGE_JOURNAL_TRIGGERS["expenses_journal_update"]}.items():
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        conn.exec_driver_sql(trigger)
+
+def _add_fingerprint_column(conn):
+    conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ix_expenses_fingerprint ON expenses (fingerprint)")
+    backfill_fingerprints(conn)
+
+# Columns added to expenses since the first release. They are all added
+# before any migration runs: the triggers create_all installs, and the SQL
+# the migrations share with the services (daily totals, anomaly scores),
+# read today's columns whichever version a database is upgraded from.
+ADDED_EXPENSE_COLUMNS = {
+    "anomaly_score": "FLOAT",
+    "is_anomaly": "BOOLEAN NOT NULL DEFAULT 0",
+    "currency": "VARCHAR(3)",
+    "fingerprint": "INTEGER",
+}
+
+def _add_expense_columns(conn):
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(expenses)")}
+    for name, definition in ADDED_EXPENSE_COLUMNS.items():
+        if name not in columns:
+            conn.exec_driver_sql(f"ALTER TABLE expenses ADD COLUMN {name} {definition}")
+
+# version -> function(connection) run when upgrading from an older version
+MIGRATIONS = {
+    2: _backfill_daily_totals,
+    4: _add_anomaly_columns,
+    7: _add_currency_column,
+    8: _add_fingerprint_column,
+}
+
+def current_version(engine) -> int:
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+def _enable_incremental_vacuum(engine):
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA page_count").scalar() == 0:
+            # Only possible before the first table exists; lets maintenance reclaim free pages in steps
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+
+def ensure_schema(engine) -> bool:
+    """Create missing tables unless the schema is current; returns whether it ran."""
+    version = current_version(engine)
+    if version == SCHEMA_VERSION:
+        return False
+    with engine.connect() as conn:
+        if is_legacy_layout({row[1] for row in conn.exec_driver_sql("PRAGMA table_info(expenses)")}):
+            raise RuntimeError(
+                f"{engine.url.database} was written by the legacy backend (backend/main.py); "
+                "convert it with `python migrate_legacy_db.py` first"
+            )
+    _enable_incremental_vacuum(engine)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        _add_expense_columns(conn)
+        for target in sorted(MIGRATIONS):
+            if version < target <= SCHEMA_VERSION:
+                MIGRATIONS[target](conn)
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return True
+
+def initialize(engine, lock_path: Path):
+    """Migrate and seed a database; safe to run from several processes at once.
+
+    The first process to take the lock does the work, the others wait for it
+    and then find the schema current and the seed data present.
+    """
+    with file_lock(lock_path):
+        _enable_incremental_vacuum(engine)
+        enable_wal(engine)
+        ensure_schema(engine)
+        db = Session(bind=engine)
+        try:
+            CategoryService(db).ensure_uncategorized_exists()
+            # Exchange rates, when EXCHANGE_RATES_FILE exists and changed since it was last loaded
+            CurrencyService(db).load_rates()
+        finally:
+            db.close()
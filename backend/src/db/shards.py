@@ -0,0 +1,151 @@
+"""Per-user SQLite shards for the ``STORAGE_MODE=sharded`` deployment mode.
+
+Every tenant gets its own database file under ``SHARD_DIR``, so households
+never contend for each other's write lock. Shards are created and migrated
+lazily on first access. Open engines are kept in an LRU bounded by
+``SHARD_MAX_OPEN``; engines unused for ``SHARD_IDLE_SECONDS`` are disposed by
+the ``shard_eviction`` maintenance job (and whenever another shard opens) so
+idle tenants don't hold file handles.
+"""
+import base64
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+from sqlalchemy.orm import Session, sessionmaker
+from .database import DB_DIR, create_sqlite_engine
+from .schema import initialize
+from ..core import cache, metrics
+from ..core.auth import MAX_TENANT_LENGTH
+
+settings = {
+    "directory": Path(os.getenv("SHARD_DIR", str(DB_DIR / "shards"))),
+    "max_open": int(os.getenv("SHARD_MAX_OPEN", "64")),
+    "idle_seconds": float(os.getenv("SHARD_IDLE_SECONDS", "300")),
+}
+
+def shard_filename(tenant: str) -> str:
+    """File name for a tenant; base32 keeps it safe on case-insensitive filesystems."""
+    if not tenant or len(tenant) > MAX_TENANT_LENGTH:
+        raise ValueError(f"Tenant ids must be 1 to {MAX_TENANT_LENGTH} characters")
+    encoded = base64.b32encode(tenant.encode()).decode().rstrip("=").lower()
+    return f"{encoded}.db"
+
+def tenant_from_filename(filename: str) -> str:
+    encoded = Path(filename).stem.upper()
+    return base64.b32decode(encoded + "=" * (-len(encoded) % 8)).decode()
+
+class OpenShard:
+    def __init__(self, tenant: str, engine):
+        self.tenant = tenant
+        self.engine = engine
+        self.sessions = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.last_used = time.monotonic()
+
+class ShardManager:
+    """Opens, caches and evicts the engines of per-tenant databases."""
+
+    def __init__(self, directory: Path, max_open: int, idle_seconds: float):
+        self.directory = directory
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self._open: "OrderedDict[str, OpenShard]" = OrderedDict()
+        self._opening: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, tenant: str) -> Path:
+        return self.directory / shard_filename(tenant)
+
+    def session(self, tenant: str) -> Session:
+        return self.get(tenant).sessions()
+
+    def get(self, tenant: str) -> OpenShard:
+        """The open shard of ``tenant``, creating and migrating its database if needed."""
+        with self._lock:
+            shard = self._touch(tenant)
+            if shard:
+                return shard
+            opening = self._opening.setdefault(tenant, threading.Lock())
+
+        # Only one thread opens a given shard; others wait for it
+        with opening:
+            with self._lock:
+                shard = self._touch(tenant)
+                if shard:
+                    return shard
+            shard = self._create(tenant)
+            with self._lock:
+                self._open[tenant] = shard
+                self._opening.pop(tenant, None)
+                evicted = self._collect_evictions()
+        for old in evicted:
+            self._close(old)
+        return shard
+
+    def _touch(self, tenant: str):
+        shard = self._open.get(tenant)
+        if shard:
+            shard.last_used = time.monotonic()
+            self._open.move_to_end(tenant)
+        return shard
+
+    def _create(self, tenant: str) -> OpenShard:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(tenant)
+        engine = create_sqlite_engine(path)
+        initialize(engine, path.with_suffix(".lock"))
+        return OpenShard(tenant, engine)
+
+    def _collect_evictions(self):
+        """Remove idle and over-capacity shards from the LRU; caller holds the lock."""
+        evicted = []
+        now = time.monotonic()
+        while self._open:
+            tenant, shard = next(iter(self._open.items()))
+            if len(self._open) <= self.max_open and now - shard.last_used < self.idle_seconds:
+                break
+            evicted.append(self._open.pop(tenant))
+        return evicted
+
+    def _close(self, shard: OpenShard):
+        # Requests still holding a connection keep it until they finish
+        cache.forget(shard.engine)
+        shard.engine.dispose()
+
+    def evict_idle(self):
+        """Dispose of idle and over-capacity engines; run every minute by the scheduler."""
+        with self._lock:
+            evicted = self._collect_evictions()
+        for shard in evicted:
+            self._close(shard)
+
+    def close_all(self):
+        with self._lock:
+            shards = list(self._open.values())
+            self._open.clear()
+        for shard in shards:
+            self._close(shard)
+
+    @property
+    def open_count(self) -> int:
+        return len(self._open)
+
+    def tenants(self) -> Iterator[str]:
+        """Every tenant with a shard on disk, opened or not."""
+        if not self.directory.exists():
+            return
+        for path in sorted(self.directory.glob("*.db")):
+            yield tenant_from_filename(path.name)
+
+    def each_shard(self) -> Iterator[Tuple[str, OpenShard]]:
+        """Open (and migrate) every shard in turn, e.g. for maintenance tasks."""
+        for tenant in self.tenants():
+            yield tenant, self.get(tenant)
+
+shard_manager = ShardManager(settings["directory"], settings["max_open"], settings["idle_seconds"])
+
+metrics.REGISTRY.register(metrics.Gauge(
+    "db_shards_open", "Tenant databases with an open engine.",
+    callback=lambda: {(): shard_manager.open_count}))
@@ -1,17 +1,18 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 import os
-from src.api import expense_routes, receipt_routes, analytics_routes, category_routes
-from src.db.database import engine, SessionLocal
-from src.db import models
-from src.services.category_service import CategoryService
-
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
-
-# Create necessary directories
-os.makedirs("receipts", exist_ok=True)
+from src.api import expense_routes, receipt_routes, analytics_routes, category_routes, budget_routes, currency_routes, import_routes, metrics_routes, profile_routes, health_routes, job_routes, backup_routes, event_routes, sync_routes
+from src.core.metrics import MetricsMiddleware
+from src.core.query_log import QueryLogMiddleware
+from src.core.profiling import ProfilingMiddleware
+from src.core import maintenance, readiness
+from src.core.events import broker
+from src.core.scheduler import scheduler
+from src.db.database import engine, STARTUP_LOCK_PATH
+from src.db.schema import initialize
+from src.services.forecast_service import forecaster
+from src.services import write_queue
+from src.utils.lazy import LazyApp
 
 app = FastAPI(title="Expenses Tracker API")
 
@@ -24,24 +25,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files for receipts
-app.mount("/receipts", StaticFiles(directory="receipts"), name="receipts")
+# Profile requests that ask for it (admin token) or are sampled
+app.add_middleware(ProfilingMiddleware)
+
+# Count SQL statements per request, flag N+1 patterns and log slow queries
+app.add_middleware(QueryLogMiddleware)
+
+# Record request counts and latency per route template for /metrics
+app.add_middleware(MetricsMiddleware)
+
+def receipt_files():
+    from fastapi.staticfiles import StaticFiles
+    return StaticFiles(directory="receipts")
+
+# Mount static files for receipts (built on first use)
+app.mount("/receipts", LazyApp(receipt_files), name="receipts")
 
 # Include routers
 app.include_router(expense_routes.router, prefix="/api", tags=["expenses"])
 app.include_router(receipt_routes.router, prefix="/api", tags=["receipts"])
 app.include_router(analytics_routes.router, prefix="/api", tags=["analytics"])
 app.include_router(category_routes.router, prefix="/api", tags=["categories"])
+app.include_router(budget_routes.router, prefix="/api", tags=["budgets"])
+app.include_router(currency_routes.router, prefix="/api", tags=["currencies"])
+app.include_router(import_routes.router, prefix="/api", tags=["import"])
+app.include_router(event_routes.router, prefix="/api", tags=["events"])
+app.include_router(sync_routes.router, prefix="/api", tags=["sync"])
+app.include_router(metrics_routes.router, tags=["metrics"])
+app.include_router(profile_routes.router, tags=["debug"])
+app.include_router(job_routes.router, tags=["debug"])
+app.include_router(backup_routes.router, tags=["debug"])
+app.include_router(health_routes.router, tags=["health"])
 
 @app.on_event("startup")
 async def startup_event():
-    # Ensure Uncategorized category exists
-    db = SessionLocal()
-    try:
-        category_service = CategoryService(db)
-        category_service.ensure_uncategorized_exists()
-    finally:
-        db.close()
+    # Create necessary directories
+    os.makedirs("receipts", exist_ok=True)
+
+    # Create tables unless the schema version is current and ensure the
+    # Uncategorized category exists; with several workers only one does the work
+    initialize(engine, STARTUP_LOCK_PATH)
+
+    if readiness.settings["warm_on_startup"]:
+        readiness.warm_up()
+
+    # Maintenance jobs (see src/core/maintenance.py)
+    await scheduler.start()
+    # Change events for /api/events
+    await broker.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Ends open event streams so the server can stop
+    await broker.stop()
+    # Commit expenses still queued for group commit
+    write_queue.stop_all()
+    await scheduler.stop()
+    # Drop pending background refits; they run again after the next write
+    forecaster.stop()
 
 @app.get("/")
 async def root():
@@ -0,0 +1,49 @@
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional
+from datetime import date, datetime
+
+class BudgetBase(BaseModel):
+    category_id: Optional[int] = Field(None, description="Category the budget applies to; omit for all spending")
+    period: str = Field("month", pattern="^(week|month|quarter|year)$", description="Budget period")
+    amount_limit: float = Field(..., gt=0, description="Spending limit for one period")
+    thresholds: List[float] = Field(
+        default_factory=lambda: [0.5, 0.8, 1.0],
+        description="Fractions of the limit that raise an alert when crossed",
+    )
+
+    @field_validator("thresholds", mode="before")
+    @classmethod
+    def parse_thresholds(cls, value):
+        if isinstance(value, str):
+            return [float(part) for part in value.split(",") if part]
+        return value
+
+    @field_validator("thresholds")
+    @classmethod
+    def sort_thresholds(cls, value):
+        if any(threshold <= 0 for threshold in value):
+            raise ValueError("thresholds must be positive")
+        return sorted(set(value))
+
+class BudgetCreate(BudgetBase):
+    pass
+
+class Budget(BudgetBase):
+    id: int = Field(..., description="Unique identifier for the budget")
+    period_start: date = Field(..., description="First day of the period the counter covers")
+    spent: float = Field(..., description="Spend so far in the current period")
+    alert_level: float = Field(..., description="Highest threshold crossed in the current period")
+
+    class Config:
+        from_attributes = True
+
+class BudgetAlert(BaseModel):
+    id: int
+    budget_id: int
+    threshold: float
+    spent: float
+    period_start: date
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
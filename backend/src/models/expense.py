@@ -8,6 +8,7 @@ class ExpenseBase(BaseModel):
     date: datetime = Field(default_factory=datetime.utcnow, description="Date of the expense")
     category_id: Optional[int] = Field(None, description="ID of the category")
     receipt_path: Optional[str] = Field(None, description="Path to the receipt file")
+    currency: Optional[str] = Field(None, pattern="^[A-Za-z]{3}$", description="ISO 4217 code of the amount; null for the base currency")
 
 class ExpenseCreate(ExpenseBase):
     pass
@@ -17,6 +18,8 @@ class ExpenseUpdate(ExpenseBase):
 
 class Expense(ExpenseBase):
     id: int = Field(..., description="Unique identifier for the expense")
+    anomaly_score: Optional[float] = Field(None, description="Robust z-score of the amount within its category")
+    is_anomaly: bool = Field(False, description="Whether the amount was unusual for its category when recorded")
     
     class Config:
         from_attributes = True 
\ No newline at end of file
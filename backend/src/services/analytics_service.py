@@ -1,9 +1,72 @@
-from sqlalchemy import func, extract
+from sqlalchemy import func, extract, text
 from sqlalchemy.orm import Session
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+from datetime import date, datetime, timedelta
 import calendar
-from ..db.models import Expense as ExpenseModel, Category as CategoryModel
+from ..db.models import EXPENSE_BASE_AMOUNT, Expense as ExpenseModel, Category as CategoryModel
+from ..models.category import UNCATEGORIZED
+from .currency_service import has_foreign_expenses
+from .range_index import epoch_day, range_index
+from ..utils.periods import PERIODS, period_end, period_start, shift_months
+
+COMPARE_BASES = ("previous", "year_ago")
+GRANULARITIES = ("day",) + PERIODS
+# Buckets shown when no start is given
+DEFAULT_BUCKETS = {"day": 30, "week": 12, "month": 12, "quarter": 8, "year": 5}
+MAX_BUCKETS = 1000
+
+_DAY_AS_DATE = "date(day * 86400, 'unixepoch'{modifiers})"
+_DATE_AS_DAY = "CAST(julianday({date}) - 2440587.5 AS INTEGER)"
+# First day (days since 1970) of the bucket containing daily_totals.day; weeks start on Monday
+BUCKET_START_SQL = {
+    "day": "day",
+    "week": "day - (day + 3) % 7",
+    "month": _DATE_AS_DAY.format(date=_DAY_AS_DATE.format(modifiers=", 'start of month'")),
+    "quarter": _DATE_AS_DAY.format(date=_DAY_AS_DATE.format(
+        modifiers=", 'start of month', '-' || ((CAST(strftime('%m', day * 86400, 'unixepoch') AS INTEGER) - 1) % 3) || ' months'"
+    )),
+    "year": _DATE_AS_DAY.format(date=_DAY_AS_DATE.format(modifiers=", 'start of year'")),
+}
+
+def bucket_starts(granularity: str, start: date, end: date) -> List[date]:
+    """First day of every bucket overlapping ``start``..``end``."""
+    if granularity == "day":
+        return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    starts = []
+    current = period_start(granularity, start)
+    while current <= end:
+        starts.append(current)
+        current = period_end(granularity, current) + timedelta(days=1)
+    return starts
+
+def default_bucket_range(granularity: str, end: date) -> date:
+    """Start of the range covering the last ``DEFAULT_BUCKETS`` buckets up to ``end``."""
+    if granularity == "day":
+        return end - timedelta(days=DEFAULT_BUCKETS["day"] - 1)
+    start = period_start(granularity, end)
+    for _ in range(DEFAULT_BUCKETS[granularity] - 1):
+        start = period_start(granularity, start - timedelta(days=1))
+    return start
+
+def previous_range(period: str, basis: str, start: date, end: date):
+    """The range ``start``..``end`` is compared against: the same span one period or one year earlier."""
+    if basis == "year_ago":
+        return shift_months(start, -12), shift_months(end, -12)
+    if basis != "previous":
+        raise ValueError(f"basis must be one of {', '.join(COMPARE_BASES)}")
+    if period == "week":
+        return start - timedelta(days=7), end - timedelta(days=7)
+    months = {"month": 1, "quarter": 3, "year": 12}[period]
+    previous_start = shift_months(start, -months)
+    # Same number of days into the previous period, without running past its end
+    previous_end = min(previous_start + (end - start), start - timedelta(days=1))
+    return previous_start, previous_end
+
+def _change(current: float, previous: float) -> Dict:
+    return {
+        "change": round(current - previous, 2),
+        "changePct": round((current - previous) / previous * 100, 1) if previous else None,
+    }
 
 class AnalyticsService:
     def __init__(self, db: Session):
@@ -30,14 +93,17 @@ class AnalyticsService:
             start_date = current_date - timedelta(days=365)
             query = query.filter(ExpenseModel.date >= start_date)
             
+        # Sums convert foreign-currency amounts in SQL; a single-currency database sums amounts as they are
+        amount = EXPENSE_BASE_AMOUNT if has_foreign_expenses(self.db) else ExpenseModel.amount
+
         # Get total expenses for the selected time range
-        total_expenses = query.with_entities(func.sum(ExpenseModel.amount)).scalar() or 0
+        total_expenses = query.with_entities(func.sum(amount)).scalar() or 0
 
         # Get expenses by category for the selected time range
         category_query = (
             query.with_entities(
                 CategoryModel.name,
-                func.sum(ExpenseModel.amount).label('total')
+                func.sum(amount).label('total')
             )
             .join(CategoryModel, ExpenseModel.category_id == CategoryModel.id)
             .group_by(CategoryModel.name)
@@ -54,10 +120,10 @@ class AnalyticsService:
         )
         
         # Generate monthly trends (last 6 months)
-        monthly_trends = self._get_monthly_trends(query)
+        monthly_trends = self._get_monthly_trends(query, amount)
         
         # Generate weekly trends (last 4 weeks)
-        weekly_trends = self._get_weekly_trends(query)
+        weekly_trends = self._get_weekly_trends(query, amount)
         
         # Generate optimization suggestions
         optimization_suggestions = self._generate_optimization_suggestions(category_totals, total_expenses)
@@ -72,6 +138,7 @@ class AnalyticsService:
                 {
                     "id": expense.id,
                     "amount": float(expense.amount),
+                    "currency": expense.currency,
                     "category": expense.category.name if expense.category else "Uncategorized",
                     "description": expense.description,
                     "date": expense.date.isoformat()
@@ -83,7 +150,181 @@ class AnalyticsService:
             "optimizationSuggestions": optimization_suggestions
         }
     
-    def _get_monthly_trends(self, base_query):
+    def _category_names(self) -> Dict[int, str]:
+        names = dict(self.db.query(CategoryModel.id, CategoryModel.name).all())
+        names.setdefault(0, UNCATEGORIZED)
+        return names
+
+    def get_range_totals(self, start: date, end: date, category_id: Optional[int] = None) -> Dict:
+        """Totals for any inclusive date range, answered from the prefix-sum index."""
+        if end < start:
+            raise ValueError("end must not be before start")
+        index = range_index(self.db)
+        amounts, counts = index.totals(start, end)
+        names = self._category_names()
+        breakdown = [
+            {
+                "categoryId": cat_id,
+                "category": names.get(cat_id, f"Category {cat_id}"),
+                "total": round(float(amount), 2),
+                "count": int(count),
+            }
+            for cat_id, amount, count in zip(index.category_ids, amounts, counts)
+            if count and (category_id is None or cat_id == category_id)
+        ]
+        breakdown.sort(key=lambda item: item["total"], reverse=True)
+        days = (end - start).days + 1
+        total = sum(item["total"] for item in breakdown)
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "days": days,
+            "total": round(total, 2),
+            "count": sum(item["count"] for item in breakdown),
+            "dailyAverage": round(total / days, 2),
+            "categoryBreakdown": breakdown,
+        }
+
+    def compare_periods(
+        self,
+        period: str = "month",
+        basis: str = "previous",
+        as_of: Optional[date] = None,
+        rolling_windows: Sequence[int] = (30, 90),
+    ) -> Dict:
+        """Period-to-date spend against the same span of an earlier period, plus rolling averages."""
+        as_of = as_of or date.today()
+        start = period_start(period, as_of)
+        previous_start, previous_end = previous_range(period, basis, start, as_of)
+
+        index = range_index(self.db)
+        names = self._category_names()
+        current_amounts, _ = index.totals(start, as_of)
+        previous_amounts, _ = index.totals(previous_start, previous_end)
+
+        categories = []
+        for cat_id, current, previous in zip(index.category_ids, current_amounts, previous_amounts):
+            if not current and not previous:
+                continue
+            categories.append({
+                "categoryId": cat_id,
+                "category": names.get(cat_id, f"Category {cat_id}"),
+                "current": round(float(current), 2),
+                "previous": round(float(previous), 2),
+                **_change(float(current), float(previous)),
+            })
+        categories.sort(key=lambda item: abs(item["change"]), reverse=True)
+
+        rolling = []
+        for window in rolling_windows:
+            window_start = as_of - timedelta(days=window - 1)
+            amounts, _ = index.totals(window_start, as_of)
+            rolling.append({
+                "days": window,
+                "start": window_start.isoformat(),
+                "end": as_of.isoformat(),
+                "dailyAverage": round(float(amounts.sum()) / window, 2),
+                "categories": [
+                    {
+                        "categoryId": cat_id,
+                        "category": names.get(cat_id, f"Category {cat_id}"),
+                        "dailyAverage": round(float(amount) / window, 2),
+                    }
+                    for cat_id, amount in zip(index.category_ids, amounts)
+                    if amount
+                ],
+            })
+
+        current_total = float(current_amounts.sum())
+        previous_total = float(previous_amounts.sum())
+        return {
+            "period": period,
+            "basis": basis,
+            "current": {"start": start.isoformat(), "end": as_of.isoformat(), "total": round(current_total, 2)},
+            "previous": {
+                "start": previous_start.isoformat(),
+                "end": previous_end.isoformat(),
+                "total": round(previous_total, 2),
+            },
+            **_change(current_total, previous_total),
+            "categories": categories,
+            "rolling": rolling,
+        }
+
+    def get_buckets(
+        self,
+        granularity: str = "day",
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        group_by: Optional[str] = None,
+    ) -> Dict:
+        """Zero-filled spend per day/week/month/quarter/year, from one grouped query on daily_totals.
+
+        Buckets are clipped to ``start``..``end``. With ``group_by="category"``
+        each category gets a series of totals parallel to ``buckets``.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        if group_by not in (None, "category"):
+            raise ValueError("group_by must be 'category' or omitted")
+        end = end or date.today()
+        start = start or default_bucket_range(granularity, end)
+        if end < start:
+            raise ValueError("end must not be before start")
+        starts = bucket_starts(granularity, start, end)
+        if len(starts) > MAX_BUCKETS:
+            raise ValueError(f"{len(starts)} buckets requested; at most {MAX_BUCKETS}, use a coarser granularity")
+
+        rows = self.db.execute(text(f"""
+            SELECT {BUCKET_START_SQL[granularity]} AS bucket, category_id, SUM(amount), SUM(count)
+            FROM daily_totals
+            WHERE day BETWEEN :start AND :end AND count != 0
+            GROUP BY bucket, category_id"""), {"start": epoch_day(start), "end": epoch_day(end)}).all()
+
+        position = {epoch_day(bucket): index for index, bucket in enumerate(starts)}
+        totals = [0.0] * len(starts)
+        counts = [0] * len(starts)
+        series: Dict[int, Dict] = {}
+        for bucket, category_id, amount, count in rows:
+            index = position[bucket]
+            totals[index] += amount
+            counts[index] += count
+            if group_by:
+                category = series.setdefault(category_id, {"totals": [0.0] * len(starts), "counts": [0] * len(starts)})
+                category["totals"][index] = round(amount, 2)
+                category["counts"][index] = count
+
+        buckets = []
+        for index, bucket in enumerate(starts):
+            bucket_end = bucket if granularity == "day" else period_end(granularity, bucket)
+            buckets.append({
+                "start": max(bucket, start).isoformat(),
+                "end": min(bucket_end, end).isoformat(),
+                "total": round(totals[index], 2),
+                "count": counts[index],
+            })
+        result = {
+            "granularity": granularity,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "total": round(sum(totals), 2),
+            "count": sum(counts),
+            "buckets": buckets,
+        }
+        if group_by:
+            names = self._category_names()
+            result["series"] = sorted(
+                (
+                    {"categoryId": cat_id, "category": names.get(cat_id, f"Category {cat_id}"),
+                     "total": round(sum(values["totals"]), 2), **values}
+                    for cat_id, values in series.items()
+                ),
+                key=lambda item: item["total"],
+                reverse=True,
+            )
+        return result
+
+    def _get_monthly_trends(self, base_query, amount):
         """Generate monthly spending trends for the last 6 months."""
         today = datetime.now()
         monthly_data = []
@@ -91,16 +332,16 @@ class AnalyticsService:
         # Get all dates for the past year to calculate proper month-to-month trends
         date_year_ago = today - timedelta(days=365)
         
-        # Query to get all expenses for the past year
-        yearly_expenses = (
+        # Totals per month for the past year, grouped in SQL
+        month = func.strftime("%Y-%m", ExpenseModel.date)
+        monthly_totals = dict(
             base_query
             .filter(ExpenseModel.date >= date_year_ago)
+            .with_entities(month, func.sum(amount))
+            .group_by(month)
             .all()
         )
         
-        # Create a dict to store expenses by month
-        monthly_totals = {}
-        
         # Generate sorted months for the last 6 months
         sorted_months = []
         for i in range(5, -1, -1):  # Last 6 months
@@ -118,13 +359,6 @@ class AnalyticsService:
             month_name = calendar.month_name[target_month]
             sorted_months.append((month_key, f"{month_name} {target_year}", target_year * 100 + target_month))
         
-        # Group expenses by month using the same format as the month keys
-        for expense in yearly_expenses:
-            month_key = expense.date.strftime("%Y-%m")
-            if month_key not in monthly_totals:
-                monthly_totals[month_key] = 0
-            monthly_totals[month_key] += expense.amount
-        
         # Create data points in chronological order
         for month_key, month_label, sort_key in sorted_months:
             # Get the total for this month (or 0 if no expenses)
@@ -138,7 +372,7 @@ class AnalyticsService:
             
         return monthly_data
     
-    def _get_weekly_trends(self, base_query):
+    def _get_weekly_trends(self, base_query, amount):
         """Generate weekly spending trends for the last 4 weeks."""
         today = datetime.now()
         weekly_data = []
@@ -156,7 +390,7 @@ class AnalyticsService:
                 base_query
                 .filter(ExpenseModel.date >= start_date)
                 .filter(ExpenseModel.date <= end_date)
-                .with_entities(func.sum(ExpenseModel.amount))
+                .with_entities(func.sum(amount))
                 .scalar() or 0
             )
             
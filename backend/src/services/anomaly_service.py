@@ -0,0 +1,252 @@
+"""Per-category outlier detection that scores each expense as it is written.
+
+Every category keeps running statistics in ``category_stats``: count, mean
+and squared deviations (Welford's method, exact and reversible on delete)
+plus a median and median absolute deviation (MAD). The median and MAD are
+tracked with a stochastic approximation that nudges each estimate towards
+a new value by a small step, so one write costs O(1); rebuilds recompute
+them exactly.
+
+A new expense is scored against its category *before* it is added, with the
+robust z-score ``0.6745 * (amount - median) / MAD``. Scores above
+``ANOMALY_THRESHOLD`` (3.5, after Iglewicz and Hoaglin) flag the expense;
+only unusually high amounts are flagged, and only once the category has
+``ANOMALY_MIN_HISTORY`` expenses. The flag is stored on the row and indexed,
+so listing anomalies never rescans history.
+"""
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+from ..db.models import Category as CategoryModel, CategoryStats, Expense as ExpenseModel, base_amount_sql
+from ..utils.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+settings = {
+    "threshold": float(os.getenv("ANOMALY_THRESHOLD", "3.5")),
+    "min_history": int(os.getenv("ANOMALY_MIN_HISTORY", "10")),
+}
+
+ROBUST_STEP = 0.01  # Smallest fraction of the spread the median/MAD move by per expense
+MIN_SPREAD = 0.01  # Spread floor as a fraction of the median, for categories with constant amounts
+
+def _spread(stats: CategoryStats) -> float:
+    return max(stats.mad, MIN_SPREAD * abs(stats.median), 0.01)
+
+def robust_score(stats: CategoryStats, amount: float) -> Optional[float]:
+    if stats.count < settings["min_history"]:
+        return None
+    return 0.6745 * (amount - stats.median) / _spread(stats)
+
+def z_score(stats: CategoryStats, amount: float) -> Optional[float]:
+    if stats.count < 2 or stats.m2 <= 0:
+        return None
+    return (amount - stats.mean) / math.sqrt(stats.m2 / (stats.count - 1))
+
+def add_value(stats: CategoryStats, amount: float):
+    """Welford update plus one stochastic step for the median and MAD."""
+    stats.count += 1
+    delta = amount - stats.mean
+    stats.mean += delta / stats.count
+    stats.m2 += delta * (amount - stats.mean)
+    if stats.count == 1:
+        stats.median, stats.mad = amount, 0.0
+        return
+    # Large steps while a category is young, settling to a slow drift that still follows change
+    step = max(1 / stats.count, ROBUST_STEP) * _spread(stats)
+    if amount != stats.median:
+        stats.median += math.copysign(min(step, abs(amount - stats.median)), amount - stats.median)
+    deviation = abs(amount - stats.median)
+    if deviation != stats.mad:
+        stats.mad = max(stats.mad + math.copysign(min(step, abs(deviation - stats.mad)), deviation - stats.mad), 0.0)
+
+def remove_value(stats: CategoryStats, amount: float):
+    """Reverse Welford update; the median and MAD estimates are left as they are."""
+    if stats.count <= 1:
+        stats.count, stats.mean, stats.m2 = 0, 0.0, 0.0
+        return
+    stats.count -= 1
+    delta = amount - stats.mean
+    stats.mean -= delta / stats.count
+    stats.m2 = max(stats.m2 - delta * (amount - stats.mean), 0.0)
+
+class AnomalyService:
+    def __init__(self, db: Session):
+        self.db = db
+        # Categories whose statistics this transaction has locked; use one service per transaction
+        self._locked = set()
+
+    def _stats(self, category_id: Optional[int]) -> CategoryStats:
+        """The category's statistics, read only once this transaction holds the write lock.
+
+        pysqlite sends BEGIN before the first write, not before reads, so
+        reading first would let two writers update the same values and lose
+        one update. The insert (a no-op when the row exists) is that first write.
+        """
+        key = category_id or 0
+        if key in self._locked:
+            return self.db.get(CategoryStats, key)
+        self.db.execute(insert(CategoryStats).prefix_with("OR IGNORE").values(
+            category_id=key, count=0, mean=0.0, m2=0.0, median=0.0, mad=0.0
+        ))
+        self._locked.add(key)
+        # Replaces a copy the session may have read before the lock
+        return self.db.get(CategoryStats, key, populate_existing=True)
+
+    def observe(self, expense: ExpenseModel, amount: Optional[float] = None):
+        """Score ``expense`` against its category, then add it to the statistics; the caller commits.
+
+        ``amount`` is the expense's amount in the base currency when it differs from ``expense.amount``.
+        """
+        amount = expense.amount if amount is None else amount
+        stats = self._stats(expense.category_id)
+        score = robust_score(stats, amount)
+        expense.anomaly_score = score
+        expense.is_anomaly = score is not None and score >= settings["threshold"]
+        add_value(stats, amount)
+
+    def forget(self, category_id: Optional[int], amount: float):
+        """Take a deleted (or replaced) amount out of its category's statistics; the caller commits."""
+        remove_value(self._stats(category_id), amount)
+
+    def rebuild(self, category_ids: Optional[Iterable[int]] = None):
+        """Recompute statistics exactly and rescore every expense, e.g. after bulk writes; the caller commits.
+
+        Earlier expenses are scored against the final statistics of their
+        category rather than those at the time they were written.
+        """
+        if category_ids is None:
+            where = stats_where = ""
+        else:
+            keys = ", ".join(str(int(category_id or 0)) for category_id in set(category_ids))
+            where = f"WHERE COALESCE(category_id, 0) IN ({keys})"
+            stats_where = f"WHERE category_id IN ({keys})"
+
+        self.db.flush()
+        self._locked.clear()
+        self.db.execute(text(f"DELETE FROM category_stats {stats_where}"))
+        amount = base_amount_sql("expenses")
+        rows = self.db.execute(text(f"SELECT COALESCE(category_id, 0), {amount} FROM expenses {where}")).all()
+        if rows:
+            self.db.execute(insert(CategoryStats), _exact_stats(*zip(*rows)))
+
+        spread = f"MAX(s.mad, {MIN_SPREAD} * ABS(s.median), 0.01)"
+        self.db.execute(text(f"""
+            UPDATE expenses SET
+                anomaly_score = (
+                    SELECT CASE WHEN s.count >= :min_history THEN 0.6745 * ({amount} - s.median) / {spread} END
+                    FROM category_stats s WHERE s.category_id = COALESCE(expenses.category_id, 0)
+                )
+            {where}"""), {"min_history": settings["min_history"]})
+        self.db.execute(text(f"""
+            UPDATE expenses SET is_anomaly = COALESCE(anomaly_score >= :threshold, 0) {where}"""),
+            {"threshold": settings["threshold"]})
+        # Rows loaded before the rebuild are stale now
+        self.db.expire_all()
+
+    def get_anomalies(self, skip: int = 0, limit: int = 100, category_id: Optional[int] = None) -> List[Dict]:
+        query = self.db.query(ExpenseModel).filter(ExpenseModel.is_anomaly.is_(True))
+        if category_id is not None:
+            query = query.filter(ExpenseModel.category_id == category_id)
+        expenses = query.order_by(ExpenseModel.date.desc()).offset(skip).limit(limit).all()
+
+        names = dict(self.db.query(CategoryModel.id, CategoryModel.name).all())
+        stats = {
+            row.category_id: row
+            for row in self.db.query(CategoryStats).filter(
+                CategoryStats.category_id.in_({expense.category_id or 0 for expense in expenses})
+            )
+        }
+        anomalies = []
+        for expense in expenses:
+            category_stats = stats.get(expense.category_id or 0)
+            current = z_score(category_stats, expense.amount) if category_stats else None
+            anomalies.append({
+                "id": expense.id,
+                "amount": expense.amount,
+                "description": expense.description,
+                "date": expense.date.isoformat() if expense.date else None,
+                "categoryId": expense.category_id,
+                "category": names.get(expense.category_id, "Uncategorized"),
+                "score": round(expense.anomaly_score, 2) if expense.anomaly_score is not None else None,
+                "zScore": round(current, 2) if current is not None else None,
+                "typicalAmount": round(category_stats.median, 2) if category_stats else None,
+                "averageAmount": round(category_stats.mean, 2) if category_stats else None,
+            })
+        return anomalies
+
+class BulkScorer:
+    """Vectorized scoring for bulk loads, in place of ``observe`` per row and a ``rebuild`` afterwards.
+
+    Each batch is scored against the exact statistics of the expenses before
+    it (those already in the database and earlier batches), so months loaded
+    oldest first are scored much as they would have been when entered.
+    """
+
+    def __init__(self, db: Session):
+        rows = db.execute(text(f"SELECT COALESCE(category_id, 0), {base_amount_sql('expenses')} FROM expenses")).all()
+        self._history: Dict[int, "np.ndarray"] = {}
+        if rows:
+            self._extend(*zip(*rows))
+
+    def _extend(self, category_ids, amounts):
+        category_ids = np.asarray(category_ids, dtype=np.int64)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        for key in np.unique(category_ids).tolist():
+            added = amounts[category_ids == key]
+            history = self._history.get(key)
+            self._history[key] = added if history is None else np.concatenate([history, added])
+
+    def score(self, category_ids, amounts) -> Tuple[List[Optional[float]], List[bool]]:
+        """``anomaly_score`` and ``is_anomaly`` columns for a batch, which then joins the history."""
+        category_ids = np.asarray(category_ids, dtype=np.int64)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        scores = np.full(len(amounts), np.nan)
+        for key in np.unique(category_ids).tolist():
+            history = self._history.get(key)
+            if history is None or len(history) < settings["min_history"]:
+                continue
+            median = float(np.median(history))
+            spread = max(float(np.median(np.abs(history - median))), MIN_SPREAD * abs(median), 0.01)
+            rows = category_ids == key
+            scores[rows] = 0.6745 * (amounts[rows] - median) / spread
+        self._extend(category_ids, amounts)
+        flags = (scores >= settings["threshold"]).tolist()
+        return [None if math.isnan(score) else score for score in scores.tolist()], flags
+
+    def save(self, db: Session):
+        """Replace ``category_stats`` with the exact statistics of everything scored; the caller commits."""
+        db.execute(text("DELETE FROM category_stats"))
+        if self._history:
+            keys = list(self._history)
+            category_ids = np.repeat(keys, [len(self._history[key]) for key in keys])
+            db.execute(insert(CategoryStats), _exact_stats(category_ids, np.concatenate(list(self._history.values()))))
+
+def _exact_stats(category_ids, amounts) -> List[Dict]:
+    category_ids = np.asarray(category_ids, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    order = np.lexsort((amounts, category_ids))
+    category_ids, amounts = category_ids[order], amounts[order]
+    keys, starts, counts = np.unique(category_ids, return_index=True, return_counts=True)
+
+    means = np.add.reduceat(amounts, starts) / counts
+    deviations = amounts - np.repeat(means, counts)
+    m2 = np.add.reduceat(deviations * deviations, starts)
+    medians = _sorted_medians(amounts, starts, counts)
+    absolute = np.abs(amounts - np.repeat(medians, counts))
+    absolute = absolute[np.lexsort((absolute, category_ids))]
+    mads = _sorted_medians(absolute, starts, counts)
+    return [
+        {"category_id": key, "count": count, "mean": mean, "m2": m2_value, "median": median, "mad": mad}
+        for key, count, mean, m2_value, median, mad in zip(
+            keys.tolist(), counts.tolist(), means.tolist(), m2.tolist(), medians.tolist(), mads.tolist()
+        )
+    ]
+
+def _sorted_medians(values, starts, counts):
+    """Medians of consecutive sorted runs of ``values``."""
+    low = starts + (counts - 1) // 2
+    high = starts + counts // 2
+    return (values[low] + values[high]) / 2
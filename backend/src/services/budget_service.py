@@ -0,0 +1,195 @@
+import logging
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from ..db.models import Budget as BudgetModel, BudgetAlert as BudgetAlertModel, Category as CategoryModel, DailyTotal
+from ..models.budget import Budget, BudgetAlert, BudgetCreate
+from ..core.events import broker, topic_for
+from .range_index import epoch_day
+from ..utils.periods import period_end, period_start
+
+logger = logging.getLogger("expenses.budgets")
+
+# (category_id, day, signed amount, +1 or -1) for one side of an expense write
+SpendChange = Tuple[Optional[int], date, float, int]
+
+def _thresholds(budget: BudgetModel) -> List[float]:
+    return sorted(float(part) for part in budget.thresholds.split(",") if part)
+
+class BudgetService:
+    """Budgets with spend-to-date counters that expense writes keep current.
+
+    ``ExpenseService`` calls ``apply_changes`` after flushing a write and before
+    committing, so a counter can never disagree with the expenses it covers.
+    Counters are rebuilt from ``daily_totals`` when a new period starts.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create_budget(self, budget: BudgetCreate) -> Budget:
+        db_budget = BudgetModel(
+            category_id=budget.category_id,
+            period=budget.period,
+            amount_limit=budget.amount_limit,
+            thresholds=",".join(str(threshold) for threshold in budget.thresholds),
+        )
+        self._start_period(db_budget, date.today())
+        # A budget created over its thresholds starts out at that level without alerting
+        db_budget.alert_level = self._level(db_budget)
+        self.db.add(db_budget)
+        self.db.commit()
+        broker.committed(topic_for(self.db.get_bind()))
+        self.db.refresh(db_budget)
+        return Budget.from_orm(db_budget)
+
+    def get_budgets(self) -> List[Budget]:
+        return [Budget.from_orm(budget) for budget in self.db.query(BudgetModel).all()]
+
+    def delete_budget(self, budget_id: int) -> bool:
+        budget = self.db.query(BudgetModel).filter(BudgetModel.id == budget_id).first()
+        if not budget:
+            return False
+        self.db.query(BudgetAlertModel).filter(BudgetAlertModel.budget_id == budget_id).delete()
+        self.db.delete(budget)
+        self.db.commit()
+        broker.committed(topic_for(self.db.get_bind()))
+        return True
+
+    def get_alerts(self, limit: int = 50) -> List[BudgetAlert]:
+        alerts = self.db.query(BudgetAlertModel).order_by(BudgetAlertModel.id.desc()).limit(limit).all()
+        return [BudgetAlert.from_orm(alert) for alert in alerts]
+
+    def apply_changes(self, changes: Iterable[SpendChange]) -> List[BudgetAlertModel]:
+        """Update the counters affected by an expense write; the caller commits.
+
+        The write must already be flushed: a counter whose period has rolled
+        over is rebuilt from daily_totals, which then includes the write.
+        Returns the alerts raised by thresholds crossed upwards.
+        """
+        changes = list(changes)
+        category_ids = {category_id for category_id, *_ in changes}
+        budgets = self.db.query(BudgetModel).filter(
+            or_(BudgetModel.category_id.is_(None), BudgetModel.category_id.in_(category_ids))
+        ).all()
+
+        today = date.today()
+        alerts = []
+        for budget in budgets:
+            if budget.period_start != period_start(budget.period, today):
+                self._start_period(budget, today)
+            else:
+                end = period_end(budget.period, budget.period_start)
+                budget.spent += sum(
+                    amount for category_id, day, amount, _ in changes
+                    if (budget.category_id is None or budget.category_id == category_id)
+                    and budget.period_start <= day <= end
+                )
+            alerts.extend(self._evaluate(budget))
+        return alerts
+
+    def recalculate(self, category_ids: Optional[Iterable[int]] = None):
+        """Rebuild counters from daily_totals, e.g. after bulk writes; the caller commits."""
+        query = self.db.query(BudgetModel)
+        if category_ids is not None:
+            query = query.filter(or_(BudgetModel.category_id.is_(None), BudgetModel.category_id.in_(list(category_ids))))
+        today = date.today()
+        for budget in query.all():
+            previous_start, previous_level = budget.period_start, budget.alert_level
+            self._start_period(budget, today)
+            if budget.period_start == previous_start:
+                # Same period: move the alert level down if spend fell, never alert
+                budget.alert_level = min(previous_level, self._level(budget))
+
+    def get_status(self) -> List[Dict]:
+        """Current state of every budget, read from the counters."""
+        today = date.today()
+        budgets = self.db.query(BudgetModel).all()
+        rolled_over = False
+        for budget in budgets:
+            if budget.period_start != period_start(budget.period, today):
+                self._start_period(budget, today)
+                rolled_over = True
+        if rolled_over:
+            self.db.commit()
+            broker.committed(topic_for(self.db.get_bind()))
+
+        names = self._category_names({budget.category_id for budget in budgets})
+        return [self._status(budget, names, today) for budget in budgets]
+
+    def _start_period(self, budget: BudgetModel, today: date):
+        budget.period_start = period_start(budget.period, today)
+        budget.spent = self._spent_in_period(budget)
+        budget.alert_level = 0.0
+
+    def _spent_in_period(self, budget: BudgetModel) -> float:
+        end = period_end(budget.period, budget.period_start)
+        query = self.db.query(func.sum(DailyTotal.amount)).filter(
+            DailyTotal.day >= epoch_day(budget.period_start),
+            DailyTotal.day <= epoch_day(end),
+        )
+        if budget.category_id is not None:
+            query = query.filter(DailyTotal.category_id == budget.category_id)
+        return float(query.scalar() or 0.0)
+
+    def _level(self, budget: BudgetModel) -> float:
+        used = budget.spent / budget.amount_limit
+        crossed = [threshold for threshold in _thresholds(budget) if used >= threshold]
+        return crossed[-1] if crossed else 0.0
+
+    def _evaluate(self, budget: BudgetModel) -> List[BudgetAlertModel]:
+        level = self._level(budget)
+        alerts = []
+        if level > budget.alert_level:
+            for threshold in _thresholds(budget):
+                if budget.alert_level < threshold <= level:
+                    alert = BudgetAlertModel(
+                        budget_id=budget.id,
+                        threshold=threshold,
+                        spent=budget.spent,
+                        period_start=budget.period_start,
+                        created_at=datetime.utcnow(),
+                    )
+                    self.db.add(alert)
+                    alerts.append(alert)
+                    logger.info(
+                        "Budget %s crossed %d%% of its %s limit (%.2f of %.2f)",
+                        budget.id, threshold * 100, budget.period, budget.spent, budget.amount_limit,
+                    )
+        # Dropping back below a threshold re-arms it for this period
+        budget.alert_level = level
+        return alerts
+
+    def _category_names(self, category_ids) -> Dict[int, str]:
+        ids = [category_id for category_id in category_ids if category_id is not None]
+        if not ids:
+            return {}
+        return dict(self.db.query(CategoryModel.id, CategoryModel.name).filter(CategoryModel.id.in_(ids)).all())
+
+    def _status(self, budget: BudgetModel, names: Dict[int, str], today: date) -> Dict:
+        end = period_end(budget.period, budget.period_start)
+        used = budget.spent / budget.amount_limit
+        if used >= 1:
+            state = "exceeded"
+        elif budget.alert_level > 0:
+            state = "warning"
+        else:
+            state = "ok"
+        return {
+            "budgetId": budget.id,
+            "categoryId": budget.category_id,
+            "category": names.get(budget.category_id, f"Category {budget.category_id}")
+            if budget.category_id is not None else "All spending",
+            "period": budget.period,
+            "periodStart": budget.period_start.isoformat(),
+            "periodEnd": end.isoformat(),
+            "limit": round(budget.amount_limit, 2),
+            "spent": round(budget.spent, 2),
+            "remaining": round(budget.amount_limit - budget.spent, 2),
+            "percentUsed": round(used * 100, 1),
+            "alertLevel": budget.alert_level,
+            "state": state,
+            "daysElapsed": (today - budget.period_start).days + 1,
+            "daysRemaining": (end - today).days,
+        }
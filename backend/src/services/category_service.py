@@ -1,7 +1,14 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Dict, List, Optional
 from ..models.category import CategoryCreate, Category, UNCATEGORIZED, CategoryUpdate
-from ..db.models import Category as CategoryModel
+from ..db.models import Budget as BudgetModel, Category as CategoryModel
+from ..core.cache import cache_for
+from .anomaly_service import AnomalyService
+from .budget_service import BudgetService
+from .forecast_service import schedule_forecast
+from .sync_service import current_version
+from ..core.events import broker, data_version, topic_for
+from ..core.scheduler import scheduler
 
 class CategoryService:
     def __init__(self, db: Session):
@@ -15,9 +22,19 @@ class CategoryService:
         self.db.add(db_category)
         self.db.commit()
         self.db.refresh(db_category)
-        return Category.from_orm(db_category)
+        created = Category.from_orm(db_category)
+        self._publish("category.created", {"category": created.model_dump(mode="json")})
+        return created
 
     def get_categories(self, skip: int = 0, limit: int = 100) -> List[Category]:
+        # Categories are read on every page load and rarely change, so they are
+        # cached per process until the database is written to
+        cache = cache_for(self.db.get_bind(), "categories")
+        if cache is None:
+            return self._load_categories(skip, limit)
+        return list(cache.get((skip, limit), lambda: self._load_categories(skip, limit)))
+
+    def _load_categories(self, skip: int, limit: int) -> List[Category]:
         categories = self.db.query(CategoryModel).offset(skip).limit(limit).all()
         return [Category.from_orm(category) for category in categories]
 
@@ -39,34 +56,56 @@ class CategoryService:
             # Move all expenses to uncategorized
             for expense in category.expenses:
                 expense.category_id = uncategorized.id
-            
+
+            # The category's budgets go with it; Uncategorized budgets gain its spend
+            self.db.query(BudgetModel).filter(BudgetModel.category_id == category_id).delete()
             self.db.delete(category)
+            self.db.flush()
+            BudgetService(self.db).recalculate([uncategorized.id])
+            AnomalyService(self.db).rebuild([category_id, uncategorized.id])
             self.db.commit()
+            schedule_forecast(self.db)
+            scheduler.notify_write()
+            # Too many totals move to describe as deltas; clients refetch
+            self._publish("category.deleted", {"id": category_id, "movedTo": uncategorized.id, "refetch": True})
             return True
         return False
 
+    def _publish(self, event_type: str, data: Dict):
+        """Tell event subscribers about a committed category change."""
+        if broker.running:
+            broker.publish(topic_for(self.db.get_bind()), event_type, {
+                **data,
+                "dataVersion": data_version(self.db.get_bind()),
+                "syncVersion": current_version(self.db.connection()),
+            })
+
     def get_category_by_name(self, name: str) -> Optional[Category]:
         category = self.db.query(CategoryModel).filter(CategoryModel.name == name).first()
         return Category.from_orm(category) if category else None
 
     def update_category(self, category_id: int, category: CategoryUpdate) -> Optional[Category]:
-        db_category = self.get_category(category_id)
+        # The ORM row, so the changes are saved
+        db_category = self.db.query(CategoryModel).filter(CategoryModel.id == category_id).first()
         if db_category and not db_category.is_protected:
             for key, value in category.dict(exclude_unset=True).items():
                 setattr(db_category, key, value)
             self.db.commit()
             self.db.refresh(db_category)
-            return db_category
+            updated = Category.from_orm(db_category)
+            self._publish("category.updated", {"category": updated.model_dump(mode="json")})
+            return updated
         return None
 
     def ensure_uncategorized_exists(self):
         """Ensure the Uncategorized category exists and is protected."""
-        uncategorized = self.get_category_by_name(UNCATEGORIZED)
+        # Work on the ORM row; setting the flag on the returned schema object wouldn't persist
+        uncategorized = self.db.query(CategoryModel).filter(CategoryModel.name == UNCATEGORIZED).first()
         if not uncategorized:
-            uncategorized = self.create_category(CategoryCreate(name=UNCATEGORIZED))
-            uncategorized.is_protected = True
+            uncategorized = CategoryModel(name=UNCATEGORIZED, is_protected=True)
+            self.db.add(uncategorized)
             self.db.commit()
         elif not uncategorized.is_protected:
             uncategorized.is_protected = True
             self.db.commit()
-        return uncategorized 
\ No newline at end of file
+        return Category.from_orm(uncategorized) 
\ No newline at end of file
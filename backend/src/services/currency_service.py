@@ -0,0 +1,199 @@
+"""Exchange rates for expenses recorded in other currencies.
+
+Amounts are stored as entered, with the expense's currency (NULL for
+``BASE_CURRENCY``). Rates come from a local CSV file (``date,currency,rate``,
+rate in base currency units per unit) loaded into ``exchange_rates``; a rate
+applies from its day until the next one for the same currency, and the
+first known rate also covers earlier days.
+
+Totals are converted in SQL (``base_amount_sql`` in the models): the
+``daily_totals`` triggers convert each row as it is written, and summaries
+over ``expenses`` convert inside the grouped query, but only when a
+foreign-currency expense exists at all. The write path (budget counters,
+anomaly statistics) converts in Python through ``RateCache``, which keeps
+each currency's rates as sorted intervals in memory. Reloading the file
+rebuilds everything derived from converted amounts; other workers notice
+the reload within ``EXCHANGE_RATE_RECHECK_SECONDS``.
+"""
+import csv
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, insert, text
+from sqlalchemy.orm import Session
+from ..core.cache import database_path
+from ..db.models import REBUILD_DAILY_TOTALS_SQL, ExchangeRate, ExchangeRateSource, Expense as ExpenseModel
+from .anomaly_service import AnomalyService
+from .budget_service import BudgetService
+from .range_index import EPOCH, epoch_day
+
+settings = {
+    "base": os.getenv("BASE_CURRENCY", "USD").upper(),
+    "rates_file": Path(os.getenv("EXCHANGE_RATES_FILE", "data/exchange_rates.csv")),
+    # How long cached rates are trusted before checking whether the table was reloaded
+    "recheck_seconds": float(os.getenv("EXCHANGE_RATE_RECHECK_SECONDS", "60")),
+}
+
+def normalize_currency(currency: Optional[str]) -> Optional[str]:
+    """Stored form of a currency code: upper case, or None for the base currency."""
+    if not currency:
+        return None
+    currency = currency.upper()
+    return None if currency == settings["base"] else currency
+
+def has_foreign_expenses(db: Session) -> bool:
+    """Whether any expense needs conversion; one probe of a partial index."""
+    return db.query(ExpenseModel.id).filter(ExpenseModel.currency.isnot(None)).first() is not None
+
+class RateIntervals:
+    """Step function of one currency's rates over days."""
+
+    def __init__(self, days: List[int], rates: List[float]):
+        self.days = days
+        self.rates = rates
+
+    def rate_on(self, day: int) -> float:
+        index = bisect_right(self.days, day) - 1
+        return self.rates[max(index, 0)]
+
+class RateCache:
+    """Per-database rate intervals, loaded per currency on first use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._currencies: Dict[str, Optional[RateIntervals]] = {}
+        self._loaded_at: Optional[datetime] = None
+        self._checked = 0.0
+
+    def clear(self):
+        with self._lock:
+            self._currencies.clear()
+            self._checked = 0.0
+
+    def _validate(self, db: Session):
+        now = time.monotonic()
+        if now - self._checked < settings["recheck_seconds"]:
+            return
+        source = db.get(ExchangeRateSource, 1)
+        loaded_at = source.loaded_at if source else None
+        if loaded_at != self._loaded_at:
+            self._currencies.clear()
+            self._loaded_at = loaded_at
+        self._checked = now
+
+    def intervals(self, db: Session, currency: str) -> Optional[RateIntervals]:
+        with self._lock:
+            self._validate(db)
+            if currency not in self._currencies:
+                rows = (
+                    db.query(ExchangeRate.day, ExchangeRate.rate)
+                    .filter(ExchangeRate.currency == currency)
+                    .order_by(ExchangeRate.day)
+                    .all()
+                )
+                self._currencies[currency] = RateIntervals(*map(list, zip(*rows))) if rows else None
+            return self._currencies[currency]
+
+_caches: Dict[str, RateCache] = {}
+_caches_lock = threading.Lock()
+
+def rate_cache(db: Session) -> RateCache:
+    key = database_path(db.get_bind()) or ":memory:"
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = RateCache()
+        return cache
+
+def is_known_currency(db: Session, currency: Optional[str]) -> bool:
+    currency = normalize_currency(currency)
+    return currency is None or rate_cache(db).intervals(db, currency) is not None
+
+def to_base(db: Session, amount: float, currency: Optional[str], day: date) -> float:
+    """``amount`` in the base currency, converted the same way as ``base_amount_sql``."""
+    if currency is None:
+        return amount
+    intervals = rate_cache(db).intervals(db, currency)
+    return amount * (intervals.rate_on(epoch_day(day)) if intervals else 1.0)
+
+def read_rates_file(path: Path) -> List[Tuple[str, int, float]]:
+    rates = []
+    with open(path, newline="") as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            try:
+                currency = row["currency"].strip().upper()
+                rate = float(row["rate"])
+                day = epoch_day(date.fromisoformat(row["date"].strip()))
+            except (KeyError, AttributeError, ValueError) as e:
+                raise ValueError(f"{path}:{line}: expected date,currency,rate ({e})")
+            if len(currency) != 3 or rate <= 0:
+                raise ValueError(f"{path}:{line}: invalid currency {currency!r} or rate {rate}")
+            rates.append((currency, day, rate))
+    return rates
+
+class CurrencyService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def load_rates(self, path: Optional[Path] = None, force: bool = False) -> Optional[int]:
+        """Replace the rate table from ``path`` if the file changed; returns the rates loaded, or None if skipped.
+
+        Existing foreign-currency expenses are converted again, so totals,
+        budget counters and anomaly statistics are rebuilt when there are any.
+        """
+        path = Path(path or settings["rates_file"])
+        if not path.is_file():
+            return None
+        mtime = path.stat().st_mtime
+        source = self.db.get(ExchangeRateSource, 1)
+        if not force and source is not None and source.path == str(path) and source.mtime == mtime:
+            return None
+
+        rates = read_rates_file(path)
+        self.db.query(ExchangeRate).delete()
+        if rates:
+            self.db.execute(insert(ExchangeRate), [
+                {"currency": currency, "day": day, "rate": rate} for currency, day, rate in rates
+            ])
+        if source is None:
+            source = ExchangeRateSource(id=1)
+            self.db.add(source)
+        source.path, source.mtime, source.loaded_at, source.rates = str(path), mtime, datetime.utcnow(), len(rates)
+        self.db.flush()
+        if has_foreign_expenses(self.db):
+            for statement in REBUILD_DAILY_TOTALS_SQL:
+                self.db.execute(text(statement))
+            BudgetService(self.db).recalculate()
+            AnomalyService(self.db).rebuild()
+        self.db.commit()
+        rate_cache(self.db).clear()
+        return len(rates)
+
+    def get_currencies(self) -> Dict:
+        """The base currency and every currency with rates, with its latest rate."""
+        latest = (
+            self.db.query(ExchangeRate.currency, func.min(ExchangeRate.day), func.max(ExchangeRate.day), func.count())
+            .group_by(ExchangeRate.currency)
+            .all()
+        )
+        source = self.db.get(ExchangeRateSource, 1)
+        currencies = []
+        for currency, first_day, last_day, count in latest:
+            rate = self.db.get(ExchangeRate, (currency, last_day)).rate
+            currencies.append({
+                "currency": currency,
+                "rate": rate,
+                "from": (EPOCH + timedelta(days=first_day)).isoformat(),
+                "latest": (EPOCH + timedelta(days=last_day)).isoformat(),
+                "rates": count,
+            })
+        return {
+            "base": settings["base"],
+            "source": source.path if source else None,
+            "loadedAt": source.loaded_at.isoformat() if source else None,
+            "currencies": currencies,
+        }
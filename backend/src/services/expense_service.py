@@ -1,9 +1,113 @@
+from sqlalchemy import insert, tuple_
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Union
 from datetime import datetime
+from ..models.budget import BudgetAlert
 from ..models.expense import ExpenseCreate, Expense
-from ..db.models import Expense as ExpenseModel, Category as CategoryModel
+from ..db.models import DailyTotal, Expense as ExpenseModel, Category as CategoryModel
 from ..models.category import UNCATEGORIZED
+from .anomaly_service import AnomalyService
+from .budget_service import BudgetService
+from .currency_service import is_known_currency, normalize_currency, to_base
+from .fingerprints import claim_fingerprints, expense_fingerprint
+from .forecast_service import schedule_forecast
+from .range_index import epoch_day
+from .sync_service import current_version
+from ..utils.columnar import to_columns
+from ..core.events import broker, data_version, topic_for
+from ..core.scheduler import scheduler
+
+# Fields that can be selected for list responses, with their column encoding (see utils/columnar.py)
+EXPENSE_FIELDS = {
+    "id": "int32",
+    "amount": "float64",
+    "description": "string",
+    "date": "datetime",
+    "category_id": "dictionary",
+    "receipt_path": "string",
+    "currency": "dictionary",
+    "anomaly_score": "float64",
+    "is_anomaly": "bool",
+}
+
+def _deltas(changes) -> Dict:
+    deltas: Dict = {}
+    for category_id, day, amount, sign in changes:
+        key = (category_id or 0, day)
+        delta = deltas.setdefault(key, {"categoryId": category_id, "date": day.isoformat(), "amount": 0.0, "count": 0})
+        delta["amount"] = round(delta["amount"] + amount, 2)
+        delta["count"] += sign
+    return deltas
+
+def _day_totals(db: Session, keys) -> Dict:
+    """Current ``daily_totals`` rows for (category id, day) keys, in one query."""
+    keys = {(category_id, epoch_day(day)) for category_id, day in keys}
+    rows = db.query(DailyTotal).filter(tuple_(DailyTotal.category_id, DailyTotal.day).in_(list(keys))).all()
+    return {(row.category_id, row.day): row for row in rows}
+
+def _versions(db: Session) -> Dict:
+    return {
+        "dataVersion": data_version(db.get_bind()),
+        # For GET /api/sync?since= after a refresh or overflow
+        "syncVersion": current_version(db.connection()),
+    }
+
+def _change_event(db: Session, expense: Dict, changes, alerts, day_totals=None, versions=None) -> Dict:
+    """Delta for ``/api/events``: the expense, the day totals it moved and their new values."""
+    deltas = _deltas(changes)
+    if day_totals is None:
+        day_totals = _day_totals(db, deltas)
+    totals = []
+    for (category_id, day), delta in deltas.items():
+        total = day_totals.get((category_id, epoch_day(day)))
+        totals.append({
+            "categoryId": delta["categoryId"],
+            "date": delta["date"],
+            "amount": round(total.amount, 2) if total else 0.0,
+            "count": total.count if total else 0,
+        })
+    return {
+        "expense": expense,
+        "deltas": [delta for delta in deltas.values() if delta["amount"] or delta["count"]],
+        "totals": totals,
+        "budgetAlerts": [BudgetAlert.from_orm(alert).model_dump(mode="json") for alert in alerts],
+        **(versions or _versions(db)),
+    }
+
+def _written(db: Session, event_type: str, expense: Dict, changes, alerts):
+    """Start the background work that follows a committed expense write and tell event subscribers."""
+    schedule_forecast(db)
+    scheduler.notify_write()
+    if broker.running:
+        broker.publish(topic_for(db.get_bind()), event_type, _change_event(db, expense, changes, alerts))
+
+def _created_batch(db: Session, expenses: List[Expense], changes, alerts):
+    """``_written`` for expenses committed together, reading totals and versions once."""
+    schedule_forecast(db)
+    scheduler.notify_write()
+    if not broker.running:
+        return
+    day_totals = _day_totals(db, _deltas(changes))
+    versions = _versions(db)
+    topic = topic_for(db.get_bind())
+    for index, (expense, change) in enumerate(zip(expenses, changes)):
+        # Threshold crossings belong to the batch as a whole; they go out with its last event
+        event = _change_event(db, expense.model_dump(mode="json"), [change],
+                              alerts if index == len(expenses) - 1 else [], day_totals, versions)
+        broker.publish(topic, "expense.created", event)
+
+def _spend(db: Session, expense: ExpenseModel, sign: int = 1):
+    """The budget counter change for one expense row, in the base currency, with +1 or -1 for adding or removing it."""
+    day = expense.date.date()
+    return (expense.category_id, day, sign * to_base(db, expense.amount, expense.currency, day), sign)
+
+def _fingerprint(expense: ExpenseModel) -> int:
+    return expense_fingerprint(expense.date, expense.amount, expense.description, expense.currency)
+
+def _currency(db: Session, currency: Optional[str]) -> Optional[str]:
+    if not is_known_currency(db, currency):
+        raise ValueError(f"No exchange rates for currency {currency.upper()}")
+    return normalize_currency(currency)
 
 class ExpenseService:
     def __init__(self, db: Session):
@@ -22,35 +126,127 @@ class ExpenseService:
             description=expense.description,
             date=expense.date,
             category_id=expense.category_id,
-            receipt_path=expense.receipt_path
+            receipt_path=expense.receipt_path,
+            currency=_currency(self.db, expense.currency),
         )
         self.db.add(db_expense)
+        # Anomaly statistics and budget counters change in the same transaction as the expense
+        change = _spend(self.db, db_expense)
+        AnomalyService(self.db).observe(db_expense, change[2])
+        self.db.flush()
+        claim_fingerprints(self.db.connection(), [(db_expense.id, _fingerprint(db_expense))])
+        changes = [change]
+        alerts = BudgetService(self.db).apply_changes(changes)
         self.db.commit()
         self.db.refresh(db_expense)
-        return Expense.from_orm(db_expense)
+        created = Expense.from_orm(db_expense)
+        _written(self.db, "expense.created", created.model_dump(mode="json"), changes, alerts)
+        return created
+
+    def create_expenses(self, expenses: Sequence[ExpenseCreate]) -> List[Union[Expense, ValueError]]:
+        """Insert several expenses in one transaction, with one INSERT ... RETURNING (see write_queue.py).
+
+        Returns, in order, each created expense or the ValueError that rejected it.
+        """
+        uncategorized = None
+        anomalies = AnomalyService(self.db)
+        results: List[Union[ExpenseModel, ValueError]] = []
+        changes = []
+        for expense in expenses:
+            try:
+                category_id = expense.category_id
+                if not category_id:
+                    if uncategorized is None:
+                        uncategorized = self.db.query(CategoryModel.id).filter(CategoryModel.name == UNCATEGORIZED).scalar()
+                        if uncategorized is None:
+                            raise ValueError("Uncategorized category not found")
+                    category_id = uncategorized
+                row = ExpenseModel(
+                    amount=expense.amount,
+                    description=expense.description,
+                    date=expense.date,
+                    category_id=category_id,
+                    receipt_path=expense.receipt_path,
+                    currency=_currency(self.db, expense.currency),
+                )
+            except ValueError as e:
+                results.append(e)
+                continue
+            # Scored in submission order, as if each had been created on its own
+            change = _spend(self.db, row)
+            anomalies.observe(row, change[2])
+            changes.append(change)
+            results.append(row)
+
+        rows = [row for row in results if isinstance(row, ExpenseModel)]
+        if not rows:
+            return results
+        columns = ("amount", "description", "date", "category_id", "receipt_path", "currency", "anomaly_score", "is_anomaly")
+        inserted = self.db.scalars(
+            insert(ExpenseModel).returning(ExpenseModel, sort_by_parameter_order=True),
+            [{column: getattr(row, column) for column in columns} for row in rows],
+        ).all()
+        claim_fingerprints(self.db.connection(), [(row.id, _fingerprint(row)) for row in inserted])
+        alerts = BudgetService(self.db).apply_changes(changes)
+        # Built before the commit expires the rows, so no SELECT is needed to read them back
+        created = iter([Expense.from_orm(row) for row in inserted])
+        results = [next(created) if isinstance(result, ExpenseModel) else result for result in results]
+        self.db.commit()
+
+        _created_batch(self.db, [result for result in results if isinstance(result, Expense)], changes, alerts)
+        return results
 
     def get_expenses(self, skip: int = 0, limit: int = 100) -> List[Expense]:
         expenses = self.db.query(ExpenseModel).offset(skip).limit(limit).all()
         return [Expense.from_orm(expense) for expense in expenses]
 
+    def get_expense_columns(self, fields: Sequence[str], skip: int = 0, limit: int = 100) -> Dict[str, list]:
+        """Only the requested columns, selected in SQL, as one list per field."""
+        rows = self.db.query(*(getattr(ExpenseModel, field) for field in fields)).offset(skip).limit(limit).all()
+        return to_columns(rows, fields)
+
     def get_expense(self, expense_id: int) -> Optional[Expense]:
         expense = self.db.query(ExpenseModel).filter(ExpenseModel.id == expense_id).first()
         return Expense.from_orm(expense) if expense else None
 
     def update_expense(self, expense_id: int, expense: ExpenseCreate) -> Optional[Expense]:
-        db_expense = self.get_expense(expense_id)
+        db_expense = self.db.query(ExpenseModel).filter(ExpenseModel.id == expense_id).first()
         if db_expense:
-            for key, value in expense.dict(exclude_unset=True).items():
+            values = expense.dict(exclude_unset=True)
+            if "currency" in values:
+                values["currency"] = _currency(self.db, values["currency"])
+            before = _spend(self.db, db_expense, -1)
+            anomalies = AnomalyService(self.db)
+            anomalies.forget(db_expense.category_id, -before[2])
+            fingerprint = _fingerprint(db_expense)
+            for key, value in values.items():
                 setattr(db_expense, key, value)
+            after = _spend(self.db, db_expense)
+            anomalies.observe(db_expense, after[2])
+            refingerprint = _fingerprint(db_expense) != fingerprint
+            if refingerprint:
+                db_expense.fingerprint = None
+            self.db.flush()
+            if refingerprint:
+                claim_fingerprints(self.db.connection(), [(db_expense.id, _fingerprint(db_expense))])
+            changes = [before, after]
+            alerts = BudgetService(self.db).apply_changes(changes)
             self.db.commit()
             self.db.refresh(db_expense)
-            return db_expense
+            updated = Expense.from_orm(db_expense)
+            _written(self.db, "expense.updated", updated.model_dump(mode="json"), changes, alerts)
+            return updated
         return None
 
     def delete_expense(self, expense_id: int) -> bool:
         expense = self.db.query(ExpenseModel).filter(ExpenseModel.id == expense_id).first()
         if expense:
+            change = _spend(self.db, expense, -1)
+            AnomalyService(self.db).forget(expense.category_id, -change[2])
             self.db.delete(expense)
+            self.db.flush()
+            alerts = BudgetService(self.db).apply_changes([change])
             self.db.commit()
+            _written(self.db, "expense.deleted", {"id": expense_id}, [change], alerts)
             return True
         return False 
\ No newline at end of file
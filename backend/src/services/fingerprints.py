@@ -0,0 +1,107 @@
+"""Expense fingerprints for duplicate detection.
+
+A fingerprint is a signed 64-bit BLAKE2b hash of an expense's day, amount in
+cents, description (case-folded, whitespace collapsed) and currency. The
+first expense with a given fingerprint holds it; later identical ones
+(entered twice by hand, or imported with ``on_duplicate=keep``) have NULL.
+The unique index on ``expenses.fingerprint`` then answers "is this already
+here?" with one probe, and a chunk of imported rows with one ``IN`` query.
+
+Writers claim fingerprints after inserting, inside their write transaction,
+so two identical concurrent writes never both hold one and never fail on
+the unique index. A few rows are claimed one ``CLAIM_FINGERPRINT_SQL`` at a
+time; larger sets (imports, backfills) are staged in a temporary table and
+claimed with one ``CLAIM_STAGED_FINGERPRINTS_SQL``, where the lowest id of
+each fingerprint wins. Bulk loads, which hold the write lock throughout,
+insert rows with their fingerprint already decided (``held_fingerprints``).
+"""
+import hashlib
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+CLAIM_FINGERPRINT_SQL = (
+    "UPDATE expenses SET fingerprint = ? WHERE id = ? "
+    "AND NOT EXISTS (SELECT 1 FROM expenses WHERE fingerprint = ?)"
+)
+
+CREATE_STAGED_FINGERPRINTS_SQL = (
+    "CREATE TEMP TABLE IF NOT EXISTS staged_fingerprints (id INTEGER NOT NULL, fingerprint INTEGER NOT NULL)"
+)
+STAGE_FINGERPRINT_SQL = "INSERT INTO temp.staged_fingerprints (id, fingerprint) VALUES (?, ?)"
+CLAIM_STAGED_FINGERPRINTS_SQL = """
+    UPDATE expenses SET fingerprint = claims.fingerprint
+    FROM (SELECT MIN(id) AS id, fingerprint FROM temp.staged_fingerprints GROUP BY fingerprint) AS claims
+    WHERE expenses.id = claims.id
+        AND NOT EXISTS (SELECT 1 FROM expenses held WHERE held.fingerprint = claims.fingerprint)"""
+HELD_STAGED_FINGERPRINTS_SQL = (
+    "SELECT staged.fingerprint FROM temp.staged_fingerprints staged "
+    "JOIN expenses ON expenses.fingerprint = staged.fingerprint"
+)
+
+# Below this many rows, claiming one at a time beats staging them
+STAGED_CLAIM_MIN_ROWS = 32
+
+def normalize_description(description: Optional[str]) -> str:
+    return " ".join((description or "").split()).casefold()
+
+def _fingerprint(day, amount: float, normalized: str, currency: Optional[str]) -> int:
+    key = f"{str(day)[:10]}|{round(amount * 100)}|{normalized}|{currency or ''}"
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big", signed=True)
+
+def expense_fingerprint(day, amount: float, description: Optional[str], currency: Optional[str] = None) -> int:
+    """Fingerprint of an expense; ``day`` may be a date, a datetime or their stored text."""
+    return _fingerprint(day, amount, normalize_description(description), currency)
+
+def expense_fingerprints(days: Sequence, amounts: Sequence[float], descriptions: Sequence[Optional[str]],
+                         currencies: Optional[Sequence[Optional[str]]] = None) -> List[int]:
+    """``expense_fingerprint`` of many expenses, normalizing each distinct description once."""
+    normalized = {description: normalize_description(description) for description in set(descriptions)}
+    if currencies is None:
+        currencies = [None] * len(days)
+    return [
+        _fingerprint(day, amount, normalized[description], currency)
+        for day, amount, description, currency in zip(days, amounts, descriptions, currencies)
+    ]
+
+def _stage(cursor, rows: Iterable[Tuple[int, int]]):
+    cursor.execute(CREATE_STAGED_FINGERPRINTS_SQL)
+    cursor.execute("DELETE FROM temp.staged_fingerprints")
+    cursor.executemany(STAGE_FINGERPRINT_SQL, rows)
+
+def held_fingerprints(cursor, fingerprints: Iterable[int]) -> Set[int]:
+    """Those of ``fingerprints`` that an expense already holds, found with one join on a DB-API cursor."""
+    _stage(cursor, ((0, fingerprint) for fingerprint in fingerprints))
+    held = {fingerprint for (fingerprint,) in cursor.execute(HELD_STAGED_FINGERPRINTS_SQL)}
+    cursor.execute("DELETE FROM temp.staged_fingerprints")
+    return held
+
+def claim_fingerprints(conn, rows: Iterable[Tuple[int, int]]):
+    """Give each (expense id, fingerprint) its fingerprint unless another expense holds it; the caller commits."""
+    rows = list(rows)
+    if len(rows) >= STAGED_CLAIM_MIN_ROWS:
+        cursor = conn.connection.cursor()
+        try:
+            _stage(cursor, rows)
+            cursor.execute(CLAIM_STAGED_FINGERPRINTS_SQL)
+            cursor.execute("DELETE FROM temp.staged_fingerprints")
+        finally:
+            cursor.close()
+    elif rows:
+        conn.exec_driver_sql(CLAIM_FINGERPRINT_SQL, [
+            (fingerprint, expense_id, fingerprint) for expense_id, fingerprint in rows
+        ])
+
+def backfill_fingerprints(conn, chunk_size: int = 10000) -> int:
+    """Fingerprint expenses written without one (migrations, old bulk loads); returns how many were checked."""
+    checked = last_id = 0
+    while True:
+        rows = conn.exec_driver_sql(
+            "SELECT id, date, amount, description, currency FROM expenses "
+            "WHERE fingerprint IS NULL AND id > ? ORDER BY id LIMIT ?",
+            (last_id, chunk_size),
+        ).all()
+        if not rows:
+            return checked
+        ids, days, amounts, descriptions, currencies = zip(*rows)
+        claim_fingerprints(conn, zip(ids, expense_fingerprints(days, amounts, descriptions, currencies)))
+        checked += len(rows)
+        last_id = ids[-1]
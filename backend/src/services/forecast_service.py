@@ -0,0 +1,188 @@
+"""Per-category spend forecasts, fitted in the background after writes.
+
+For every category the complete months of history form one row of a
+``categories x months`` matrix built from ``daily_totals``. Seasonal indexes
+(one multiplier per calendar month, like ``SEASONAL_FACTORS`` in the mock
+data generator) come from the ratio of each month to a least-squares linear
+trend, once there are two years of history. A second least-squares fit on
+the deseasonalized totals gives the trend that is projected forward and
+re-seasonalized. Both fits run for all categories at once, since
+``lstsq`` accepts one right-hand side per category.
+
+Fitting never happens while serving a request. Expense writes touch a
+``Debouncer`` for their database; once writes have been quiet for
+``FORECAST_DEBOUNCE_SECONDS`` the forecasts are refitted (in a process pool
+when ``FORECAST_PROCESSES`` is set, which lets many tenants refit in
+parallel) and stored as JSON in ``forecast_results``, which the endpoint
+returns as is.
+"""
+import calendar
+import json
+import os
+import sqlite3
+from datetime import date, datetime
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+from ..core.background import Debouncer
+from ..core.cache import database_path
+from ..core.events import broker
+from ..db.database import BUSY_TIMEOUT
+from ..db.models import ForecastResult
+from ..utils.lazy import lazy_import
+from .range_index import epoch_day
+
+np = lazy_import("numpy")
+
+settings = {
+    "debounce_seconds": float(os.getenv("FORECAST_DEBOUNCE_SECONDS", "5")),
+    "processes": int(os.getenv("FORECAST_PROCESSES", "0")),
+    "horizon": int(os.getenv("FORECAST_MONTHS", "3")),
+}
+
+MIN_SEASONAL_MONTHS = 24
+MIN_TREND_MONTHS = 6
+
+def month_number(value: date) -> int:
+    """Months since January 1970."""
+    return (value.year - 1970) * 12 + value.month - 1
+
+def month_label(number: int) -> str:
+    return f"{1970 + number // 12:04d}-{number % 12 + 1:02d}"
+
+def fit_seasonal(totals, first_month: int, steps: int):
+    """Forecast the ``steps`` months after the history in ``totals`` (categories x months).
+
+    Returns the forecasts (categories x steps), the seasonal indexes
+    (categories x 12, January first) and the monthly trend slope per category.
+    """
+    categories, months = totals.shape
+    if months == 0:
+        return np.zeros((categories, steps)), np.ones((categories, 12)), np.zeros(categories)
+
+    t = np.arange(months)
+    design = np.column_stack([np.ones(months), t])
+    calendar_month = (first_month + t) % 12
+
+    seasonal = np.ones((categories, 12))
+    if months >= MIN_SEASONAL_MONTHS:
+        trend = (design @ np.linalg.lstsq(design, totals.T, rcond=None)[0]).T
+        ratios = np.divide(totals, trend, out=np.ones_like(totals), where=trend > 0)
+        one_hot = np.eye(12)[calendar_month]
+        seasonal = (ratios @ one_hot) / one_hot.sum(axis=0)
+        means = seasonal.mean(axis=1, keepdims=True)
+        seasonal = np.divide(seasonal, means, out=np.ones_like(seasonal), where=means > 0)
+        seasonal = np.where(seasonal > 0, seasonal, 1.0)
+
+    adjusted = totals / seasonal[:, calendar_month]
+    if months >= MIN_TREND_MONTHS:
+        intercept, slope = np.linalg.lstsq(design, adjusted.T, rcond=None)[0]
+    else:
+        # Too short for a trend: a flat level at the average
+        intercept, slope = adjusted.mean(axis=1), np.zeros(categories)
+
+    future = np.arange(months, months + steps)
+    level = np.clip(intercept[:, None] + slope[:, None] * future, 0, None)
+    return level * seasonal[:, (first_month + future) % 12], seasonal, slope
+
+def build_forecasts(category_ids, days, amounts, names: Dict[int, str], today: date, horizon: int) -> Dict:
+    """Forecast payload from ``daily_totals`` columns."""
+    category_ids = np.asarray(category_ids, dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    current = month_number(today)
+    months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+    ids, rows = np.unique(category_ids, return_inverse=True)
+    history = months < current
+    first_month = int(months[history].min()) if history.any() else current
+    totals = np.zeros((len(ids), current - first_month))
+    np.add.at(totals, (rows[history], months[history] - first_month), amounts[history])
+    this_month = (months == current) & (days <= epoch_day(today))
+    month_to_date = np.bincount(rows[this_month], weights=amounts[this_month], minlength=len(ids))
+
+    forecasts, seasonal, slope = fit_seasonal(totals, first_month, horizon + 1)
+    # Expected spend for the rest of this month, added to what is already spent
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    remaining = 1 - today.day / days_in_month
+    projected = month_to_date + forecasts[:, 0] * remaining
+
+    categories = []
+    for index, category_id in enumerate(ids.tolist()):
+        categories.append({
+            "categoryId": category_id or None,
+            "category": names.get(category_id, "Uncategorized"),
+            "monthToDate": round(float(month_to_date[index]), 2),
+            "forecast": round(float(forecasts[index, 0]), 2),
+            "projectedMonthEnd": round(float(projected[index]), 2),
+            "trendPerMonth": round(float(slope[index]), 2),
+            "seasonalIndex": round(float(seasonal[index, today.month - 1]), 3),
+            "nextMonths": [
+                {"month": month_label(current + step), "forecast": round(float(forecasts[index, step]), 2)}
+                for step in range(1, horizon + 1)
+            ],
+        })
+    categories.sort(key=lambda item: -item["projectedMonthEnd"])
+    return {
+        "month": month_label(current),
+        "historyMonths": current - first_month,
+        "total": {
+            "monthToDate": round(float(month_to_date.sum()), 2),
+            "forecast": round(float(forecasts[:, 0].sum()), 2),
+            "projectedMonthEnd": round(float(projected.sum()), 2),
+            "nextMonths": [
+                {"month": month_label(current + step), "forecast": round(float(forecasts[:, step].sum()), 2)}
+                for step in range(1, horizon + 1)
+            ],
+        },
+        "categories": categories,
+    }
+
+def refresh_forecasts(path: str, today: Optional[date] = None):
+    """Refit the forecasts of the database at ``path`` and store them; runs in worker processes too."""
+    today = today or date.today()
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    try:
+        rows = conn.execute("SELECT category_id, day, amount FROM daily_totals WHERE count != 0").fetchall()
+        names = dict(conn.execute("SELECT id, name FROM categories").fetchall())
+        payload = build_forecasts(*(list(zip(*rows)) or [(), (), ()]), names, today, settings["horizon"])
+        payload["computedAt"] = datetime.now().isoformat(timespec="seconds")
+        with conn:
+            conn.execute(
+                "INSERT INTO forecast_results (id, month, computed_at, payload) VALUES (1, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET month = excluded.month, computed_at = excluded.computed_at, "
+                "payload = excluded.payload",
+                (payload["month"], str(datetime.now()), json.dumps(payload)),
+            )
+    finally:
+        conn.close()
+
+# Keys are database paths, which are also the event topics
+forecaster = Debouncer("forecast", refresh_forecasts, settings["debounce_seconds"], settings["processes"],
+                       done=broker.committed)
+
+def schedule_forecast(db: Session, delay: Optional[float] = None):
+    """Refit the forecasts of ``db``'s database once writes to it settle."""
+    path = database_path(db.get_bind())
+    if path is not None:
+        forecaster.touch(path, delay)
+
+class ForecastService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_forecast(self) -> Dict:
+        """The stored forecasts; never fits a model in the request."""
+        result = self.db.get(ForecastResult, 1)
+        path = database_path(self.db.get_bind())
+        current = month_label(month_number(date.today()))
+        if result is None or result.month != current:
+            # Nothing yet, or made last month: fit now in the background and serve what there is
+            if not forecaster.pending(path):
+                schedule_forecast(self.db, delay=0)
+            if result is None:
+                return {"month": current, "status": "pending", "categories": []}
+
+        payload = json.loads(result.payload)
+        payload["status"] = "ready" if result.month == current else "stale"
+        payload["refreshing"] = forecaster.pending(path)
+        return payload
@@ -0,0 +1,214 @@
+"""Export and re-import of expenses and categories, with duplicate detection.
+
+The payload is the legacy backend's export format: categories by name, and
+expenses with their category's name, so exports of either backend (and
+converted bank statements) can be imported. Expenses that already exist are
+recognised by fingerprint (see fingerprints.py): first within the payload
+with an in-memory map, then against the database with one ``IN`` query per
+chunk of ``IMPORT_CHUNK_SIZE`` fingerprints. ``on_duplicate`` decides what
+happens to them:
+
+* ``skip``: leave the existing expense alone (the default).
+* ``update``: overwrite the existing expense's category, description and
+  receipt with the imported ones (the fields a fingerprint ignores).
+* ``keep``: import them anyway, as additional expenses.
+
+Rows are inserted in bulk; budget counters and anomaly statistics of the
+affected categories are rebuilt once afterwards.
+"""
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+from ..core.events import broker, data_version, topic_for
+from ..core.scheduler import scheduler
+from ..db.models import Category as CategoryModel, Expense as ExpenseModel
+from ..models.category import UNCATEGORIZED
+from .anomaly_service import AnomalyService
+from .budget_service import BudgetService
+from .currency_service import is_known_currency, normalize_currency
+from .fingerprints import claim_fingerprints, expense_fingerprint
+from .forecast_service import schedule_forecast
+from .sync_service import current_version
+
+ON_DUPLICATE = ("skip", "update", "keep")
+
+settings = {
+    "chunk_size": int(os.getenv("IMPORT_CHUNK_SIZE", "500")),
+}
+
+def _parse_expense(record, index: int, category_id) -> Dict:
+    if not isinstance(record, dict):
+        raise ValueError(f"expenses[{index}]: expected an object")
+    try:
+        amount = float(record["amount"])
+        day = datetime.fromisoformat(str(record["date"]))
+    except KeyError as e:
+        raise ValueError(f"expenses[{index}]: missing {e.args[0]}")
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"expenses[{index}]: {e}")
+    return {
+        "amount": amount,
+        "description": record.get("description"),
+        "date": day,
+        "category_id": category_id(record, index),
+        "receipt_path": record.get("receipt_path"),
+        "currency": record.get("currency"),
+    }
+
+class ImportService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def export_data(self) -> Dict:
+        categories = self.db.query(CategoryModel).order_by(CategoryModel.id).all()
+        names = {category.id: category.name for category in categories}
+        rows = self.db.query(
+            ExpenseModel.id, ExpenseModel.amount, ExpenseModel.category_id, ExpenseModel.description,
+            ExpenseModel.date, ExpenseModel.currency, ExpenseModel.receipt_path,
+        ).order_by(ExpenseModel.id).all()
+        return {
+            "expenses": [{
+                "id": row.id,
+                "amount": row.amount,
+                "category": names.get(row.category_id),
+                "description": row.description,
+                "date": row.date.isoformat() if row.date else None,
+                "currency": row.currency,
+                "receipt_path": row.receipt_path,
+            } for row in rows],
+            "categories": [
+                {"id": category.id, "name": category.name, "description": category.description}
+                for category in categories
+            ],
+        }
+
+    def _categories(self, records: List, created: List[str]):
+        """Category id lookup by name, creating the imported categories that do not exist yet."""
+        ids = dict(self.db.query(CategoryModel.name, CategoryModel.id))
+
+        def get_or_create(name: str, description: Optional[str] = None) -> int:
+            if name not in ids:
+                category = CategoryModel(name=name, description=description)
+                self.db.add(category)
+                self.db.flush()
+                ids[name] = category.id
+                created.append(name)
+            return ids[name]
+
+        for index, record in enumerate(records):
+            name = (record.get("name") or "").strip() if isinstance(record, dict) else ""
+            if not name:
+                raise ValueError(f"categories[{index}]: missing name")
+            get_or_create(name, record.get("description"))
+
+        known_ids = set(ids.values())
+
+        def category_id(record: Dict, index: int) -> int:
+            if record.get("category_id") is not None:
+                if record["category_id"] not in known_ids:
+                    raise ValueError(f"expenses[{index}]: unknown category_id {record['category_id']}")
+                return record["category_id"]
+            name = (record.get("category") or "").strip() or UNCATEGORIZED
+            return get_or_create(name)
+
+        return category_id
+
+    def import_data(self, data: Dict, on_duplicate: str = "skip") -> Dict:
+        """Import a payload in one transaction; returns what happened to its expenses.
+
+        Raises ValueError, importing nothing, when any record is invalid.
+        """
+        if on_duplicate not in ON_DUPLICATE:
+            raise ValueError(f"on_duplicate must be one of {', '.join(ON_DUPLICATE)}")
+        records = data.get("expenses") or []
+        created_categories: List[str] = []
+        category_id = self._categories(data.get("categories") or [], created_categories)
+
+        expenses = []
+        for index, record in enumerate(records):
+            expense = _parse_expense(record, index, category_id)
+            if not is_known_currency(self.db, expense["currency"]):
+                raise ValueError(f"expenses[{index}]: no exchange rates for currency {expense['currency'].upper()}")
+            expense["currency"] = normalize_currency(expense["currency"])
+            expense["fingerprint"] = expense_fingerprint(
+                expense["date"], expense["amount"], expense["description"], expense["currency"]
+            )
+            expenses.append(expense)
+
+        # Within the payload: the first of identical records stands for the others
+        unique: Dict[int, Dict] = {}
+        repeated = []
+        for expense in expenses:
+            first = unique.setdefault(expense["fingerprint"], expense)
+            if first is not expense:
+                repeated.append(expense)
+                if on_duplicate == "update":
+                    first.update(category_id=expense["category_id"], description=expense["description"],
+                                 receipt_path=expense["receipt_path"])
+
+        # Against the database, one IN query per chunk of fingerprints
+        existing: Dict[int, ExpenseModel] = {}
+        fingerprints = list(unique)
+        for start in range(0, len(fingerprints), settings["chunk_size"]):
+            chunk = fingerprints[start:start + settings["chunk_size"]]
+            for row in self.db.query(ExpenseModel).filter(ExpenseModel.fingerprint.in_(chunk)):
+                existing[row.fingerprint] = row
+
+        inserts = [expense for fingerprint, expense in unique.items() if fingerprint not in existing]
+        updates = []
+        affected = set()
+        if on_duplicate == "keep":
+            inserts += repeated + [unique[fingerprint] for fingerprint in existing]
+        elif on_duplicate == "update":
+            for fingerprint, row in existing.items():
+                expense = unique[fingerprint]
+                changed = {
+                    key: expense[key] for key in ("category_id", "description", "receipt_path")
+                    if expense[key] != getattr(row, key)
+                }
+                if changed:
+                    updates.append({"id": row.id, **changed})
+                    affected.update((row.category_id, expense["category_id"]))
+        affected.update(expense["category_id"] for expense in inserts)
+
+        columns = ("amount", "description", "date", "category_id", "receipt_path", "currency")
+        if inserts:
+            ids = self.db.scalars(
+                insert(ExpenseModel).returning(ExpenseModel.id, sort_by_parameter_order=True),
+                [{column: expense[column] for column in columns} for expense in inserts],
+            ).all()
+            # Repeats kept on purpose stay without a fingerprint; the claim leaves them NULL
+            claim_fingerprints(self.db.connection(), [
+                (expense_id, expense["fingerprint"]) for expense_id, expense in zip(ids, inserts)
+            ])
+        if updates:
+            self.db.execute(update(ExpenseModel), updates)
+        if inserts or updates:
+            AnomalyService(self.db).rebuild(affected)
+            BudgetService(self.db).recalculate(affected)
+        self.db.commit()
+
+        if inserts or updates or created_categories:
+            schedule_forecast(self.db)
+            scheduler.notify_write()
+            if broker.running:
+                # Too many totals move to describe as deltas; clients refetch
+                broker.publish(topic_for(self.db.get_bind()), "expenses.imported", {
+                    "inserted": len(inserts),
+                    "updated": len(updates),
+                    "refetch": True,
+                    "dataVersion": data_version(self.db.get_bind()),
+                    "syncVersion": current_version(self.db.connection()),
+                })
+        return {
+            "onDuplicate": on_duplicate,
+            "received": len(records),
+            "inserted": len(inserts),
+            "updated": len(updates),
+            # Duplicates left alone (or merged into another record of the payload)
+            "skipped": len(records) - len(inserts) - len(updates),
+            "duplicates": {"inPayload": len(repeated), "inDatabase": len(existing)},
+            "categoriesCreated": created_categories,
+        }
@@ -0,0 +1,60 @@
+import re
+import uuid
+from sqlalchemy.orm import Session
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from ..models.expense import ExpenseCreate
+from ..utils.lazy import is_available, lazy_import
+
+# OCR libraries are heavy and optional; they are only imported when a receipt is scanned
+Image = lazy_import("PIL.Image")
+ImageOps = lazy_import("PIL.ImageOps")
+pytesseract = lazy_import("pytesseract")
+
+RECEIPTS_DIR = Path("receipts")
+
+TOTAL_PATTERN = re.compile(r"(?:total|amount due|balance due)[^\d\n]{0,20}(\d+[.,]\d{2})", re.IGNORECASE)
+
+def ocr_available() -> bool:
+    return is_available("pytesseract") and is_available("PIL")
+
+def extract_total(image_path: Path) -> Optional[float]:
+    """Read the receipt total with Tesseract, or None if it can't be found."""
+    if not ocr_available():
+        return None
+    try:
+        image = ImageOps.grayscale(Image.open(image_path))
+        text = pytesseract.image_to_string(image)
+    except Exception:  # Missing tesseract binary or unreadable image; OCR is best effort
+        return None
+    totals = [float(value.replace(",", ".")) for value in TOTAL_PATTERN.findall(text)]
+    return max(totals) if totals else None
+
+class ReceiptService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    async def save_receipt(self, file_content: bytes, filename: str) -> dict:
+        """Store an uploaded receipt image and return its location."""
+        RECEIPTS_DIR.mkdir(exist_ok=True)
+        extension = Path(filename or "").suffix.lower() or ".png"
+        # The random suffix keeps uploads made in the same second apart
+        stored_name = f"receipt_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:12]}{extension}"
+        receipt_path = RECEIPTS_DIR / stored_name
+        receipt_path.write_bytes(file_content)
+        return {
+            "filename": stored_name,
+            "receipt_path": str(receipt_path),
+        }
+
+    async def process_receipt(self, file_content: bytes, filename: str) -> ExpenseCreate:
+        """Save the receipt and build an expense from it, using OCR for the amount when available."""
+        saved = await self.save_receipt(file_content, filename)
+        amount = await run_in_threadpool(extract_total, Path(saved["receipt_path"]))
+        return ExpenseCreate(
+            amount=amount or 0.0,
+            description=f"Receipt {filename}" if filename else "Scanned receipt",
+            receipt_path=saved["receipt_path"],
+        )
@@ -0,0 +1,311 @@
+"""Recurring charge detection over the full expense history.
+
+Expenses are grouped by normalized description and amount band (amounts
+within about 10% of each other share a band). Within each group the gaps
+between consecutive charges are classified against the known cadences with
+one ``searchsorted`` over all gaps at once, and a per-group histogram of
+cadences (a single ``bincount``) picks the dominant one. Groups where most
+gaps match one cadence are recurring; stable amounts that are still being
+charged are flagged as subscriptions.
+
+Each process keeps the loaded columns and per-group results for every
+database. When only new expenses were added since the last request, just
+those rows are read and only the groups they touch are re-evaluated.
+Anything else (edits, deletes) triggers a full rebuild, detected from a
+cheap signature over ``daily_totals``; new rows advance it by their
+base-currency amounts, as the triggers do. Description-only edits don't
+change that signature and are picked up by the periodic full rebuild.
+"""
+import os
+import re
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from ..core.cache import watcher_for
+from ..db.models import Category as CategoryModel, base_amount_sql
+from ..utils.lazy import lazy_import
+from ..utils.periods import shift_months
+from .range_index import EPOCH
+
+np = lazy_import("numpy")
+
+settings = {
+    "rebuild_seconds": float(os.getenv("RECURRING_REBUILD_SECONDS", "3600")),
+}
+
+# name, nominal days, shortest and longest gap accepted, months (for calendar cadences)
+CADENCES = (
+    ("weekly", 7, 6, 8, None),
+    ("biweekly", 14, 13, 15, None),
+    ("monthly", 30, 27, 33, 1),
+    ("quarterly", 91, 85, 97, 3),
+    ("annual", 365, 355, 375, 12),
+)
+# Gap g falls inside cadence i when searchsorted(EDGES, g, "right") == 2 * i + 1
+CADENCE_EDGES = [bound for _, _, low, high, _ in CADENCES for bound in (low, high + 1)]
+
+MIN_OCCURRENCES = 3
+MIN_REGULARITY = 0.7  # Share of gaps that have to match the dominant cadence
+SUBSCRIPTION_VARIATION = 0.05  # Largest relative spread of amounts for a subscription
+
+_NON_LETTERS = re.compile(r"[^a-z]+")
+_BAND_BITS = 12
+
+def normalize_description(description: Optional[str]) -> str:
+    """Lowercase letters only, so "Netflix #1234" and "NETFLIX" group together."""
+    return " ".join(_NON_LETTERS.sub(" ", (description or "").lower()).split())
+
+def _bands(amounts):
+    return np.floor(np.log(amounts) / np.log(1.1)).astype(np.int64) + (1 << (_BAND_BITS - 1))
+
+def detect(keys, days, amounts) -> Dict[int, Dict]:
+    """Recurring groups among the given rows, keyed by group key.
+
+    Returns history-only statistics; anything relative to today is derived
+    when results are served.
+    """
+    if not len(keys):
+        return {}
+    order = np.lexsort((days, keys))
+    keys, days, amounts = keys[order], days[order], amounts[order]
+
+    group_keys, starts, occurrences = np.unique(keys, return_index=True, return_counts=True)
+    group_of_row = np.repeat(np.arange(len(group_keys)), occurrences)
+
+    same_group = keys[1:] == keys[:-1]
+    gaps = np.diff(days)[same_group]
+    gap_groups = group_of_row[1:][same_group]
+    # Several charges on one day count as one occurrence
+    real = gaps > 0
+    gaps, gap_groups = gaps[real], gap_groups[real]
+    intervals = np.bincount(gap_groups, minlength=len(group_keys))
+
+    slots = np.searchsorted(CADENCE_EDGES, gaps, side="right")
+    matched = slots % 2 == 1
+    cadence_of_gap = slots[matched] // 2
+    histogram = np.bincount(
+        gap_groups[matched] * len(CADENCES) + cadence_of_gap,
+        minlength=len(group_keys) * len(CADENCES),
+    ).reshape(len(group_keys), len(CADENCES))
+    gap_sums = np.bincount(
+        gap_groups[matched] * len(CADENCES) + cadence_of_gap,
+        weights=gaps[matched],
+        minlength=len(group_keys) * len(CADENCES),
+    ).reshape(len(group_keys), len(CADENCES))
+
+    best = histogram.argmax(axis=1)
+    hits = histogram[np.arange(len(group_keys)), best]
+    regularity = hits / np.maximum(intervals, 1)
+    recurring = (hits + 1 >= MIN_OCCURRENCES) & (regularity >= MIN_REGULARITY)
+
+    amount_sums = np.add.reduceat(amounts, starts)
+    amount_min = np.minimum.reduceat(amounts, starts)
+    amount_max = np.maximum.reduceat(amounts, starts)
+    ends = starts + occurrences - 1
+
+    results = {}
+    for group in np.flatnonzero(recurring).tolist():
+        cadence = int(best[group])
+        average = amount_sums[group] / occurrences[group]
+        results[int(group_keys[group])] = {
+            "cadence": cadence,
+            "intervalDays": float(gap_sums[group, cadence] / hits[group]),
+            "occurrences": int(occurrences[group]),
+            "regularity": float(regularity[group]),
+            "averageAmount": float(average),
+            "variation": float((amount_max[group] - amount_min[group]) / average),
+            "firstDay": int(days[starts[group]]),
+            "lastDay": int(days[ends[group]]),
+            "lastAmount": float(amounts[ends[group]]),
+        }
+    return results
+
+class RecurringDetector:
+    """Loaded history and detection results for one database."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.codes: Dict[str, int] = {}
+        self.labels: List[str] = []
+        self.categories: Dict[int, Optional[int]] = {}  # Group key -> category of its latest charge
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.days = np.zeros(0, dtype=np.int64)
+        self.amounts = np.zeros(0)
+        self.results: Dict[int, Dict] = {}
+        self.max_id = 0
+        self.signature: Optional[Tuple[int, float, float]] = None
+        self.version: Optional[int] = None
+        self.built_at = 0.0
+
+    def refresh(self, db: Session, version: Optional[int] = None):
+        """Bring results up to date with the database, incrementally where possible."""
+        fresh = time.monotonic() - self.built_at < settings["rebuild_seconds"]
+        if version is not None and version == self.version and fresh:
+            return
+        signature = _signature(db)
+        if signature == self.signature and fresh:
+            self.version = version
+            return
+        rows = _load(db, self.max_id)
+        if self.signature and fresh and _close(_advance(self.signature, rows), signature):
+            self._append(rows)
+        else:
+            if self.max_id:
+                self._reset()
+                rows = _load(db, 0)
+            self._append(rows)
+            self.results = detect(self.keys, self.days, self.amounts)
+            self.built_at = time.monotonic()
+        self.signature = signature
+        self.version = version
+
+    def _append(self, rows):
+        if not rows:
+            return
+        ids, descriptions, amounts, days, categories, _ = zip(*rows)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        days = np.asarray(days, dtype=np.int64)
+        # Normalizing each distinct description once keeps this cheap on long histories
+        distinct, inverse = np.unique([description or "" for description in descriptions], return_inverse=True)
+        codes = np.asarray([self._code(description) for description in distinct.tolist()], dtype=np.int64)[inverse]
+
+        refunds = amounts <= 0
+        keys = codes << _BAND_BITS | _bands(np.where(refunds, 1.0, amounts))
+        keys, days, amounts = keys[~refunds], days[~refunds], amounts[~refunds]
+        categories = np.asarray(categories, dtype=object)[~refunds]
+        # Rows come in id order, so the last row of each group is its latest charge
+        latest_keys, from_end = np.unique(keys[::-1], return_index=True)
+        self.categories.update(zip(latest_keys.tolist(), categories[len(keys) - 1 - from_end].tolist()))
+
+        self.keys = np.concatenate([self.keys, keys])
+        self.days = np.concatenate([self.days, days])
+        self.amounts = np.concatenate([self.amounts, amounts])
+        self.max_id = max(self.max_id, max(ids))
+
+        if self.built_at:
+            # Only the groups that received new charges can change
+            touched = np.unique(keys)
+            for key in touched.tolist():
+                self.results.pop(key, None)
+            subset = np.isin(self.keys, touched)
+            self.results.update(detect(self.keys[subset], self.days[subset], self.amounts[subset]))
+
+    def _code(self, description: str) -> int:
+        normalized = normalize_description(description)
+        code = self.codes.get(normalized)
+        if code is None:
+            code = self.codes[normalized] = len(self.labels)
+            self.labels.append(description)
+        return code
+
+    def label(self, key: int) -> str:
+        return self.labels[key >> _BAND_BITS]
+
+def _signature(db: Session) -> Tuple[int, float, float]:
+    count, amount, days = db.execute(
+        text("SELECT COALESCE(SUM(count), 0), TOTAL(amount), TOTAL(day * count) FROM daily_totals")
+    ).one()
+    return int(count), float(amount), float(days)
+
+def _advance(signature, rows) -> Tuple[int, float, float]:
+    """The signature after appending ``rows`` to the history ``signature`` describes."""
+    count, amount, days = signature
+    return (
+        count + len(rows),
+        # daily_totals hold base-currency amounts, so foreign charges count converted
+        amount + sum(row[5] for row in rows),
+        days + sum(row[3] for row in rows),
+    )
+
+def _close(left, right) -> bool:
+    return left[0] == right[0] and all(
+        abs(a - b) <= 1e-6 * max(1.0, abs(a), abs(b)) for a, b in zip(left[1:], right[1:])
+    )
+
+def _load(db: Session, after_id: int):
+    return db.execute(
+        text(
+            "SELECT id, description, amount, CAST(julianday(date(date)) - 2440587.5 AS INTEGER), category_id, "
+            f"{base_amount_sql('expenses')} FROM expenses WHERE id > :after_id AND date IS NOT NULL ORDER BY id"
+        ),
+        {"after_id": after_id},
+    ).all()
+
+_detectors: Dict[str, RecurringDetector] = {}
+_registry_lock = threading.Lock()
+
+def detector_for(db: Session) -> RecurringDetector:
+    """The refreshed detector for ``db``'s database; in-memory databases get a fresh one."""
+    watcher = watcher_for(db.get_bind())
+    if watcher is None:
+        detector = RecurringDetector()
+    else:
+        with _registry_lock:
+            detector = _detectors.setdefault(watcher.path, RecurringDetector())
+    with detector.lock:
+        # data_version only moves on commits, so unchanged databases skip even the signature query
+        detector.refresh(db, watcher.poll() if watcher else None)
+    return detector
+
+def _day(epoch_day: int) -> date:
+    return EPOCH + timedelta(days=epoch_day)
+
+class RecurringService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_recurring(self, include_inactive: bool = False, as_of: Optional[date] = None) -> Dict:
+        as_of = as_of or date.today()
+        detector = detector_for(self.db)
+        with detector.lock:
+            results = list(detector.results.items())
+            labels = {key: detector.label(key) for key, _ in results}
+            categories = {key: detector.categories.get(key) for key, _ in results}
+        names = dict(self.db.query(CategoryModel.id, CategoryModel.name).all())
+
+        charges = []
+        for key, result in results:
+            name, nominal, _, high, months = CADENCES[result["cadence"]]
+            last = _day(result["lastDay"])
+            if months:
+                next_charge = shift_months(last, months)
+            else:
+                next_charge = last + timedelta(days=round(result["intervalDays"]))
+            # Still active if the next charge isn't overdue by more than one late payment
+            active = as_of <= next_charge + timedelta(days=high - nominal)
+            if not active and not include_inactive:
+                continue
+            subscription = active and result["variation"] <= SUBSCRIPTION_VARIATION
+            category_id = categories[key]
+            charges.append({
+                "description": labels[key],
+                "categoryId": category_id,
+                "category": names.get(category_id, "Uncategorized"),
+                "cadence": name,
+                "intervalDays": round(result["intervalDays"], 1),
+                "occurrences": result["occurrences"],
+                "regularity": round(result["regularity"], 2),
+                "averageAmount": round(result["averageAmount"], 2),
+                "lastAmount": round(result["lastAmount"], 2),
+                "firstDate": _day(result["firstDay"]).isoformat(),
+                "lastDate": last.isoformat(),
+                "nextDate": next_charge.isoformat(),
+                "active": active,
+                "subscription": subscription,
+                "annualCost": round(result["averageAmount"] * 365 / nominal, 2),
+            })
+
+        charges.sort(key=lambda charge: (not charge["subscription"], -charge["annualCost"]))
+        subscriptions = [charge for charge in charges if charge["subscription"]]
+        return {
+            "asOf": as_of.isoformat(),
+            "recurring": charges,
+            "subscriptionCount": len(subscriptions),
+            "subscriptionAnnualCost": round(sum(charge["annualCost"] for charge in subscriptions), 2),
+        }
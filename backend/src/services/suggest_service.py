@@ -0,0 +1,345 @@
+"""Description autocomplete from an in-memory prefix index.
+
+Each process keeps, per database, the distinct descriptions (case-folded,
+whitespace collapsed, as for fingerprints) in a sorted list, so the
+descriptions starting with a prefix are one ``bisect`` range. Every
+description carries how many expenses use it, the day it was last used and
+how many of its expenses are in each category. Matches are ranked by
+``count * 0.5 ** (days since last use / SUGGEST_HALF_LIFE_DAYS)``, so a
+description used weekly outranks one used often years ago, and each names
+the category most of its expenses are in.
+
+The ranking only depends on today through a factor shared by every
+description, so ``log2(count) + last day / half-life`` orders them the same
+way on any day. Prefixes matching more than ``SUGGEST_SCAN_LIMIT``
+descriptions (the first letter or two typed) keep the ``TOP_SIZE``
+best-ranked by that key, from a build for single letters and otherwise
+from their first lookup, and later lookups rank only those. Descriptions used
+after today count as used today when ranked, so only they can rank
+differently from their key.
+
+The index follows the ``expense_changes`` journal. When the database
+changed, only the expenses journaled after the index's version are read
+back and replace what they contributed before, so a write from any worker
+costs a few rows rather than a rebuild; descriptions whose rank rose move
+up in the kept lists and a list that loses rank is dropped. The index is
+built on first use, and rebuilt when compaction removed journal rows it has
+not seen or too many expenses changed at once (e.g. an import). A rebuild
+runs on a background thread while the old index keeps answering, and
+replaces it when done. Between rebuilds a description's last-used day only
+moves forward: deleting its latest expense does not bring the date back.
+"""
+import heapq
+import logging
+import math
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from ..core.cache import watcher_for
+from ..db.models import Category as CategoryModel, ChangeJournalState
+from .fingerprints import normalize_description
+from .range_index import EPOCH, epoch_day
+from .sync_service import current_version
+
+logger = logging.getLogger("expenses.suggest")
+
+settings = {
+    "half_life_days": float(os.getenv("SUGGEST_HALF_LIFE_DAYS", "90")),
+    # Prefixes matching more descriptions than this keep their best ones instead of ranking them all
+    "scan_limit": int(os.getenv("SUGGEST_SCAN_LIMIT", "1000")),
+    # Above this many changed expenses a rebuild is cheaper than catching up
+    "max_changes": int(os.getenv("SUGGEST_MAX_CHANGES", "50000")),
+    "chunk_size": int(os.getenv("SUGGEST_CHUNK_SIZE", "500")),
+}
+
+_ROWS_SQL = (
+    "SELECT id, description, category_id, CAST(julianday(date(date)) - 2440587.5 AS INTEGER) "
+    "FROM expenses"
+)
+_NO_CODE = -1
+_NO_CATEGORY = 0
+TOP_SIZE = 50  # The largest limit the API accepts
+
+class _Entry:
+    __slots__ = ("key", "text", "count", "last_day", "categories")
+
+    def __init__(self, key: str, text: str):
+        self.key = key
+        self.text = text
+        self.count = 0
+        self.last_day = 0
+        self.categories: Dict[int, int] = {}
+
+class SuggestIndex:
+    """Distinct descriptions of one database, kept sorted for prefix lookups."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rebuilding = False
+        self._reset()
+
+    def _reset(self):
+        self.keys: List[str] = []  # Normalized descriptions, sorted
+        self._keys_sorted = True
+        self.codes: Dict[str, int] = {}
+        self.entries: List[_Entry] = []
+        # Per large prefix, the codes of its best-ranked descriptions, best first
+        self._top: Dict[str, List[int]] = {}
+        # Rank before the current catch-up of each description it changed, while any prefix is kept
+        self._changed: Dict[int, float] = {}
+        # What each expense contributes, by expense id: the code of its description and its category
+        self._expense_codes = array("i")
+        self._expense_categories = array("i")
+        self.version: Optional[int] = None
+        self.data_version: Optional[int] = None
+
+    def refresh(self, db: Session, data_version: Optional[int] = None) -> bool:
+        """Bring the index up to date incrementally; False when only a rebuild can."""
+        if data_version is not None and data_version == self.data_version:
+            return True
+        if self.version is None:
+            return False
+        conn = db.connection()
+        latest = current_version(conn)
+        if latest != self.version:
+            state = db.get(ChangeJournalState, 1)
+            compacted_through = state.compacted_through if state else 0
+            # A version from before compaction, or one this database never had (restored from a backup)
+            if self.version < compacted_through or self.version > latest or not self._catch_up(conn):
+                return False
+        # Rows read after ``latest`` may be applied again next time; replacing them is harmless
+        self.version = latest
+        self.data_version = data_version
+        return True
+
+    def rebuild(self, db: Session, data_version: Optional[int] = None):
+        """Load the index from scratch."""
+        conn = db.connection()
+        latest = current_version(conn)
+        self._reset()
+        for row in conn.exec_driver_sql(_ROWS_SQL):
+            self._add(*row)
+        self._sort_keys()
+        self._keep_first_letters()
+        self.version = latest
+        self.data_version = data_version
+
+    def _catch_up(self, conn) -> bool:
+        expense_ids = conn.exec_driver_sql(
+            "SELECT DISTINCT expense_id FROM expense_changes WHERE version > ? AND op != 'category' "
+            "LIMIT ?",
+            (self.version, settings["max_changes"] + 1),
+        ).scalars().all()
+        if len(expense_ids) > settings["max_changes"]:
+            return False
+        for start in range(0, len(expense_ids), settings["chunk_size"]):
+            chunk = expense_ids[start:start + settings["chunk_size"]]
+            for expense_id in chunk:
+                self._remove(expense_id)
+            placeholders = ", ".join("?" * len(chunk))
+            for row in conn.exec_driver_sql(f"{_ROWS_SQL} WHERE id IN ({placeholders})", tuple(chunk)):
+                self._add(*row)
+        self._sort_keys()
+        self._update_top()
+        return True
+
+    def _sort_keys(self):
+        # New keys are appended; one sort merges them (Timsort keeps the sorted run)
+        if not self._keys_sorted:
+            self.keys.sort()
+            self._keys_sorted = True
+
+    def _rank(self, code: int) -> float:
+        """Orders descriptions as their score does on any day they are not from the future."""
+        entry = self.entries[code]
+        if not entry.count:
+            return -math.inf
+        return math.log2(entry.count) + entry.last_day / settings["half_life_days"]
+
+    def _keep_top(self, prefix: str, start: int, end: int) -> List[int]:
+        ranked = (self.codes[key] for key in self.keys[start:end])
+        codes = self._top[prefix] = heapq.nlargest(
+            TOP_SIZE, (code for code in ranked if self.entries[code].count), key=self._rank
+        )
+        return codes
+
+    def _keep_first_letters(self):
+        """Rank the prefixes of one character ahead of their first lookup, which always finds many."""
+        start = 0
+        while start < len(self.keys):
+            prefix = self.keys[start][0]
+            end = bisect_left(self.keys, prefix + "\U0010ffff", start)
+            if end - start > settings["scan_limit"]:
+                self._keep_top(prefix, start, end)
+            start = end
+
+    def _track(self, code: int):
+        if self._top and code not in self._changed:
+            self._changed[code] = self._rank(code)
+
+    def _update_top(self):
+        """Fix the kept lists of the prefixes of every description the catch-up changed."""
+        changed, self._changed = self._changed, {}
+        # First take changed descriptions out, so the lists only hold ones whose rank is still in order
+        for code, previous in changed.items():
+            key = self.entries[code].key
+            rank = self._rank(code)
+            for length in range(1, len(key) + 1):
+                codes = self._top.get(key[:length])
+                if codes is None or code not in codes:
+                    continue
+                if rank < previous:
+                    # What would take its place is not known
+                    del self._top[key[:length]]
+                else:
+                    codes.remove(code)
+        for code in changed:
+            key = self.entries[code].key
+            rank = self._rank(code)
+            if rank == -math.inf:
+                continue
+            for length in range(1, len(key) + 1):
+                codes = self._top.get(key[:length])
+                if codes is None or (len(codes) >= TOP_SIZE and rank <= self._rank(codes[-1])):
+                    continue
+                position = next((i for i, other in enumerate(codes) if self._rank(other) < rank), len(codes))
+                codes.insert(position, code)
+                del codes[TOP_SIZE:]
+
+    def _add(self, expense_id: int, description: Optional[str], category_id: Optional[int], day: Optional[int]):
+        key = normalize_description(description)
+        if not key:
+            return
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.entries)
+            self.entries.append(_Entry(key, description.strip()))
+            self.keys.append(key)
+            self._keys_sorted = False
+        self._track(code)
+        entry = self.entries[code]
+        entry.count += 1
+        category = category_id or _NO_CATEGORY
+        entry.categories[category] = entry.categories.get(category, 0) + 1
+        if day is not None and day >= entry.last_day:
+            # The latest use decides how the description is spelled
+            entry.last_day = day
+            entry.text = description.strip()
+
+        if expense_id >= len(self._expense_codes):
+            grow = expense_id + 1 - len(self._expense_codes)
+            self._expense_codes.extend([_NO_CODE] * grow)
+            self._expense_categories.extend([_NO_CATEGORY] * grow)
+        self._expense_codes[expense_id] = code
+        self._expense_categories[expense_id] = category
+
+    def _remove(self, expense_id: int):
+        if expense_id >= len(self._expense_codes) or self._expense_codes[expense_id] == _NO_CODE:
+            return
+        self._track(self._expense_codes[expense_id])
+        entry = self.entries[self._expense_codes[expense_id]]
+        category = self._expense_categories[expense_id]
+        entry.count -= 1
+        entry.categories[category] -= 1
+        if not entry.categories[category]:
+            del entry.categories[category]
+        self._expense_codes[expense_id] = _NO_CODE
+
+    def search(self, prefix: str, limit: int, today: int) -> List[_Entry]:
+        """The ``limit`` best-ranked descriptions starting with ``prefix`` (already normalized)."""
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + "\U0010ffff", start)
+        half_life = settings["half_life_days"]
+
+        def score(entry: _Entry) -> float:
+            return entry.count * 0.5 ** (max(today - entry.last_day, 0) / half_life)
+
+        if end - start > settings["scan_limit"] and limit <= TOP_SIZE:
+            codes = self._top.get(prefix) or self._keep_top(prefix, start, end)
+            matches = (self.entries[code] for code in codes)
+        else:
+            matches = (self.entries[self.codes[key]] for key in self.keys[start:end])
+        return heapq.nlargest(limit, (entry for entry in matches if entry.count), key=score)
+
+_indexes: Dict[str, SuggestIndex] = {}
+_registry_lock = threading.Lock()
+
+def _rebuild(path: str, bind, stale: SuggestIndex):
+    """Build a new index for ``path`` and put it in place of ``stale``."""
+    index = SuggestIndex()
+    db = Session(bind=bind)
+    try:
+        index.rebuild(db)
+    except Exception:  # Keep serving the old index; the next request tries again
+        logger.exception("Rebuilding the suggest index of %s failed", path)
+        with stale.lock:
+            stale.rebuilding = False
+        return
+    finally:
+        db.close()
+    with _registry_lock:
+        _indexes[path] = index
+
+def index_for(db: Session) -> SuggestIndex:
+    """The refreshed index for ``db``'s database; in-memory databases get a fresh one.
+
+    While a rebuild runs in the background the previous index is returned as is.
+    """
+    watcher = watcher_for(db.get_bind())
+    if watcher is None:
+        index = SuggestIndex()
+        index.rebuild(db)
+        return index
+    with _registry_lock:
+        index = _indexes.setdefault(watcher.path, SuggestIndex())
+    with index.lock:
+        if index.rebuilding:
+            return index
+        data_version = watcher.poll()
+        if index.refresh(db, data_version):
+            return index
+        if index.version is None:
+            # Nothing to answer from until the first build, so it happens here
+            index.rebuild(db, data_version)
+            return index
+        index.rebuilding = True
+    threading.Thread(
+        target=_rebuild, args=(watcher.path, db.get_bind(), index), name="suggest-rebuild", daemon=True
+    ).start()
+    return index
+
+class SuggestService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[Dict]:
+        """Descriptions starting with ``prefix``, best first, each with its most common category."""
+        key = normalize_description(prefix)
+        if key and prefix[-1:].isspace():
+            key += " "  # "tea " should not suggest "teahouse"
+        if not key:
+            return []
+        index = index_for(self.db)
+        with index.lock:
+            matches = [
+                (entry.text, entry.count, entry.last_day, max(entry.categories, key=entry.categories.get))
+                for entry in index.search(key, limit, epoch_day(date.today()))
+            ]
+        category_ids = {category_id for *_, category_id in matches if category_id != _NO_CATEGORY}
+        names = dict(
+            self.db.query(CategoryModel.id, CategoryModel.name).filter(CategoryModel.id.in_(category_ids))
+        ) if category_ids else {}
+        return [
+            {
+                "description": description,
+                "count": count,
+                "lastUsed": (EPOCH + timedelta(days=last_day)).isoformat(),
+                "categoryId": category_id if category_id != _NO_CATEGORY else None,
+                "category": names.get(category_id),
+            }
+            for description, count, last_day, category_id in matches
+        ]
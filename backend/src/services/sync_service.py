@@ -0,0 +1,118 @@
+"""Incremental sync from the ``expense_changes`` journal.
+
+Triggers append a journal row for every expense insert, update and delete
+and for every category change, in the writer's own transaction, so a
+journal version is a consistent point to sync from. A client keeps the
+``version`` of its last sync and asks for what changed after it; the
+expenses named in the journal are returned as they are now (upserts), or as
+deleted ids when they no longer exist, so replaying a page twice is
+harmless.
+
+Compaction keeps the journal small: superseded rows (an expense changed
+again later) can always be removed, since only the latest state is served.
+Rows older than ``SYNC_JOURNAL_RETENTION_DAYS`` are removed too; clients
+that last synced before them are told to resync fully.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+from ..db.models import ChangeJournalState, Category as CategoryModel, Expense as ExpenseModel, ExpenseChange
+from ..models.category import Category
+from ..models.expense import Expense
+
+settings = {
+    "retention_days": float(os.getenv("SYNC_JOURNAL_RETENTION_DAYS", "30")),
+    "page_size": int(os.getenv("SYNC_PAGE_SIZE", "1000")),
+}
+
+CURRENT_VERSION_SQL = "SELECT seq FROM sqlite_sequence WHERE name = 'expense_changes'"
+
+def current_version(conn) -> int:
+    """Latest journal version, also when compaction emptied the table."""
+    return conn.exec_driver_sql(CURRENT_VERSION_SQL).scalar() or 0
+
+def compact_journal(conn, retention_days: Optional[float] = None) -> Dict:
+    """Drop superseded and expired journal rows; the caller commits."""
+    retention_days = settings["retention_days"] if retention_days is None else retention_days
+    superseded = conn.exec_driver_sql("""
+        DELETE FROM expense_changes WHERE version NOT IN (
+            SELECT MAX(version) FROM expense_changes GROUP BY op = 'category', expense_id
+        )""").rowcount
+
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    through = conn.exec_driver_sql(
+        "SELECT MAX(version) FROM expense_changes WHERE ts < ?", (cutoff.isoformat(" "),)
+    ).scalar()
+    expired = 0
+    if through is not None:
+        expired = conn.exec_driver_sql("DELETE FROM expense_changes WHERE version <= ?", (through,)).rowcount
+        _mark_compacted(conn, through)
+    return {"superseded": superseded, "expired": expired}
+
+def require_full_resync(conn) -> int:
+    """Send every client into a full resync, after writes that bypassed the journal; the caller commits.
+
+    Bulk loads suspend the journal triggers. Moving the journal version past
+    every version handed out so far and marking it compacted makes any
+    ``since`` a client holds too old. Returns the new version.
+    """
+    version = current_version(conn) + 1
+    if not conn.exec_driver_sql(
+        "UPDATE sqlite_sequence SET seq = ? WHERE name = 'expense_changes'", (version,)
+    ).rowcount:
+        conn.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES ('expense_changes', ?)", (version,))
+    conn.exec_driver_sql("DELETE FROM expense_changes WHERE version <= ?", (version,))
+    _mark_compacted(conn, version)
+    return version
+
+def _mark_compacted(conn, through: int):
+    conn.exec_driver_sql("""
+        INSERT INTO expense_changes_state (id, compacted_through, compacted_at) VALUES (1, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            compacted_through = MAX(compacted_through, excluded.compacted_through),
+            compacted_at = excluded.compacted_at""", (through, datetime.utcnow().isoformat(" ")))
+
+class SyncService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_changes(self, since: Optional[int], limit: Optional[int] = None) -> Dict:
+        """Expenses changed after journal version ``since``, oldest change first.
+
+        ``version`` is what to pass as ``since`` next time; ``hasMore`` means
+        another page is ready straight away. A ``fullResync`` response has no
+        changes: the client reloads everything and continues from ``version``.
+        """
+        limit = limit or settings["page_size"]
+        latest = current_version(self.db.connection())
+        state = self.db.get(ChangeJournalState, 1)
+        compacted_through = state.compacted_through if state else 0
+        # No version, one from before compaction, or one this database never had (e.g. restored from a backup)
+        if since is None or since < compacted_through or since > latest:
+            return {"version": latest, "fullResync": True, "hasMore": False,
+                    "upserts": [], "deleted": [], "categories": None}
+
+        changes = (
+            self.db.query(ExpenseChange.version, ExpenseChange.op, ExpenseChange.expense_id)
+            .filter(ExpenseChange.version > since)
+            .order_by(ExpenseChange.version)
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        expense_ids = {change.expense_id for change in changes if change.op != "category"}
+        rows = self.db.query(ExpenseModel).filter(ExpenseModel.id.in_(expense_ids)).all() if expense_ids else []
+        version = changes[-1].version if changes else since
+        categories = None
+        if any(change.op == "category" for change in changes):
+            categories = [Category.from_orm(category) for category in self.db.query(CategoryModel).all()]
+        return {
+            "version": version if has_more else max(version, latest),
+            "fullResync": False,
+            "hasMore": has_more,
+            "upserts": [Expense.from_orm(row) for row in rows],
+            "deleted": sorted(expense_ids - {row.id for row in rows}),
+            "categories": categories,
+        }
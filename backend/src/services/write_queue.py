@@ -0,0 +1,152 @@
+"""Group commit for expense inserts (``GROUP_COMMIT=1``).
+
+SQLite has one writer per database, and a commit costs an fsync plus a lock
+handoff no matter how few rows it carries. With group commit, ``POST
+/api/expenses/`` hands its expense to a writer thread (one per database
+engine) instead of committing on its own. The writer takes everything queued,
+waits up to ``GROUP_COMMIT_WINDOW_MS`` for more (at most
+``GROUP_COMMIT_MAX_BATCH``), and inserts the batch in one transaction with a
+single ``INSERT ... RETURNING`` (``ExpenseService.create_expenses``). Each
+caller's future then resolves to its own expense, or to the ValueError that
+rejected it. While a batch commits the next one queues up, so batches grow
+with the load.
+
+Group commit only applies to the single shared database; a per-user shard
+(``STORAGE_MODE=sharded``) rarely has concurrent writers to coalesce.
+
+If a whole batch fails (e.g. the database is locked for longer than the busy
+timeout), its expenses are retried one per transaction so the failure
+reaches only the requests it belongs to.
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import sessionmaker
+from ..core import metrics
+from ..db.database import STORAGE_MODE
+from ..models.expense import Expense, ExpenseCreate
+from .expense_service import ExpenseService
+
+logger = logging.getLogger("expenses.write_queue")
+
+settings = {
+    "enabled": os.getenv("GROUP_COMMIT", "0") == "1",
+    # How long the writer waits for more expenses once it has one
+    "window_ms": float(os.getenv("GROUP_COMMIT_WINDOW_MS", "1")),
+    "max_batch": int(os.getenv("GROUP_COMMIT_MAX_BATCH", "256")),
+}
+
+BATCH_SIZES = metrics.REGISTRY.register(metrics.Histogram(
+    "write_queue_batch_size", "Expenses committed per group-commit transaction.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)))
+
+class WriteQueue:
+    """Writer thread committing the queued inserts of one database together."""
+
+    def __init__(self, engine, window_ms: float, max_batch: int):
+        self.sessions = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Optional[Tuple[ExpenseCreate, Future]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name=f"write-queue-{engine.url.database}", daemon=True)
+        self._thread.start()
+
+    def submit(self, expense: ExpenseCreate) -> Future:
+        future: Future = Future()
+        self._queue.put((expense, future))
+        return future
+
+    def stop(self, timeout: float = 5.0):
+        """Commit what is already queued, then end the thread."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _collect(self, first) -> Tuple[List, bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _loop(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            BATCH_SIZES.observe(len(batch))
+            try:
+                self._commit(batch)
+            except Exception:  # Never let the writer die with callers waiting
+                logger.exception("Group commit of %d expenses failed", len(batch))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("Expense could not be saved"))
+
+    def _commit(self, batch: List[Tuple[ExpenseCreate, Future]]):
+        db = self.sessions()
+        try:
+            results = ExpenseService(db).create_expenses([expense for expense, _ in batch])
+        except SQLAlchemyError:
+            db.rollback()
+            if len(batch) == 1:
+                raise
+            logger.warning("Group commit of %d expenses failed; retrying them one by one", len(batch), exc_info=True)
+            for item in batch:
+                self._commit_one(item)
+            return
+        finally:
+            db.close()
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _commit_one(self, item: Tuple[ExpenseCreate, Future]):
+        expense, future = item
+        db = self.sessions()
+        try:
+            future.set_result(ExpenseService(db).create_expense(expense))
+        except Exception as e:
+            db.rollback()
+            future.set_exception(e)
+        finally:
+            db.close()
+
+_queues: Dict[object, WriteQueue] = {}
+_queues_lock = threading.Lock()
+
+def enabled() -> bool:
+    return settings["enabled"] and STORAGE_MODE == "single"
+
+def queue_for(engine) -> WriteQueue:
+    with _queues_lock:
+        write_queue = _queues.get(engine)
+        if write_queue is None:
+            write_queue = _queues[engine] = WriteQueue(engine, settings["window_ms"], settings["max_batch"])
+        return write_queue
+
+async def submit(engine, expense: ExpenseCreate) -> Expense:
+    """Queue ``expense`` for ``engine``'s writer and wait for its commit."""
+    return await asyncio.wrap_future(queue_for(engine).submit(expense))
+
+def stop_all():
+    with _queues_lock:
+        queues = list(_queues.values())
+        _queues.clear()
+    for write_queue in queues:
+        write_queue.stop()
@@ -0,0 +1,146 @@
+"""Column-oriented encodings for large list responses.
+
+A list of JSON objects repeats every key for every row. These encodings send
+one array per column instead, in two flavours:
+
+* ``encode_json``: ``{"count": n, "columns": {name: [...]}}``. Columns of
+  type ``dictionary`` are sent as ``{"dictionary": [...], "codes": [...]}``,
+  where ``codes`` index into ``dictionary``. ``datetime`` columns are sent
+  as ``{"unit": "day" | "ms", "values": [...]}``: days since 1970 when every
+  value is at midnight, else milliseconds, reading the stored wall-clock
+  time as UTC. Floats are rounded to ``JSON_FLOAT_DIGITS`` decimals (whole
+  ones sent without a fraction) and booleans are sent as 0 and 1.
+* ``encode_binary``: typed arrays that a browser can wrap without parsing
+  (``new Float64Array(buffer, offset, count)``). The layout is the 4-byte
+  magic ``EXPC``, a little-endian uint32 header length, a JSON header, then
+  the column buffers (the body). The header is padded so the body starts
+  8-byte aligned, and lists each column's ``type`` and, for each of its
+  buffers, an ``[offset, byteLength]`` pair; offsets are relative to the
+  body and multiples of 8:
+
+  - ``int32`` / ``float64`` / ``bool`` (uint8): ``values``. Missing floats
+    are NaN.
+  - ``datetime``: float64 milliseconds since 1970 in ``values``, reading the
+    stored wall-clock time as UTC. Missing values are NaN.
+  - ``string``: ``offsets`` (uint32, count + 1) into ``data`` (UTF-8).
+  - ``dictionary``: ``codes`` (uint8, uint16 or uint32 by dictionary size);
+    the dictionary itself is in the header.
+
+  Any column with missing values also has a ``validity`` bitmap (one bit
+  per row, least significant bit first, 1 = present).
+"""
+import json
+import struct
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+MAGIC = b"EXPC"
+BINARY_MEDIA_TYPE = "application/vnd.expenses.columnar"
+EPOCH = datetime(1970, 1, 1)
+JSON_FLOAT_DIGITS = 4
+DAY_MILLISECONDS = 86_400_000
+
+def to_columns(rows: Sequence[Tuple], fields: Sequence[str]) -> Dict[str, list]:
+    """Transpose query rows into one list per field."""
+    if not rows:
+        return {field: [] for field in fields}
+    return {field: list(values) for field, values in zip(fields, zip(*rows))}
+
+def dictionary_encode(values: Sequence) -> Tuple[List, List[int]]:
+    """Distinct values in order of first appearance, and each value's index among them."""
+    index: Dict = {}
+    codes = [index.setdefault(value, len(index)) for value in values]
+    return list(index), codes
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _json_float(value):
+    if value is None:
+        return None
+    value = round(value, JSON_FLOAT_DIGITS)
+    return int(value) if value.is_integer() else value
+
+def _json_datetimes(values: list) -> Dict:
+    milliseconds = [round(_milliseconds(value)) if value is not None else None for value in values]
+    if all(value % DAY_MILLISECONDS == 0 for value in milliseconds if value is not None):
+        return {"unit": "day", "values": [value // DAY_MILLISECONDS if value is not None else None for value in milliseconds]}
+    return {"unit": "ms", "values": milliseconds}
+
+def encode_json(columns: Dict[str, list], types: Dict[str, str]) -> bytes:
+    encoded = {}
+    for name, values in columns.items():
+        if types[name] == "dictionary":
+            dictionary, codes = dictionary_encode(values)
+            encoded[name] = {"dictionary": dictionary, "codes": codes}
+        elif types[name] == "datetime":
+            encoded[name] = _json_datetimes(values)
+        elif types[name] == "float64":
+            encoded[name] = [_json_float(value) for value in values]
+        elif types[name] == "bool":
+            encoded[name] = [int(value) if value is not None else None for value in values]
+        else:
+            encoded[name] = values
+    count = len(next(iter(columns.values()), []))
+    return json.dumps({"count": count, "columns": encoded}, separators=(",", ":")).encode()
+
+def encode_records(columns: Dict[str, list]) -> bytes:
+    """The usual list of objects, limited to the given columns."""
+    names = list(columns)
+    records = [dict(zip(names, row)) for row in zip(*columns.values())]
+    return json.dumps(records, separators=(",", ":"), default=_json_value).encode()
+
+def _milliseconds(value):
+    return (value - EPOCH).total_seconds() * 1000 if value is not None else None
+
+def _code_type(size: int) -> str:
+    return "<u1" if size <= 0xFF else "<u2" if size <= 0xFFFF else "<u4"
+
+def _column_buffers(values: list, column_type: str, header: Dict) -> Dict[str, bytes]:
+    buffers = {}
+    if column_type == "dictionary":
+        dictionary, codes = dictionary_encode(values)
+        header["dictionary"] = dictionary
+        buffers["codes"] = np.asarray(codes, dtype=_code_type(len(dictionary))).tobytes()
+        return buffers
+
+    missing = [value is None for value in values]
+    if any(missing):
+        buffers["validity"] = np.packbits(~np.asarray(missing, dtype=bool), bitorder="little").tobytes()
+    if column_type == "string":
+        encoded = [value.encode() if value is not None else b"" for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype="<u4")
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        buffers["offsets"] = offsets.tobytes()
+        buffers["data"] = b"".join(encoded)
+    elif column_type == "datetime":
+        buffers["values"] = np.array([_milliseconds(value) for value in values], dtype="<f8").tobytes()
+    elif column_type == "float64":
+        buffers["values"] = np.array(values, dtype="<f8").tobytes()  # None becomes NaN
+    elif column_type == "int32":
+        buffers["values"] = np.array([value or 0 for value in values], dtype="<i4").tobytes()
+    elif column_type == "bool":
+        buffers["values"] = np.array([bool(value) for value in values], dtype="<u1").tobytes()
+    else:
+        raise ValueError(f"Unknown column type {column_type!r}")
+    return buffers
+
+def encode_binary(columns: Dict[str, list], types: Dict[str, str]) -> bytes:
+    count = len(next(iter(columns.values()), []))
+    header = {"count": count, "columns": []}
+    body = bytearray()
+    for name, values in columns.items():
+        column = {"name": name, "type": types[name], "buffers": {}}
+        for buffer_name, data in _column_buffers(values, types[name], column).items():
+            body.extend(b"\0" * (-len(body) % 8))
+            column["buffers"][buffer_name] = [len(body), len(data)]
+            body.extend(data)
+        header["columns"].append(column)
+
+    header_bytes = json.dumps(header, separators=(",", ":"), default=_json_value).encode()
+    # Pad the header so the body, and with it every buffer, starts 8-byte aligned
+    header_bytes += b" " * (-(len(MAGIC) + 4 + len(header_bytes)) % 8)
+    return MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes + bytes(body)
@@ -0,0 +1,54 @@
+"""Deferred imports for heavy, optional dependencies.
+
+OCR and numeric libraries take hundreds of milliseconds to import. Instances
+that only serve CRUD requests should never pay for them, so modules that use
+them bind a ``LazyModule`` at import time and the real import happens on the
+first attribute access.
+"""
+import importlib
+import importlib.util
+import threading
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+def is_available(name: str) -> bool:
+    """Whether ``name`` can be imported, without importing it."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+class LazyApp:
+    """ASGI app that is built by ``factory`` when its first request arrives."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._app = None
+
+    async def __call__(self, scope, receive, send):
+        if self._app is None:
+            self._app = self.factory()
+        await self._app(scope, receive, send)
@@ -0,0 +1,31 @@
+"""Calendar periods shared by analytics and budgets."""
+import calendar
+from datetime import date, timedelta
+
+PERIODS = ("week", "month", "quarter", "year")
+
+def shift_months(value: date, months: int) -> date:
+    """Move by whole months, clamping the day to the length of the target month."""
+    month_index = value.year * 12 + value.month - 1 + months
+    year, month = divmod(month_index, 12)
+    day = min(value.day, calendar.monthrange(year, month + 1)[1])
+    return date(year, month + 1, day)
+
+def period_start(period: str, as_of: date) -> date:
+    """First day of the week (Monday), month, quarter or year containing ``as_of``."""
+    if period == "week":
+        return as_of - timedelta(days=as_of.weekday())
+    if period == "month":
+        return as_of.replace(day=1)
+    if period == "quarter":
+        return date(as_of.year, 3 * ((as_of.month - 1) // 3) + 1, 1)
+    if period == "year":
+        return date(as_of.year, 1, 1)
+    raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+
+def period_end(period: str, start: date) -> date:
+    """Last day of the period beginning on ``start``."""
+    if period == "week":
+        return start + timedelta(days=6)
+    months = {"month": 1, "quarter": 3, "year": 12}[period]
+    return shift_months(start, months) - timedelta(days=1)
@@ -29,6 +29,9 @@ function Expenses() {
   // Loading state
   const [isLoading, setIsLoading] = useState(false);
   const [totalExpensesCount, setTotalExpensesCount] = useState(0);
+  // Description autocomplete
+  const [suggestions, setSuggestions] = useState([]);
+  const [showSuggestions, setShowSuggestions] = useState(false);
 
   useEffect(() => {
     fetchExpenses();
@@ -59,6 +62,40 @@ function Expenses() {
     setCurrentPage(1);
   }, [expenses, itemsPerPage, yearFilter]);
 
+  useEffect(() => {
+    // Suggest earlier descriptions as the user types, once they pause for a moment
+    const prefix = formData.description;
+    if (!showSuggestions || !prefix.trim()) {
+      setSuggestions([]);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${config.apiUrl}${config.endpoints.expenses}/suggest`, {
+          params: { prefix, limit: 6 },
+        });
+        if (!cancelled) setSuggestions(response.data);
+      } catch (error) {
+        console.error('Error fetching suggestions:', error);
+      }
+    }, 150);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [formData.description, showSuggestions]);
+
+  const handleSuggestion = (suggestion) => {
+    // Keep a category the user already picked; otherwise use the one this description usually has
+    setFormData({
+      ...formData,
+      description: suggestion.description,
+      category_id: formData.category_id || (suggestion.categoryId ? suggestion.categoryId.toString() : ''),
+    });
+    setShowSuggestions(false);
+  };
+
   useEffect(() => {
     // Extract available years from expenses
     if (expenses.length > 0) {
@@ -406,13 +443,40 @@ function Expenses() {
               </div>
               <div>
                 <label className="block text-sm font-medium text-gray-700">Description</label>
-                <input
-                  type="text"
-                  required
-                  value={formData.description}
-                  onChange={(e) => setFormData({ ...formData, description: e.target.value })}
-                  className="input-field mt-1"
-                />
+                <div className="relative">
+                  <input
+                    type="text"
+                    required
+                    autoComplete="off"
+                    value={formData.description}
+                    onChange={(e) => {
+                      setFormData({ ...formData, description: e.target.value });
+                      setShowSuggestions(true);
+                    }}
+                    onBlur={() => setShowSuggestions(false)}
+                    className="input-field mt-1"
+                  />
+                  {showSuggestions && suggestions.length > 0 && (
+                    <ul className="absolute z-10 mt-1 w-full bg-white border rounded shadow-lg max-h-60 overflow-auto">
+                      {suggestions.map((suggestion) => (
+                        <li
+                          key={suggestion.description}
+                          // Runs before the input's blur hides the list
+                          onMouseDown={(e) => {
+                            e.preventDefault();
+                            handleSuggestion(suggestion);
+                          }}
+                          className="flex justify-between px-3 py-2 text-sm cursor-pointer hover:bg-gray-100"
+                        >
+                          <span className="text-gray-900">{suggestion.description}</span>
+                          {suggestion.category && (
+                            <span className="text-gray-500">{suggestion.category}</span>
+                          )}
+                        </li>
+                      ))}
+                    </ul>
+                  )}
+                </div>
               </div>
               <div>
                 <label className="block text-sm font-medium text-gray-700">Date</label>